@@ -1,225 +1,382 @@
+import argparse
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
+
+import compressed_io
+import sampling
+from ingredient_index import build_ingredient_index
+from instrumentation import stage
+from recipe_stats import correlation_report, feature_matrix
+from sketches import UniqueUserSketches
 
 
 DATA_DIR = "data"
 IMAGES_DIR = "images"
+# resamples behind the correlation CIs; recipe_stats.py --n-boot for more
+CORRELATION_BOOTSTRAP = 200
 
 
-def load_data():
-    recipes = pd.read_csv(os.path.join(DATA_DIR, "recipe.csv"))
-    ingredients = pd.read_csv(os.path.join(DATA_DIR, "ingredients.csv"))
-    steps = pd.read_csv(os.path.join(DATA_DIR, "steps.csv"))
-    interactions = pd.read_csv(os.path.join(DATA_DIR, "interactions.csv"))
-    return recipes, ingredients, steps, interactions
+def read_table(data_dir, name):
+    with stage(f"analytics.read_csv.{name}") as s:
+        df = compressed_io.read_table(data_dir, name)
+        s.rows = len(df)
+    return df
+
 
+def load_data(data_dir=DATA_DIR):
+    recipes = read_table(data_dir, "recipe")
+    ingredients = read_table(data_dir, "ingredients")
+    steps = read_table(data_dir, "steps")
+    interactions = read_table(data_dir, "interactions")
+    return recipes, ingredients, steps, interactions
 
-def main():
-    os.makedirs(IMAGES_DIR, exist_ok=True)
 
-    recipes, ingredients, steps, interactions = load_data()
+def load_sample(data_dir, fraction, seed=0, frames=None):
+    """
+    Like load_data, but interactions is a stratified sample with a
+    sampleWeight column (recipes, ingredients and steps stay whole).
+    """
+    if frames is not None:
+        recipes, ingredients, steps, interactions = frames
+        with stage("analytics.sample.interactions", rows=len(interactions)) as s:
+            sample = sampling.sample_frame(interactions, fraction, seed)
+            s.rows = len(sample)
+        return recipes, ingredients, steps, sample
+    recipes = read_table(data_dir, "recipe")
+    ingredients = read_table(data_dir, "ingredients")
+    steps = read_table(data_dir, "steps")
+    with stage("analytics.sample.interactions") as s:
+        sample = sampling.read_sample(data_dir, "interactions", fraction, seed)
+        s.rows = len(sample)
+    return recipes, ingredients, steps, sample
+
+
+def per_recipe_counts(frame):
+    """Interactions per recipe; sample rows count as their weight."""
+    if sampling.WEIGHT_COLUMN in frame:
+        return sampling.weighted_counts(frame, "recipeId").round().astype(int)
+    return frame.groupby("recipeId").size()
+
+
+def with_error(value, error, digits=2):
+    """"4.12 ± 0.30" (a single sampled row has no error estimate)."""
+    bound = "n/a" if pd.isna(error) else f"{error:.{digits}f}"
+    return f"{value:.{digits}f} ± {bound}"
+
+
+def main(data_dir=DATA_DIR, images_dir=IMAGES_DIR, frames=None, sample=None, seed=0, charts=True):
+    """
+    Runs every insight and chart. `frames` is an optional pre-loaded
+    (recipes, ingredients, steps, interactions) tuple, e.g. handed over by
+    pipeline.py; otherwise the CSVs in data_dir are read. charts=False
+    prints the insights only (matplotlib is never imported).
+
+    With `sample` (a fraction), insights run on a stratified sample of the
+    interactions (see sampling.py): nothing is persisted, charts and the
+    unique-user sketches are skipped, and estimated values carry a 95%
+    error bound.
+    """
+    if sample:
+        frames = load_sample(data_dir, sample, seed, frames)
+    elif frames is None:
+        frames = load_data(data_dir)
+    recipes, ingredients, steps, interactions = frames
 
     insights = []
 
     # -----------------------------------------------------------------
     # 1. Top 5 Most Viewed Recipes
     # -----------------------------------------------------------------
-    views = interactions[interactions["type"] == "view"]
-    views_count = views.groupby("recipeId").size().sort_values(ascending=False)
-    top_5_views = views_count.head(5)
-    insights.append(("Top 5 Most Viewed Recipes", top_5_views.to_dict()))
+    # (a sample's weighted counts per recipe and type are already exact)
+    with stage("analytics.insight.top_5_most_viewed_recipes"):
+        views = interactions[interactions["type"] == "view"]
+        if sample:
+            top_5_views = per_recipe_counts(views).nlargest(5)
+        else:
+            views_count = views.groupby("recipeId").size().sort_values(ascending=False)
+            top_5_views = views_count.head(5)
+        insights.append(("Top 5 Most Viewed Recipes", top_5_views.to_dict()))
 
     # -----------------------------------------------------------------
     # 2. Top 5 Most Liked Recipes
     # -----------------------------------------------------------------
-    likes = interactions[interactions["type"] == "like"]
-    likes_count = likes.groupby("recipeId").size().sort_values(ascending=False)
-    top_5_likes = likes_count.head(5)
-    insights.append(("Top 5 Most Liked Recipes", top_5_likes.to_dict()))
+    with stage("analytics.insight.top_5_most_liked_recipes"):
+        likes = interactions[interactions["type"] == "like"]
+        if sample:
+            top_5_likes = per_recipe_counts(likes).nlargest(5)
+        else:
+            likes_count = likes.groupby("recipeId").size().sort_values(ascending=False)
+            top_5_likes = likes_count.head(5)
+        insights.append(("Top 5 Most Liked Recipes", top_5_likes.to_dict()))
 
     # -----------------------------------------------------------------
     # 3. Average Rating Per Recipe
     # -----------------------------------------------------------------
-    ratings = interactions[interactions["type"] == "rating"]
-    if not ratings.empty:
-        avg_rating = ratings.groupby("recipeId")["rating"].mean().sort_values(ascending=False)
-        insights.append(("Average Rating Per Recipe", avg_rating.to_dict()))
-    else:
-        insights.append(("Average Rating Per Recipe", {}))
+    with stage("analytics.insight.average_rating_per_recipe"):
+        ratings = interactions[interactions["type"] == "rating"]
+        if not ratings.empty and sample:
+            estimate = sampling.stratum_mean(ratings, "rating").sort_values("estimate", ascending=False)
+            insights.append((
+                "Average Rating Per Recipe (estimate ± 95% bound)",
+                {row.Index: with_error(row.estimate, row.error) for row in estimate.itertuples()},
+            ))
+        elif not ratings.empty:
+            avg_rating = ratings.groupby("recipeId")["rating"].mean().sort_values(ascending=False)
+            insights.append(("Average Rating Per Recipe", avg_rating.to_dict()))
+        else:
+            insights.append(("Average Rating Per Recipe", {}))
 
     # -----------------------------------------------------------------
     # 4. Difficulty Distribution Across Recipes
     # -----------------------------------------------------------------
-    difficulty_dist = recipes["difficulty"].value_counts().to_dict()
-    insights.append(("Difficulty Distribution", difficulty_dist))
+    with stage("analytics.insight.difficulty_distribution_across_recipes"):
+        difficulty_dist = recipes["difficulty"].value_counts().to_dict()
+        insights.append(("Difficulty Distribution", difficulty_dist))
 
     # -----------------------------------------------------------------
     # 5. Average Preparation Time
     # -----------------------------------------------------------------
-    avg_prep = recipes["prepTimeMinutes"].mean()
-    insights.append(("Average Preparation Time (minutes)", float(avg_prep)))
+    with stage("analytics.insight.average_preparation_time"):
+        avg_prep = recipes["prepTimeMinutes"].mean()
+        insights.append(("Average Preparation Time (minutes)", float(avg_prep)))
 
     # -----------------------------------------------------------------
     # 6. Most Common Ingredients
     # -----------------------------------------------------------------
-    ingredient_counts = ingredients["name"].value_counts()
-    top_10_ingredients = ingredient_counts.head(10)
-    insights.append(("Most Common Ingredients (Top 10)", top_10_ingredients.to_dict()))
+    with stage("analytics.ingredient_index", rows=len(ingredients)):
+        ingredient_index = build_ingredient_index(ingredients, recipes["recipeId"])
+
+    with stage("analytics.insight.most_common_ingredients"):
+        ingredient_counts = ingredient_index.frequency().sort_values(ascending=False, kind="stable")
+        top_10_ingredients = ingredient_counts.head(10)
+        insights.append(("Most Common Ingredients (Top 10)", top_10_ingredients.to_dict()))
 
     # -----------------------------------------------------------------
     # 7. Correlation Between Prep Time and Likes
     # -----------------------------------------------------------------
-    likes_per_recipe = likes.groupby("recipeId").size().reset_index(name="likeCount")
-    merged_prep_likes = recipes.merge(likes_per_recipe, on="recipeId", how="left").fillna(0)
-    if merged_prep_likes["likeCount"].nunique() > 1:
-        corr = merged_prep_likes["prepTimeMinutes"].corr(merged_prep_likes["likeCount"])
-    else:
-        corr = 0.0
-    insights.append(("Correlation between prep time and likes", float(corr)))
+    with stage("analytics.insight.correlation_between_prep_time_and_likes"):
+        likes_per_recipe = per_recipe_counts(likes).reset_index(name="likeCount")
+        merged_prep_likes = recipes.merge(likes_per_recipe, on="recipeId", how="left").fillna(0)
+        if merged_prep_likes["likeCount"].nunique() > 1:
+            corr = merged_prep_likes["prepTimeMinutes"].corr(merged_prep_likes["likeCount"])
+        else:
+            corr = 0.0
+        insights.append(("Correlation between prep time and likes", float(corr)))
 
     # -----------------------------------------------------------------
     # 8. Average Number of Ingredients Per Recipe
     # -----------------------------------------------------------------
-    ing_per_recipe = ingredients.groupby("recipeId").size().mean()
-    insights.append(("Average number of ingredients per recipe", float(ing_per_recipe)))
+    with stage("analytics.insight.average_number_of_ingredients_per_recipe"):
+        ing_per_recipe = ingredients.groupby("recipeId").size().mean()
+        insights.append(("Average number of ingredients per recipe", float(ing_per_recipe)))
 
     # -----------------------------------------------------------------
     # 9. Recipes with the Longest Total Cooking Time
     # -----------------------------------------------------------------
-    longest_times = recipes.sort_values("totalTimeMinutes", ascending=False).head(5)
-    insights.append(
-        (
-            "Top 5 Longest Recipes by Total Time",
-            longest_times[["recipeId", "title", "totalTimeMinutes"]].to_dict(orient="records"),
+    with stage("analytics.insight.recipes_with_the_longest_total_cooking_time"):
+        longest_times = recipes.sort_values("totalTimeMinutes", ascending=False).head(5)
+        insights.append(
+            (
+                "Top 5 Longest Recipes by Total Time",
+                longest_times[["recipeId", "title", "totalTimeMinutes"]].to_dict(orient="records"),
+            )
         )
-    )
 
     # -----------------------------------------------------------------
     # 10. View-to-Like Conversion Rate
     # -----------------------------------------------------------------
-    view_like = pd.merge(
-        views.groupby("recipeId").size().reset_index(name="views"),
-        likes.groupby("recipeId").size().reset_index(name="likes"),
-        on="recipeId",
-        how="outer",
-    ).fillna(0)
-
-    view_like["conversion_rate"] = view_like["likes"] / view_like["views"].replace(0, 1)
-    top_conv = view_like.sort_values("conversion_rate", ascending=False).head(5)
-    insights.append(
-        (
-            "View-to-Like Conversion Rate (Top 5)",
-            top_conv.to_dict(orient="records"),
+    with stage("analytics.insight.view_to_like_conversion_rate"):
+        view_like = pd.merge(
+            per_recipe_counts(views).reset_index(name="views"),
+            per_recipe_counts(likes).reset_index(name="likes"),
+            on="recipeId",
+            how="outer",
+        ).fillna(0)
+
+        view_like["conversion_rate"] = view_like["likes"] / view_like["views"].replace(0, 1)
+        top_conv = view_like.sort_values("conversion_rate", ascending=False).head(5)
+        insights.append(
+            (
+                "View-to-Like Conversion Rate (Top 5)",
+                top_conv.to_dict(orient="records"),
+            )
         )
-    )
 
     # -----------------------------------------------------------------
     # 11. Ingredients associated with high engagement (avg likes)
     # -----------------------------------------------------------------
-    likes_per_recipe = likes.groupby("recipeId").size().reset_index(name="likeCount")
-    recipe_ing = ingredients[["recipeId", "name"]]
-    ing_likes = recipe_ing.merge(likes_per_recipe, on="recipeId", how="left").fillna(0)
-    ing_engagement = (
-        ing_likes.groupby("name")["likeCount"]
-        .mean()
-        .sort_values(ascending=False)
-        .head(10)
-    )
-    insights.append(
-        (
-            "Ingredients associated with high engagement (avg likes)",
-            ing_engagement.to_dict(),
+    with stage("analytics.insight.ingredients_associated_with_high_engagement_avg_likes"):
+        ing_engagement = (
+            ingredient_index.engagement(per_recipe_counts(likes))
+            .sort_values(ascending=False, kind="stable")
+            .head(10)
+        )
+        insights.append(
+            (
+                "Ingredients associated with high engagement (avg likes)",
+                ing_engagement.to_dict(),
+            )
+        )
+
+    # -----------------------------------------------------------------
+    # 12. Ingredients Most Often Used Together
+    # -----------------------------------------------------------------
+    with stage("analytics.insight.ingredients_most_often_used_together"):
+        top_pairs = ingredient_index.top_pairs(10)
+        insights.append(("Ingredient pairs used together most often (Top 10)", top_pairs.to_dict()))
+
+    # -----------------------------------------------------------------
+    # 13. Unique Viewers / Cooks per Recipe (HyperLogLog, approximate)
+    # -----------------------------------------------------------------
+    # distinct users don't scale up from a sample, so previews leave them out
+    if sample:
+        insights.append(("Unique Viewers / Cooks per Recipe", "skipped in --sample mode"))
+    else:
+        with stage("analytics.unique_user_sketches", rows=len(interactions)):
+            sketches = UniqueUserSketches.build(interactions)
+            sketches.save(os.path.join(data_dir, ".sketches", "unique_users.npz"))
+
+        with stage("analytics.insight.unique_viewers_and_cooks_per_recipe"):
+            for label, kind in (("Viewers", "view"), ("Cooks", "cook_attempt")):
+                top_unique = sketches.unique_users_per_recipe(types=[kind]).head(5)
+                insights.append(
+                    (
+                        f"Top 5 Recipes by Unique {label} (approx. ± std error)",
+                        {
+                            rid: f"{row.unique_users:.0f} ± {row.std_error:.0f}"
+                            for rid, row in top_unique.iterrows()
+                        },
+                    )
+                )
+
+    # -----------------------------------------------------------------
+    # 14. Recipe Features vs. Likes (Pearson / Spearman, bootstrap CI)
+    # -----------------------------------------------------------------
+    with stage("analytics.recipe_feature_matrix", rows=len(recipes)):
+        features, _ = feature_matrix(recipes, ingredients, interactions,
+                                     weights=interactions.get(sampling.WEIGHT_COLUMN))
+
+    with stage("analytics.insight.feature_correlations_with_likes", rows=len(recipes)):
+        corr_report = correlation_report(features, n_boot=CORRELATION_BOOTSTRAP)
+        # likes is feature_a of the likes x cookAttempts pair and feature_b of the rest
+        with_likes = corr_report[(corr_report["feature_a"] == "likes") | (corr_report["feature_b"] == "likes")]
+        other = with_likes["feature_a"].where(with_likes["feature_b"] == "likes", with_likes["feature_b"])
+        insights.append(
+            (
+                "Correlation of recipe features with likes (r [95% bootstrap CI])",
+                {
+                    f"{feature} ({row.method})": f"{row.r:.3f} [{row.ci_low:.3f}, {row.ci_high:.3f}]"
+                    for feature, row in zip(other, with_likes.itertuples())
+                },
+            )
         )
-    )
 
     # -----------------------------------------------------------------
     # PRINT INSIGHTS
     # -----------------------------------------------------------------
     print("\n=== RECIPE ANALYTICS REPORT ===\n")
+    if sample:
+        print(
+            f"PREVIEW: {len(interactions):,} sampled interactions standing for "
+            f"{interactions[sampling.WEIGHT_COLUMN].sum():,.0f} ({sample:g} per recipe and type, seed {seed}).\n"
+            "Interaction counts per recipe and type are exact; values marked ± are estimates."
+        )
     for title, data in insights:
         print(f"\n{title}:")
         print(data)
 
+    if sample or not charts:
+        return insights
+
     # -----------------------------------------------------------------
     # VISUALIZATIONS
     # -----------------------------------------------------------------
+    import matplotlib.pyplot as plt
+
+    os.makedirs(images_dir, exist_ok=True)
 
     # 1) Top 5 Most Viewed Recipes (bar)
-    if not top_5_views.empty:
-        plt.figure(figsize=(8, 4))
-        top_5_views.plot(kind="bar")
-        plt.title("Top 5 Most Viewed Recipes")
-        plt.ylabel("Views")
-        plt.xlabel("Recipe ID")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "views_top5.png"))
-        plt.close()
+    with stage("analytics.chart.top_5_most_viewed_recipes"):
+        if not top_5_views.empty:
+            plt.figure(figsize=(8, 4))
+            top_5_views.plot(kind="bar")
+            plt.title("Top 5 Most Viewed Recipes")
+            plt.ylabel("Views")
+            plt.xlabel("Recipe ID")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "views_top5.png"))
+            plt.close()
 
     # 2) Top 5 Most Liked Recipes (bar)
-    if not top_5_likes.empty:
-        plt.figure(figsize=(8, 4))
-        top_5_likes.plot(kind="bar")
-        plt.title("Top 5 Most Liked Recipes")
-        plt.ylabel("Likes")
-        plt.xlabel("Recipe ID")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "likes_top5.png"))
-        plt.close()
+    with stage("analytics.chart.top_5_most_liked_recipes"):
+        if not top_5_likes.empty:
+            plt.figure(figsize=(8, 4))
+            top_5_likes.plot(kind="bar")
+            plt.title("Top 5 Most Liked Recipes")
+            plt.ylabel("Likes")
+            plt.xlabel("Recipe ID")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "likes_top5.png"))
+            plt.close()
 
     # 3) Rating distribution (histogram)
-    if not ratings.empty:
-        plt.figure(figsize=(6, 4))
-        ratings["rating"].plot(kind="hist", bins=5)
-        plt.title("Rating Distribution")
-        plt.xlabel("Rating")
-        plt.ylabel("Count")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "rating_distribution.png"))
-        plt.close()
+    with stage("analytics.chart.rating_distribution"):
+        if not ratings.empty:
+            plt.figure(figsize=(6, 4))
+            ratings["rating"].plot(kind="hist", bins=5)
+            plt.title("Rating Distribution")
+            plt.xlabel("Rating")
+            plt.ylabel("Count")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "rating_distribution.png"))
+            plt.close()
 
     # 4) Difficulty distribution (pie)
-    plt.figure(figsize=(6, 6))
-    recipes["difficulty"].value_counts().plot(kind="pie", autopct="%1.1f%%")
-    plt.title("Recipe Difficulty Distribution")
-    plt.ylabel("")
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMAGES_DIR, "difficulty_distribution.png"))
-    plt.close()
-
-    # 5) Prep time vs likes (scatter)
-    if not merged_prep_likes.empty:
-        plt.figure(figsize=(6, 4))
-        plt.scatter(merged_prep_likes["prepTimeMinutes"], merged_prep_likes["likeCount"])
-        plt.title("Prep Time vs Likes")
-        plt.xlabel("Prep Time (minutes)")
-        plt.ylabel("Likes")
+    with stage("analytics.chart.difficulty_distribution"):
+        plt.figure(figsize=(6, 6))
+        recipes["difficulty"].value_counts().plot(kind="pie", autopct="%1.1f%%")
+        plt.title("Recipe Difficulty Distribution")
+        plt.ylabel("")
         plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "prep_vs_likes.png"))
+        plt.savefig(os.path.join(images_dir, "difficulty_distribution.png"))
         plt.close()
 
+    # 5) Prep time vs likes (scatter)
+    with stage("analytics.chart.prep_time_vs_likes"):
+        if not merged_prep_likes.empty:
+            plt.figure(figsize=(6, 4))
+            plt.scatter(merged_prep_likes["prepTimeMinutes"], merged_prep_likes["likeCount"])
+            plt.title("Prep Time vs Likes")
+            plt.xlabel("Prep Time (minutes)")
+            plt.ylabel("Likes")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "prep_vs_likes.png"))
+            plt.close()
+
     # 6) Top 10 most common ingredients (bar)
-    if not top_10_ingredients.empty:
-        plt.figure(figsize=(10, 4))
-        top_10_ingredients.plot(kind="bar")
-        plt.title("Top 10 Most Common Ingredients")
-        plt.ylabel("Count")
-        plt.xlabel("Ingredient")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "ingredient_frequency_top10.png"))
-        plt.close()
+    with stage("analytics.chart.top_10_most_common_ingredients"):
+        if not top_10_ingredients.empty:
+            plt.figure(figsize=(10, 4))
+            top_10_ingredients.plot(kind="bar")
+            plt.title("Top 10 Most Common Ingredients")
+            plt.ylabel("Count")
+            plt.xlabel("Ingredient")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "ingredient_frequency_top10.png"))
+            plt.close()
 
     # 7) Interactions by type (bar)
-    inter_type_counts = interactions["type"].value_counts()
-    if not inter_type_counts.empty:
-        plt.figure(figsize=(6, 4))
-        inter_type_counts.plot(kind="bar")
-        plt.title("Interactions by Type")
-        plt.ylabel("Count")
-        plt.xlabel("Type")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMAGES_DIR, "interactions_by_type.png"))
-        plt.close()
+    with stage("analytics.chart.interactions_by_type"):
+        inter_type_counts = interactions["type"].value_counts()
+        if not inter_type_counts.empty:
+            plt.figure(figsize=(6, 4))
+            inter_type_counts.plot(kind="bar")
+            plt.title("Interactions by Type")
+            plt.ylabel("Count")
+            plt.xlabel("Type")
+            plt.tight_layout()
+            plt.savefig(os.path.join(images_dir, "interactions_by_type.png"))
+            plt.close()
 
     print(
         "\nCharts saved in the 'images' folder:\n"
@@ -232,6 +389,16 @@ def main():
         " - interactions_by_type.png\n"
     )
 
+    return insights
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Recipe analytics report and charts.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--images-dir", default=IMAGES_DIR)
+    parser.add_argument("--sample", type=float, default=None, metavar="FRACTION",
+                        help="preview on a stratified sample of the interactions (e.g. 0.05); no charts")
+    parser.add_argument("--seed", type=int, default=0, help="sample seed")
+    parser.add_argument("--no-charts", action="store_true", help="print the insights only")
+    args = parser.parse_args()
+    main(args.data_dir, args.images_dir, sample=args.sample, seed=args.seed, charts=not args.no_charts)
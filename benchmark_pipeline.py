@@ -0,0 +1,323 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from queue import Empty
+
+# -------------------------------------------------------------------
+# CONFIG
+# -------------------------------------------------------------------
+DEFAULT_SCALES = [10_000, 1_000_000, 10_000_000]
+DEFAULT_EMULATOR_SCALES = [10_000]
+RESULTS_PATH = os.path.join("benchmarks", "results.json")
+BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+DEFAULT_THRESHOLD = 0.25   # fail when a stage is >25% slower than baseline
+FIRESTORE_BATCH_SIZE = 500
+STAGE_TIMEOUT_S = 6 * 60 * 60   # a stage still running after this is treated as hung
+
+# -------------------------------------------------------------------
+# HELPERS
+# -------------------------------------------------------------------
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def count_csv_rows(path):
+    with open(path, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def clear_emulator(project_id):
+    """Wipes every document in the emulator between runs."""
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    url = f"http://{host}/emulator/v1/projects/{project_id}/databases/(default)/documents"
+    # urlopen raises HTTPError on a non-2xx status
+    urllib.request.urlopen(urllib.request.Request(url, method="DELETE"), timeout=60).close()
+
+
+def load_dataset_into_firestore(db, data_dir):
+    """
+    Writes a generated dataset into Firestore with batched commits, rebuilding
+    the nested recipe documents that etl_export_to_csv.py flattens.
+    Returns the number of documents written.
+    """
+    import pandas as pd
+
+    recipes = pd.read_csv(os.path.join(data_dir, "recipe.csv"))
+    ingredients = pd.read_csv(os.path.join(data_dir, "ingredients.csv"), keep_default_na=False)
+    steps = pd.read_csv(os.path.join(data_dir, "steps.csv"))
+    interactions = pd.read_csv(os.path.join(data_dir, "interactions.csv"))
+
+    ing_by_recipe = {
+        rid: g.drop(columns="recipeId").to_dict(orient="records")
+        for rid, g in ingredients.groupby("recipeId")
+    }
+    steps_by_recipe = {
+        rid: g.drop(columns="recipeId").to_dict(orient="records")
+        for rid, g in steps.groupby("recipeId")
+    }
+
+    def write_all(collection, id_field, records):
+        written = 0
+        batch = db.batch()
+        for i, rec in enumerate(records, 1):
+            doc = {k: v for k, v in rec.items() if isinstance(v, list) or not pd.isna(v)}
+            batch.set(db.collection(collection).document(doc[id_field]), doc)
+            if i % FIRESTORE_BATCH_SIZE == 0:
+                batch.commit()
+                batch = db.batch()
+            written = i
+        batch.commit()
+        return written
+
+    recipe_docs = []
+    for rec in recipes.to_dict(orient="records"):
+        rec["tags"] = rec["tags"].split(",") if isinstance(rec["tags"], str) else []
+        rec["ingredients"] = ing_by_recipe.get(rec["recipeId"], [])
+        rec["steps"] = steps_by_recipe.get(rec["recipeId"], [])
+        recipe_docs.append(rec)
+
+    written = write_all("recipes", "recipeId", recipe_docs)
+    written += write_all("interactions", "interactionId", interactions.to_dict(orient="records"))
+    return written
+
+# -------------------------------------------------------------------
+# STAGES
+#
+# Each stage runs in a fresh process so peak RSS is per stage. A stage
+# returns {"rows": ..., "ops": ...}; ops are Firestore documents
+# read or written (0 for file-only stages).
+# -------------------------------------------------------------------
+def stage_seed(data_dir, work_dir):
+    import seed_firestore
+
+    db = seed_firestore.init_firestore()
+    ops = seed_firestore.seed_users(db)
+    ops += seed_firestore.seed_recipes(db)
+    ops += seed_firestore.seed_interactions(db)
+    return {"rows": ops, "ops": ops}
+
+
+def stage_load(data_dir, work_dir):
+    import seed_firestore
+
+    db = seed_firestore.init_firestore()
+    ops = load_dataset_into_firestore(db, data_dir)
+    return {"rows": ops, "ops": ops}
+
+
+def stage_export(data_dir, work_dir):
+    import etl_export_to_csv
+
+    db = etl_export_to_csv.init_firestore()
+    out_dir = os.path.join(work_dir, "export")
+    recipes_df, _, _ = etl_export_to_csv.export_recipes(db, out_dir)
+    interactions_df = etl_export_to_csv.export_interactions(db, out_dir)
+    docs = len(recipes_df) + len(interactions_df)
+    return {"rows": docs, "ops": docs}
+
+
+def stage_validate(data_dir, work_dir):
+    import validate_csv_data
+
+    report = validate_csv_data.run_validation(
+        data_dir, os.path.join(work_dir, "validation_report.json")
+    )
+    rows = sum(t["valid"] + t["invalid"] for t in report.values())
+    return {"rows": rows, "ops": 0}
+
+
+def stage_analytics(data_dir, work_dir):
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import analytics
+
+    analytics.main(data_dir, os.path.join(work_dir, "images"))
+    return {"rows": count_csv_rows(os.path.join(data_dir, "interactions.csv")), "ops": 0}
+
+
+FILE_STAGES = {
+    "validate": stage_validate,
+    "analytics": stage_analytics,
+}
+EMULATOR_STAGES = {
+    "seed": stage_seed,
+    "load": stage_load,
+    "export": stage_export,
+}
+
+
+def _stage_worker(stage_name, data_dir, work_dir, queue):
+    stages = {**FILE_STAGES, **EMULATOR_STAGES}
+    try:
+        # keep the report readable: stages print their own progress
+        sys.stdout = open(os.devnull, "w")
+        start = time.perf_counter()
+        out = stages[stage_name](data_dir, work_dir)
+        wall = time.perf_counter() - start
+        queue.put({"ok": True, "wall_time_s": wall, "peak_rss_mb": peak_rss_mb(), **out})
+    except Exception as exc:
+        queue.put({"ok": False, "error": f"{type(exc).__name__}: {exc}"})
+
+
+def run_stage(stage_name, data_dir, work_dir):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_worker, args=(stage_name, data_dir, work_dir, queue))
+    proc.start()
+    # poll, so a worker that dies without reporting (OOM kill, segfault)
+    # fails the stage instead of blocking on the queue forever
+    deadline = time.monotonic() + STAGE_TIMEOUT_S
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1.0)
+        except Empty:
+            if proc.exitcode is not None:
+                # the worker may have put its result just before exiting
+                try:
+                    result = queue.get(timeout=1.0)
+                except Empty:
+                    raise RuntimeError(
+                        f"stage {stage_name} failed: worker exited with code {proc.exitcode} "
+                        f"without a result") from None
+            elif time.monotonic() > deadline:
+                proc.terminate()
+                proc.join()
+                raise RuntimeError(f"stage {stage_name} failed: no result after {STAGE_TIMEOUT_S}s")
+    proc.join()
+    if not result.pop("ok"):
+        raise RuntimeError(f"stage {stage_name} failed: {result['error']}")
+
+    wall = result["wall_time_s"]
+    return {
+        "wall_time_s": round(wall, 4),
+        "peak_rss_mb": result["peak_rss_mb"],
+        "rows": result["rows"],
+        "rows_per_s": round(result["rows"] / wall, 1) if wall > 0 else None,
+        "firestore_ops_per_s": round(result["ops"] / wall, 1) if result["ops"] and wall > 0 else None,
+    }
+
+# -------------------------------------------------------------------
+# BASELINE COMPARISON
+# -------------------------------------------------------------------
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Returns a list of regression messages for every stage/scale whose wall
+    time exceeds the baseline by more than `threshold` (a fraction).
+    """
+    base_by_key = {(r["stage"], r["scale"]): r for r in baseline.get("runs", [])}
+    regressions = []
+    for run in results["runs"]:
+        base = base_by_key.get((run["stage"], run["scale"]))
+        if base is None:
+            continue
+        limit = base["wall_time_s"] * (1 + threshold)
+        if run["wall_time_s"] > limit:
+            regressions.append(
+                f"{run['stage']} @ {run['scale']:,}: {run['wall_time_s']:.3f}s "
+                f"vs baseline {base['wall_time_s']:.3f}s (+{threshold:.0%} allowed)"
+            )
+    return regressions
+
+
+def print_table(runs):
+    print(f"{'stage':<10} {'scale':>12} {'wall s':>10} {'peak MB':>9} {'rows/s':>14} {'fs ops/s':>10}")
+    for r in runs:
+        print(
+            f"{r['stage']:<10} {r['scale']:>12,} {r['wall_time_s']:>10.3f} "
+            f"{r['peak_rss_mb'] or 0:>9.1f} {r['rows_per_s'] or 0:>14,.0f} "
+            f"{r['firestore_ops_per_s'] or 0:>10,.0f}"
+        )
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+def run_benchmarks(scales, emulator_scales, work_root, keep_data=False):
+    from generate_dataset import generate_dataset
+
+    runs = []
+    use_emulator = bool(os.environ.get("FIRESTORE_EMULATOR_HOST"))
+    if emulator_scales and not use_emulator:
+        print(" FIRESTORE_EMULATOR_HOST not set: skipping emulator stages.")
+
+    for scale in sorted(set(scales) | set(emulator_scales if use_emulator else [])):
+        work_dir = os.path.join(work_root, f"scale_{scale}")
+        data_dir = os.path.join(work_dir, "data")
+        print(f" Generating {scale:,} interactions...")
+        generate_dataset(data_dir, scale)
+
+        stages = []
+        if use_emulator and scale in emulator_scales:
+            stages += list(EMULATOR_STAGES)
+        if scale in scales:
+            stages += list(FILE_STAGES)
+
+        for stage_name in stages:
+            if stage_name == "seed":
+                from seed_firestore import PROJECT_ID
+                clear_emulator(PROJECT_ID)
+            print(f"   {stage_name}...")
+            runs.append({"stage": stage_name, "scale": scale, **run_stage(stage_name, data_dir, work_dir)})
+
+        if not keep_data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage at several data scales.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="interaction counts for the file-based stages")
+    parser.add_argument("--emulator-scales", type=int, nargs="*", default=DEFAULT_EMULATOR_SCALES,
+                        help="interaction counts for the Firestore emulator stages")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline instead of comparing")
+    parser.add_argument("--work-dir", default=None, help="where generated datasets go (default: temp dir)")
+    parser.add_argument("--keep-data", action="store_true")
+    args = parser.parse_args()
+
+    work_root = args.work_dir or tempfile.mkdtemp(prefix="recipe_bench_")
+    results = run_benchmarks(args.scales, args.emulator_scales, work_root, args.keep_data)
+
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=4)
+    print_table(results["runs"])
+    print(f"\n Results saved to {args.results}")
+
+    if args.update_baseline:
+        shutil.copyfile(args.results, args.baseline)
+        print(f" Baseline updated: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print("\n Performance regressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(" No regressions against baseline.")
+    else:
+        print(f" No baseline at {args.baseline}; run with --update-baseline to create one.")
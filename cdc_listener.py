@@ -0,0 +1,898 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_sources import (EVENT_COLUMNS, EVENT_TYPES, INTERACTION_EVENT_MAP, DataSource, empty_events)
+from dedup import SeenIndex
+from etl_export_to_csv import INTERACTION_COLUMNS, column_buffers, extend_columns, init_firestore
+from heavy_hitters import HeavyHitterTracker
+from instrumentation import stage
+
+# -------------------------------------------------------------------
+# Change-data capture: Firestore listeners -> segments + live state
+#
+#   on_snapshot(interactions | recipe_events)  -> queue
+#   flusher thread, every FLUSH_INTERVAL_S or MAX_BATCH changes:
+#       1. write the micro-batch as one columnar segment file
+#          (segments/<collection>-<seq>.npz, write-then-rename)
+#       2. fold it into the in-memory state
+#       3. write checkpoint.json (read time of the last snapshot whose
+#          changes are all in segments, last seq)
+#   on_snapshot(recipes) -> recipes.json (small, rewritten on change)
+#
+# The state is an EventTable: every live document's dashboard events as
+# numpy columns. ADDED and MODIFIED replace a document's events and
+# REMOVED drops them; funnel counts and event previews are both masks
+# over the same columns, so they are served from memory and always agree.
+# Every ADDED document also feeds a heavy_hitters.HeavyHitterTracker
+# (all-time top recipes per interaction type; Space-Saving cannot take
+# counts back, so deletes stay counted there).
+#
+# Segments are the source of truth. On restart the state is rebuilt from
+# them and the listener re-subscribes to the whole collection. Firestore
+# sends every document in the first snapshot; documents whose
+# update_time is not after the checkpoint's read time were captured
+# before and are skipped, newer ones are captured, and documents in the
+# state but missing from the snapshot are recorded as REMOVED. So a
+# restart picks up every write and delete made while it was down,
+# however old the event times (late or replayed events), at the cost of
+# streaming the collection once. Writes also go through a
+# dedup.SeenIndex keyed on (document id, update time), so a change
+# delivered twice is applied once, while a document deleted and created
+# again is a new change.
+#
+# Segments are compacted in tiers: whenever COMPACT_FANOUT consecutive
+# segments cover the same order of magnitude of micro-batches (1-9,
+# 10-99, ...), they are merged into one. Only the newest, small segments
+# are rewritten, and each change about log10(batches) times in all.
+#
+# One process owns a CDC directory: the listener that takes the lock
+# file subscribes and writes. Any other listener on the same directory
+# (say the dashboard next to `python cdc_listener.py`) only tails the
+# segment files into its own state, and takes over when the owner exits.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+CDC_DIR = os.path.join(DATA_DIR, ".cdc")
+FLUSH_INTERVAL_S = 2.0
+MAX_BATCH = 500
+COMPACT_FANOUT = 10
+NS_PER_DAY = 86_400 * 1_000_000_000
+
+# collection -> document fields kept in segments, the event time field
+# and the recipe field
+SPECS = {
+    "interactions": {"columns": INTERACTION_COLUMNS, "ts": "createdAt", "recipe": "recipeId"},
+    "recipe_events": {"columns": EVENT_COLUMNS, "ts": "timestamp", "recipe": "recipe_id"},
+}
+OPS = {"ADDED": 1, "MODIFIED": 0, "REMOVED": -1}
+SEGMENT_RE = re.compile(r"-(\d{12})(?:-(\d{12}))?\.npz$")
+
+
+def to_ns(values):
+    """Event times (datetimes or ISO strings) -> int64 ns since epoch, UTC."""
+    iso = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    ts = pd.to_datetime(pd.Series(iso, dtype=object), utc=True, format="ISO8601", errors="coerce")
+    return ts.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def time_ns(value):
+    """A Firestore read / update time -> int ns since epoch (0 when missing)."""
+    return 0 if value is None else pd.Timestamp(value).value
+
+# -------------------------------------------------------------------
+# SEGMENTS
+# -------------------------------------------------------------------
+def segment_seq(path):
+    """(first, last) micro-batch sequence numbers covered by a segment."""
+    m = SEGMENT_RE.search(path)
+    first = int(m.group(1))
+    return first, int(m.group(2) or first)
+
+
+def segment_tier(path, fanout=COMPACT_FANOUT):
+    """k such that the segment covers fanout^k .. fanout^(k+1) - 1 micro-batches."""
+    first, last = segment_seq(path)
+    span, tier = last - first + 1, 0
+    while span >= fanout:
+        span //= fanout
+        tier += 1
+    return tier
+
+
+def list_segments(cdc_dir, collection):
+    """Segment paths in sequence order, minus any already merged into a compacted one."""
+    paths = glob.glob(os.path.join(cdc_dir, "segments", f"{collection}-*.npz"))
+    # widest range first for each start, so a compacted file shadows its inputs
+    paths.sort(key=lambda p: (segment_seq(p)[0], -segment_seq(p)[1]))
+    live, covered_to = [], 0
+    for path in paths:
+        first, last = segment_seq(path)
+        if last <= covered_to:
+            continue
+        live.append(path)
+        covered_to = last
+    return live
+
+
+def write_segment(cdc_dir, collection, first, last, frame):
+    os.makedirs(os.path.join(cdc_dir, "segments"), exist_ok=True)
+    name = f"{collection}-{first:012d}" + (f"-{last:012d}" if last != first else "") + ".npz"
+    path = os.path.join(cdc_dir, "segments", name)
+    arrays = {
+        col: (frame[col].to_numpy() if frame[col].dtype.kind in "iuf"
+              else frame[col].fillna("").astype(str).to_numpy(dtype=str))
+        for col in frame.columns
+    }
+    tmp = os.path.join(cdc_dir, "segments", f".{name}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+def read_segments(cdc_dir, collection, paths=None):
+    """
+    Every captured change for a collection (or just those in `paths`),
+    oldest first, as one DataFrame with the micro-batch number in _seq.
+    """
+    frames = []
+    for path in list_segments(cdc_dir, collection) if paths is None else paths:
+        with np.load(path, allow_pickle=False) as z:
+            frame = pd.DataFrame({k: z[k] for k in z.files})
+        if "_seq" not in frame:
+            # written before segments carried it: one micro-batch per file
+            frame["_seq"] = segment_seq(path)[0]
+        if "_update_ns" not in frame:
+            frame["_update_ns"] = np.int64(0)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=SPECS[collection]["columns"]
+                            + ["_doc_id", "_op", "_ts_ns", "_update_ns", "_seq"])
+    out = pd.concat(frames, ignore_index=True)
+    for col in out.columns:
+        if out[col].dtype.kind == "U":
+            out[col] = out[col].astype(object).replace("", None)
+    return out
+
+
+def compact_segments(cdc_dir, collection, paths=None):
+    """
+    Merges consecutive segments (default: all of them) into one covering
+    the same sequence range.
+    """
+    paths = list_segments(cdc_dir, collection) if paths is None else paths
+    if len(paths) < 2:
+        return None
+    first, last = segment_seq(paths[0])[0], segment_seq(paths[-1])[1]
+    merged = write_segment(cdc_dir, collection, first, last, read_segments(cdc_dir, collection, paths))
+    # the merged file now shadows the inputs, so a crash here is harmless
+    for p in paths:
+        if p != merged:
+            os.remove(p)
+    return merged
+
+
+def compact_tiers(cdc_dir, collection, fanout=COMPACT_FANOUT):
+    """
+    Merges each run of `fanout` consecutive segments of one tier, oldest
+    first, until no such run is left. Returns the merged paths.
+    """
+    merged = []
+    while True:
+        paths = list_segments(cdc_dir, collection)
+        tiers = [segment_tier(p, fanout) for p in paths]
+        run = next((i for i in range(len(paths) - fanout + 1) if len(set(tiers[i:i + fanout])) == 1), None)
+        if run is None:
+            return merged
+        merged.append(compact_segments(cdc_dir, collection, paths[run:run + fanout]))
+
+
+class DirectoryLock:
+    """
+    Exclusive, non-blocking lock on <directory>/listener.lock. The OS
+    releases it when the holding process exits, even on a crash, so a
+    stale lock never blocks the next start.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "listener.lock")
+        self._file = None
+
+    def acquire(self):
+        """True if this process holds the lock (now or already)."""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        self._file = f
+        return True
+
+    def holder(self):
+        """Pid written by the current holder ("" if unknown)."""
+        try:
+            with open(self.path) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# -------------------------------------------------------------------
+# LIVE STATE
+# -------------------------------------------------------------------
+def _grow(arrays, size):
+    """Reallocates every array in `arrays` (a dict) to at least `size`, doubling; new cells are zero."""
+    capacity = len(next(iter(arrays.values())))
+    if size <= capacity:
+        return
+    capacity = max(size, 2 * capacity, 1024)
+    for name, values in arrays.items():
+        grown = np.zeros(capacity, dtype=values.dtype) if values.dtype != object else np.empty(capacity, object)
+        grown[:len(values)] = values
+        arrays[name] = grown
+
+
+class Vocab:
+    """Integer codes for a small set of values (recipe ids, event types)."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        return self._codes.get(value, -1)
+
+    def encode(self, values):
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        lookup = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            value = None if pd.isna(value) else value
+            if value not in self._codes:
+                self._codes[value] = len(self.values)
+                self.values.append(value)
+            lookup[i] = self._codes[value]
+        return lookup[codes]
+
+
+class EventTable:
+    """
+    Dashboard events of the live documents as numpy columns. Each document
+    has a slot; each event row records its document's slot and the
+    document version it was derived from, and is live while the document
+    is still at that version. Replacing or removing a document is then one
+    store into doc_version, however many events it had. Dead rows are
+    dropped once they outnumber the live ones.
+    """
+
+    def __init__(self):
+        self.slots = {}  # live document id -> slot
+        self.docs = {"version": np.zeros(0, dtype=np.int64), "recipe": np.zeros(0, dtype=np.int32),
+                     "rows": np.zeros(0, dtype=np.int64)}
+        self.rows = {"slot": np.zeros(0, dtype=np.int64), "version": np.zeros(0, dtype=np.int64),
+                     "recipe": np.zeros(0, dtype=np.int32), "type": np.zeros(0, dtype=np.int32),
+                     "ts": np.zeros(0, dtype=np.int64), "user": np.zeros(0, dtype=object),
+                     "source": np.zeros(0, dtype=object)}
+        self.recipes = Vocab()
+        self.types = Vocab()
+        self.n_slots = 0
+        self.n = 0
+        self.dead = 0
+
+    def _retire(self, slots):
+        self.docs["version"][slots] += 1
+        self.dead += int(self.docs["rows"][slots].sum())
+        self.docs["rows"][slots] = 0
+
+    def remove(self, doc_ids):
+        slots = np.array([self.slots.pop(d) for d in doc_ids if d in self.slots], dtype=np.int64)
+        self._retire(slots)
+
+    def put(self, doc_ids, recipe_ids, events):
+        """
+        Replaces the events of documents `doc_ids` (one entry each) with
+        `events` (_doc_id + EVENT_COLUMNS, timestamp in ns).
+        """
+        slots = np.empty(len(doc_ids), dtype=np.int64)
+        for i, doc_id in enumerate(doc_ids):
+            slot = self.slots.get(doc_id)
+            if slot is None:
+                slot = self.slots[doc_id] = self.n_slots
+                self.n_slots += 1
+            slots[i] = slot
+        _grow(self.docs, self.n_slots)
+        self._retire(slots)
+        self.docs["recipe"][slots] = self.recipes.encode(recipe_ids)
+
+        row_slots = slots[pd.Index(doc_ids).get_indexer(events["_doc_id"])]
+        k = len(row_slots)
+        np.add.at(self.docs["rows"], row_slots, 1)
+        _grow(self.rows, self.n + k)
+        new = slice(self.n, self.n + k)
+        self.rows["slot"][new] = row_slots
+        self.rows["version"][new] = self.docs["version"][row_slots]
+        self.rows["recipe"][new] = self.recipes.encode(events["recipe_id"])
+        self.rows["type"][new] = self.types.encode(events["event_type"])
+        self.rows["ts"][new] = events["timestamp"].to_numpy(dtype=np.int64)
+        self.rows["user"][new] = events["user_id"].to_numpy(dtype=object)
+        self.rows["source"][new] = events["source"].to_numpy(dtype=object)
+        self.n += k
+        if self.dead > self.n - self.dead:
+            self._vacuum()
+
+    def _live(self):
+        return self.rows["version"][:self.n] == self.docs["version"][self.rows["slot"][:self.n]]
+
+    def _vacuum(self):
+        live = self._live()
+        n_live = int(live.sum())
+        for values in self.rows.values():
+            values[:n_live] = values[:self.n][live]
+            values[n_live:self.n] = None if values.dtype == object else 0
+        self.n = n_live
+        self.dead = 0
+
+    def document_ids(self, recipe_id=None):
+        ids = np.array(list(self.slots), dtype=object)
+        if recipe_id is None:
+            return ids.tolist()
+        slots = np.fromiter(self.slots.values(), dtype=np.int64, count=len(ids))
+        return ids[self.docs["recipe"][slots] == self.recipes.code(recipe_id)].tolist()
+
+    def select(self, since_ns, recipe_id=None):
+        """Copies of the columns of the live rows with ts >= since_ns (of one recipe)."""
+        mask = self._live() & (self.rows["ts"][:self.n] >= since_ns)
+        if recipe_id is not None:
+            mask &= self.rows["recipe"][:self.n] == self.recipes.code(recipe_id)
+        return {name: values[:self.n][mask] for name, values in self.rows.items()}
+
+    def counts(self, since_ns):
+        """recipe_id x event_type counts of the live rows with ts >= since_ns."""
+        rows = self.select(since_ns)
+        shape = (len(self.recipes.values), len(self.types.values))
+        flat = np.bincount(rows["recipe"].astype(np.int64) * shape[1] + rows["type"],
+                           minlength=shape[0] * shape[1])
+        return pd.DataFrame(flat.reshape(shape), index=pd.Index(self.recipes.values, dtype=object),
+                            columns=pd.Index(self.types.values, dtype=object))
+
+    def frame(self, rows):
+        """Rows from select() as an EVENT_COLUMNS frame."""
+        return pd.DataFrame({
+            "user_id": rows["user"],
+            "recipe_id": np.array(self.recipes.values, dtype=object)[rows["recipe"]],
+            "event_type": np.array(self.types.values, dtype=object)[rows["type"]],
+            "timestamp": rows["ts"],
+            "source": rows["source"],
+        }, columns=EVENT_COLUMNS)
+
+# -------------------------------------------------------------------
+# LISTENER
+# -------------------------------------------------------------------
+class CdcListener:
+    def __init__(self, db, cdc_dir=CDC_DIR, collection="interactions",
+                 flush_interval=FLUSH_INTERVAL_S, max_batch=MAX_BATCH):
+        if collection not in SPECS:
+            raise ValueError(f"Unsupported collection: {collection}")
+        self.db = db
+        self.cdc_dir = cdc_dir
+        self.collection = collection
+        self.spec = SPECS[collection]
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self.table = EventTable()  # events of every live document
+        self.recipes = {}      # doc id -> recipe document
+        self.heavy_hitters = HeavyHitterTracker()
+        self.seen = SeenIndex()  # (doc id, update time) of the writes already captured
+        self.watermark_ns = 0  # newest event time captured
+        self.read_time_ns = 0  # snapshot read time covered by the segments
+        self.seq = 0
+        self.owner = False
+        self.stats = {"applied": 0, "duplicates": 0, "batches": 0}
+
+        self.recipes_ready = threading.Event()
+        self._dir_lock = DirectoryLock(cdc_dir)
+        self._recipes_mtime = None
+        self._resume_ns = 0
+        self._first_snapshot = False
+        self._changes = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watches = []
+        self._thread = None
+
+    # ---------------------------------------------------------------
+    # state
+    # ---------------------------------------------------------------
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.cdc_dir, f"{self.collection}.checkpoint.json")
+
+    @property
+    def recipes_path(self):
+        return os.path.join(self.cdc_dir, "recipes.json")
+
+    def _write_json(self, path, obj):
+        os.makedirs(self.cdc_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(obj, f, default=str)
+        os.replace(tmp, path)
+
+    def restore(self):
+        """Rebuilds the state from the segments on disk."""
+        with stage("cdc.restore") as s:
+            if self.owner:
+                compact_tiers(self.cdc_dir, self.collection)
+            s.rows = self._catch_up()
+            self._load_recipes_file()
+
+    def _catch_up(self):
+        """Applies the segment rows written after self.seq; returns how many."""
+        paths = [p for p in list_segments(self.cdc_dir, self.collection) if segment_seq(p)[1] > self.seq]
+        if not paths:
+            return 0
+        try:
+            changes = read_segments(self.cdc_dir, self.collection, paths)
+        except FileNotFoundError:
+            # compacted while we listed; the next call finds the merged file
+            return 0
+        changes = changes[changes["_seq"] > self.seq]
+        self._apply(changes)
+        self.seen.check_and_add(self._change_keys(changes[changes["_op"] != -1]))
+        self.seq = segment_seq(paths[-1])[1]
+        return len(changes)
+
+    def _load_recipes_file(self):
+        try:
+            mtime = os.path.getmtime(self.recipes_path)
+        except OSError:
+            return
+        if mtime == self._recipes_mtime:
+            return
+        with open(self.recipes_path) as f:
+            recipes = json.load(f)
+        with self._lock:
+            self.recipes = recipes
+        self._recipes_mtime = mtime
+        self.recipes_ready.set()
+
+    @staticmethod
+    def _change_keys(frame):
+        """"<doc id>@<update time ns>" per change: the same for a redelivered write only."""
+        return (frame["_doc_id"].astype(str) + "@" + frame["_update_ns"].astype(np.int64).astype(str)).to_numpy()
+
+    def _derive_events(self, docs):
+        """Dashboard events (_doc_id + EVENT_COLUMNS, timestamp in ns) of live documents."""
+        if self.collection == "recipe_events":
+            return docs.assign(timestamp=docs["_ts_ns"])[["_doc_id"] + EVENT_COLUMNS]
+        # the interactions_to_events mapping, keeping each event's document id
+        base = docs[docs["type"].isin(list(INTERACTION_EVENT_MAP))]
+        completed = base[(base["type"] == "cook_attempt") & (base["successStatus"] == "success")]
+        return pd.concat([
+            pd.DataFrame({"_doc_id": rows["_doc_id"], "user_id": rows["userId"], "recipe_id": rows["recipeId"],
+                          "event_type": event_type, "timestamp": rows["_ts_ns"], "source": rows["source"]})
+            for rows, event_type in [(base, base["type"].map(INTERACTION_EVENT_MAP)),
+                                     (completed, "complete_cook")]
+        ], ignore_index=True)
+
+    def _apply(self, changes):
+        """Folds a frame of captured changes, oldest first, into the state."""
+        if changes.empty:
+            return
+        # a document ends up as its last change
+        last = changes.drop_duplicates("_doc_id", keep="last")
+        live = last[last["_op"] != -1]
+        events = self._derive_events(live)
+        added = changes[changes["_op"] == 1]
+        if self.collection == "recipe_events":
+            # back to the interactions vocabulary the top-K panel ranks by
+            kinds = {event_type: kind for kind, event_type in INTERACTION_EVENT_MAP.items()}
+            added = pd.DataFrame({"recipeId": added["recipe_id"],
+                                  "type": added["event_type"].map(lambda t: kinds.get(t, t))})
+
+        with self._lock:
+            self.table.remove(last.loc[last["_op"] == -1, "_doc_id"].tolist())
+            self.table.put(live["_doc_id"].tolist(), live[self.spec["recipe"]].to_numpy(dtype=object), events)
+            if len(live):
+                self.watermark_ns = max(self.watermark_ns, int(live["_ts_ns"].max()))
+            if len(added):
+                self.heavy_hitters.update_frame(added)
+
+    # ---------------------------------------------------------------
+    # Firestore callbacks (run on the client's listener thread)
+    # ---------------------------------------------------------------
+    def _on_events(self, docs, changes, read_time):
+        changes = [(change.type.name, change.document) for change in changes]
+        if self._first_snapshot:
+            self._first_snapshot = False
+            if self._resume_ns:
+                changes = self._resume_changes(docs)
+        for kind, document in changes:
+            self._changes.put((kind, document.id, document.to_dict() or {}, time_ns(document.update_time)))
+        # every change before this marker is queued, so once flushed the
+        # segments cover this read time
+        self._changes.put(("SYNC", None, None, time_ns(read_time)))
+
+    def _resume_changes(self, docs):
+        """
+        The first snapshot after a restart -> (kind, document) for what
+        changed while the listener was down.
+        """
+        with self._lock:
+            known = set(self.table.slots)
+        present = set()
+        changes = []
+        for doc in docs:
+            present.add(doc.id)
+            if time_ns(doc.update_time) > self._resume_ns:
+                changes.append(("MODIFIED" if doc.id in known else "ADDED", doc))
+        for doc_id in known - present:
+            changes.append(("REMOVED", _Removed(doc_id)))
+        return changes
+
+    def _on_recipes(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.recipes.pop(change.document.id, None)
+                else:
+                    self.recipes[change.document.id] = change.document.to_dict() or {}
+            snapshot = dict(self.recipes)
+        self._write_json(self.recipes_path, snapshot)
+        self.recipes_ready.set()
+
+    # ---------------------------------------------------------------
+    # micro-batching
+    # ---------------------------------------------------------------
+    def _drain(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._changes.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch):
+        """Writes one micro-batch as a segment, then applies it. Returns rows kept."""
+        syncs = [read_ns for op, _, _, read_ns in batch if op == "SYNC"]
+        batch = [change for change in batch if change[0] != "SYNC"]
+        kept = self._flush_changes(batch) if batch else 0
+        if syncs and syncs[-1] > self.read_time_ns:
+            self.read_time_ns = syncs[-1]
+            self._write_json(self.checkpoint_path, {
+                "collection": self.collection,
+                "seq": self.seq,
+                "read_time_ns": self.read_time_ns,
+                "watermark_ns": self.watermark_ns,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            })
+        return kept
+
+    def _flush_changes(self, batch):
+        ops, doc_ids, datas, update_ns = zip(*batch)
+        buffers = column_buffers(self.spec["columns"])
+        extend_columns(buffers, datas, self.spec["columns"])
+        frame = pd.DataFrame(buffers, columns=self.spec["columns"])
+        frame["_doc_id"] = list(doc_ids)
+        frame["_op"] = np.array([OPS[op] for op in ops], dtype=np.int8)
+        frame["_ts_ns"] = to_ns(frame[self.spec["ts"]])
+        frame["_update_ns"] = np.array(update_ns, dtype=np.int64)
+
+        # a removal needs only the document id
+        frame = frame[(frame["_ts_ns"] > 0) | (frame["_op"] == -1)]
+        # a REMOVED change carries the deleted document's last update time
+        written = (frame["_op"] != -1).to_numpy()
+        duplicate = np.zeros(len(frame), dtype=bool)
+        duplicate[written] = ~self.seen.check_and_add(self._change_keys(frame[written]))
+        self.stats["duplicates"] += int(duplicate.sum())
+        frame = frame[~duplicate]
+        if frame.empty:
+            return 0
+
+        with stage("cdc.flush", rows=len(frame)):
+            self.seq += 1
+            frame = frame.assign(_seq=self.seq)
+            write_segment(self.cdc_dir, self.collection, self.seq, self.seq, frame)
+            self._apply(frame)
+
+        self.stats["applied"] += len(frame)
+        self.stats["batches"] += 1
+        if self.seq % COMPACT_FANOUT == 0:
+            compact_tiers(self.cdc_dir, self.collection)
+        return len(frame)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._changes.empty():
+            if self.owner:
+                self.flush(self._drain())
+            elif not self._stop.wait(self.flush_interval):
+                if self._dir_lock.acquire():
+                    self._take_over()
+                else:
+                    self._catch_up()
+                    self._load_recipes_file()
+
+    # ---------------------------------------------------------------
+    # lifecycle
+    # ---------------------------------------------------------------
+    def _subscribe(self):
+        """Starts the Firestore listeners, resuming from the checkpoint's read time."""
+        checkpoint = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        self._resume_ns = self.read_time_ns = int(checkpoint.get("read_time_ns", 0))
+        self._first_snapshot = True
+        self._watches = [
+            self.db.collection(self.collection).on_snapshot(self._on_events),
+            self.db.collection("recipes").on_snapshot(self._on_recipes),
+        ]
+
+    def _take_over(self):
+        """A follower whose owner exited: catch up on its last segments, then subscribe."""
+        self._catch_up()
+        self.owner = True
+        print(f" CDC listener took over {self.cdc_dir} (pid {os.getpid()})")
+        self._subscribe()
+
+    def start(self):
+        """
+        Restores the state and either subscribes (when this listener gets
+        the directory lock) or follows the owner's segment files.
+        """
+        self.owner = self._dir_lock.acquire()
+        self.restore()
+        if self.owner:
+            self._subscribe()
+        self._thread = threading.Thread(target=self._run, name="cdc-flusher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._dir_lock.release()
+
+    # ---------------------------------------------------------------
+    # queries
+    # ---------------------------------------------------------------
+    def event_counts(self, days: int, recipe_ids=None) -> pd.DataFrame:
+        """recipe_id x EVENT_TYPES counts over the last `days` whole days."""
+        first_day = (time.time_ns() - days * NS_PER_DAY) // NS_PER_DAY
+        with self._lock:
+            counts = self.table.counts(first_day * NS_PER_DAY)
+        counts = counts.reindex(columns=EVENT_TYPES, fill_value=0)
+        counts = counts[counts.index.notna() & (counts.sum(axis=1) > 0)]
+        if recipe_ids is not None:
+            counts = counts.reindex(list(recipe_ids), fill_value=0)
+        counts.index.name = "recipe_id"
+        return counts
+
+    def top_recipes(self, kind, k=5) -> pd.DataFrame:
+        """All-time top-k recipes for one interaction type, from the live summaries."""
+        with self._lock:
+            return self.heavy_hitters.top(kind, k)
+
+    def events(self, days: int, recipe_id=None) -> pd.DataFrame:
+        """Live events of the last `days` days (of one recipe, or all), oldest first."""
+        since = time.time_ns() - days * NS_PER_DAY
+        with self._lock:
+            events = self.table.frame(self.table.select(since, recipe_id))
+        if events.empty:
+            return empty_events()
+        events["timestamp"] = pd.to_datetime(events["timestamp"], utc=True)
+        return events.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+    def document_ids(self, recipe_id=None):
+        """Ids of the live documents (of one recipe, or all)."""
+        with self._lock:
+            return self.table.document_ids(recipe_id)
+
+
+class _Removed:
+    """Stands in for the snapshot of a document deleted while the listener was down."""
+
+    def __init__(self, doc_id):
+        self.id = doc_id
+        self.update_time = None
+
+    def to_dict(self):
+        return {}
+
+
+class CdcSource(DataSource):
+    """
+    Dashboard backend fed by a CdcListener running in-process: funnel
+    counts and event previews both come from its in-memory state, so
+    nothing re-reads Firestore or the segment files per request.
+    """
+
+    label = "live change stream (CDC): `recipes` + `interactions`"
+
+    def __init__(self, listener: CdcListener, ready_timeout=30.0):
+        self.listener = listener
+        self.db = listener.db
+        # the dashboard reads the recipe list once at startup
+        listener.recipes_ready.wait(ready_timeout)
+
+    def load_recipes(self):
+        with self.listener._lock:
+            docs = dict(self.listener.recipes)
+        return [
+            {
+                "id": doc_id,
+                "name": data.get("name") or data.get("title"),
+                "difficulty": data.get("difficulty", "Unknown"),
+                "avg_rating": data.get("avg_rating"),
+                "total_cook_time_min": data.get("total_cook_time_min", data.get("totalTimeMinutes")),
+                "tags": data.get("tags"),
+            }
+            for doc_id, data in docs.items()
+        ]
+
+    def fetch_all_events(self, days: int) -> pd.DataFrame:
+        return self.listener.events(days)
+
+    def fetch_recipe_events(self, recipe_id: str, days: int) -> pd.DataFrame:
+        return self.listener.events(days, recipe_id)
+
+    def event_counts(self, days: int, recipe_ids=None) -> pd.DataFrame:
+        return self.listener.event_counts(days, recipe_ids)
+
+    def top_recipes(self, kind, k=5):
+        return self.listener.top_recipes(kind, k)
+
+# -------------------------------------------------------------------
+# EMULATOR SMOKE TEST
+# -------------------------------------------------------------------
+def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def smoke_test(db, cdc_dir, n_events=200, flush_interval=0.5):
+    """
+    End to end against the Firestore emulator (or a FaultyFirestore):
+    write and delete events, check the live counts and the event preview
+    agree, start a second listener on the same directory (it follows),
+    write late events and delete one while no listener is subscribed,
+    then check the follower's takeover and a restart captured exactly
+    what changed.
+    """
+    recipe_id = f"cdc_smoke_{time.time_ns()}"
+    db.collection("recipes").document(recipe_id).set({"title": "CDC smoke test", "difficulty": "easy"})
+
+    def write(n, age=timedelta(0)):
+        refs, batch = [], db.batch()
+        created = datetime.now(timezone.utc) - age
+        for i in range(n):
+            ref = db.collection("interactions").document()
+            refs.append(ref)
+            batch.set(ref, {"interactionId": ref.id, "userId": f"user_{i % 7}", "recipeId": recipe_id,
+                            "type": "view", "createdAt": created, "source": "smoke"})
+            if (i + 1) % 500 == 0:
+                batch.commit()
+                batch = db.batch()
+        batch.commit()
+        return refs
+
+    def views(listener):
+        counts = listener.event_counts(1, [recipe_id])
+        return int(counts.loc[recipe_id, "view"])
+
+    def agree(listener, expected):
+        return views(listener) == expected and len(listener.events(1, recipe_id)) == expected
+
+    listener = CdcListener(db, cdc_dir, flush_interval=flush_interval).start()
+    assert listener.owner, f"{cdc_dir} is locked by pid {listener._dir_lock.holder()}"
+    refs = write(n_events)
+    refs[0].delete()
+    expected = n_events - 1
+    assert wait_for(lambda: agree(listener, expected)), f"live count {views(listener)} != {expected}"
+    assert wait_for(lambda: recipe_id in listener.recipes), "recipe document not captured"
+
+    follower = CdcListener(db, cdc_dir, flush_interval=flush_interval).start()
+    assert not follower.owner, "second listener on the same directory subscribed too"
+    assert wait_for(lambda: agree(follower, expected)), f"follower count {views(follower)} != {expected}"
+    listener.stop()
+
+    # older than any event-time lookback, written while nothing listens
+    late = write(n_events, age=timedelta(hours=1))
+    late[0].delete()
+    expected += n_events - 1
+    assert wait_for(lambda: follower.owner), "follower did not take over"
+    assert wait_for(lambda: agree(follower, expected)), f"after takeover: {views(follower)} != {expected}"
+    follower.stop()
+
+    restarted = CdcListener(db, cdc_dir, flush_interval=flush_interval).start()
+    assert agree(restarted, expected), "state not restored from segments"
+    write(n_events)
+    expected += n_events
+    assert wait_for(lambda: agree(restarted, expected)), f"after restart: {views(restarted)} != {expected}"
+    time.sleep(2 * restarted.flush_interval)
+    assert agree(restarted, expected), "events were double counted"
+    restarted.stop()
+    print(f" CDC smoke test passed: {expected} live events after 2 deletes, a takeover and a restart")
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream Firestore changes into segments and live aggregates.")
+    parser.add_argument("--collection", default="interactions", choices=list(SPECS))
+    parser.add_argument("--cdc-dir", default=CDC_DIR)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL_S)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--compact", action="store_true", help="merge the segment files and exit")
+    parser.add_argument("--smoke-test", action="store_true",
+                        help="end-to-end check against the emulator (needs FIRESTORE_EMULATOR_HOST)")
+    args = parser.parse_args()
+
+    lock = DirectoryLock(args.cdc_dir)
+    owned = f" {args.cdc_dir} is owned by another listener (pid {{}}); stop it or pass another --cdc-dir"
+
+    if args.compact:
+        if not lock.acquire():
+            raise SystemExit(owned.format(lock.holder() or "?"))
+        merged = compact_segments(args.cdc_dir, args.collection)
+        lock.release()
+        print(f" Compacted into {merged}" if merged else " Nothing to compact.")
+    elif args.smoke_test:
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            parser.error("--smoke-test writes test documents; point FIRESTORE_EMULATOR_HOST at an emulator")
+        smoke_test(init_firestore(), args.cdc_dir)
+    else:
+        listener = CdcListener(init_firestore(), args.cdc_dir, args.collection,
+                               args.flush_interval, args.max_batch).start()
+        if not listener.owner:
+            listener.stop()
+            raise SystemExit(owned.format(lock.holder() or "?"))
+        print(f" Listening on `{args.collection}` and `recipes` (Ctrl+C to stop)...")
+        try:
+            while True:
+                time.sleep(10)
+                print(f" applied={listener.stats['applied']} batches={listener.stats['batches']} "
+                      f"duplicates={listener.stats['duplicates']} seq={listener.seq}")
+        except KeyboardInterrupt:
+            listener.stop()
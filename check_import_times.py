@@ -0,0 +1,95 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# -------------------------------------------------------------------
+# Import-time budgets for the entry points
+#
+# Each module is imported in a fresh interpreter under
+# `python -X importtime`, which logs every import with its cumulative
+# time in microseconds. A module fails when
+#   - its own cumulative import time is over budget (best of --repeat
+#     runs; --scale loosens every budget on a slower machine), or
+#   - it pulled in a heavy package it should only load on the code path
+#     that uses it (matplotlib for charts, gradio and plotly for the UI,
+#     firebase_admin for a Firestore connection, scipy.stats for sample
+#     error bounds).
+# Exit status 1 on any failure, so it can run as a regression check.
+# -------------------------------------------------------------------
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+UI = ["gradio", "plotly"]
+FIRESTORE = ["firebase_admin", "google.cloud.firestore"]
+CHARTS = ["matplotlib"]
+
+# module: (budget in ms, packages it must not import)
+BUDGETS = {
+    "analytics": (1000, CHARTS + UI + FIRESTORE + ["scipy.stats"]),
+    # pandas loads with the first frame to validate, not at import
+    "validate_csv_data": (200, CHARTS + UI + FIRESTORE + ["pandas"]),
+    "etl_export_to_csv": (1000, CHARTS + UI + FIRESTORE),
+    "seed_firestore": (400, CHARTS + UI + FIRESTORE),
+    "recipe_analytics_gradio_app": (1200, CHARTS + UI + FIRESTORE),
+    "pipeline": (200, CHARTS + UI + FIRESTORE + ["pandas"]),
+    "ingest_service": (900, CHARTS + UI + FIRESTORE),
+    "cdc_listener": (900, CHARTS + UI + FIRESTORE),
+}
+
+
+def import_profile(module):
+    """(cumulative import time of `module` in ms, names of every module imported)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=REPO_DIR)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    own_ms, imported = None, set()
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            own_ms = int(cumulative) / 1000
+    return own_ms, imported
+
+
+def heavy_imports(imported, forbidden):
+    return sorted(p for p in forbidden if any(n == p or n.startswith(p + ".") for n in imported))
+
+
+def check(modules, scale=1.0, repeat=3):
+    """Prints one line per module; returns the number of failures."""
+    failures = 0
+    for module in modules:
+        budget, forbidden = BUDGETS[module]
+        runs = [import_profile(module) for _ in range(repeat)]
+        ms = min(r[0] for r in runs)
+        heavy = heavy_imports(runs[0][1], forbidden)
+        over = ms > budget * scale
+        failures += over or bool(heavy)
+        status = "FAIL" if over or heavy else "ok"
+        extra = f"  imports {', '.join(heavy)}" if heavy else ""
+        print(f" {status:<4} {module:<30} {ms:7.0f} ms (budget {budget * scale:.0f}){extra}")
+    return failures
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check entry-point import times against budgets.")
+    parser.add_argument("modules", nargs="*", metavar="MODULE", help="default: all of " + ", ".join(BUDGETS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    parser.add_argument("--repeat", type=int, default=3, help="imports per module; the fastest counts")
+    args = parser.parse_args()
+    unknown = sorted(set(args.modules) - set(BUDGETS))
+    if unknown:
+        parser.error(f"no budget for {', '.join(unknown)}")
+
+    failed = check(args.modules or list(BUDGETS), args.scale, args.repeat)
+    if failed:
+        print(f"\n{failed} module(s) over budget or importing heavy packages eagerly.")
+        sys.exit(1)
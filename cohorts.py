@@ -0,0 +1,172 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import find_table, read_table
+
+# -------------------------------------------------------------------
+# Weekly cohort retention on user bitmaps
+#
+# userIds -> dense codes 0..n_users-1, so a set of users is a packed bit
+# array of n_users / 8 bytes (np.packbits layout: code c is bit 7 - c % 8
+# of byte c // 8). Two matrices of shape (n_weeks, n_bytes):
+#   active[w]  users with at least one interaction in week w
+#   cohort[w]  users whose cohort is week w (users.createdAt, or the week
+#              of their first interaction when there is no users row)
+# Retention of cohort c after k weeks is popcount(cohort[c] & active[c+k]),
+# computed for all cohorts at once per k. A year of weeks over a million
+# users is about 6.5 MB per matrix; no cohort x week join of user ids.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+WEEK_NS = 7 * 86_400 * 10**9
+DEFAULT_MAX_WEEKS = 12
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    """Number of set bits in each row of a packed uint8 bitmap matrix."""
+    if hasattr(np, "bitwise_count") and bits.shape[-1] % 8 == 0:
+        return np.bitwise_count(bits.view(np.uint64)).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT[bits].sum(axis=-1, dtype=np.int64)
+
+
+def to_ns(values):
+    """ISO timestamps -> int64 UTC nanoseconds (NaT as the int64 minimum)."""
+    stamps = pd.to_datetime(pd.Series(values), utc=True, format="ISO8601", errors="coerce")
+    return stamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def week_origin(ts_ns):
+    """Monday 00:00 UTC of the week holding the earliest timestamp."""
+    first = pd.Timestamp(int(ts_ns.min()), tz="UTC").normalize()
+    return (first - pd.Timedelta(days=first.weekday())).value
+
+
+class UserBitmaps:
+    def __init__(self, user_ids, origin_ns, active, cohort_week):
+        self.user_ids = user_ids
+        self.origin_ns = origin_ns
+        self.active = active
+        self.cohort_week = cohort_week
+        self.n_bytes = active.shape[1]
+
+    @property
+    def n_weeks(self):
+        return self.active.shape[0]
+
+    def week_start(self, week):
+        return pd.Timestamp(self.origin_ns + int(week) * WEEK_NS, tz="UTC")
+
+    @staticmethod
+    def _bitmap(n_weeks, n_bytes, weeks, codes):
+        bits = np.zeros((n_weeks, n_bytes), dtype=np.uint8)
+        np.bitwise_or.at(bits, (weeks, codes >> 3), (0x80 >> (codes & 7)).astype(np.uint8))
+        return bits
+
+    @classmethod
+    def build(cls, interactions: pd.DataFrame, users: pd.DataFrame = None):
+        """
+        interactions needs userId and createdAt; users (optional) needs
+        userId and createdAt. Users without a signup date fall back to the
+        week of their first interaction, and are left out if they have none.
+        """
+        event_ts = to_ns(interactions["createdAt"])
+        valid = event_ts != np.iinfo(np.int64).min
+        event_users = interactions["userId"].to_numpy(dtype=object)[valid]
+        event_ts = event_ts[valid]
+
+        if users is not None:
+            users_signup = to_ns(users["createdAt"])
+            # no signup date and no activity: there is no cohort to put them in
+            keep = (users_signup != np.iinfo(np.int64).min) | users["userId"].isin(event_users).to_numpy()
+            users, users_signup = users[keep], users_signup[keep]
+        known_ids = users["userId"].to_numpy(dtype=object) if users is not None else np.empty(0, dtype=object)
+        codes, user_ids = pd.factorize(np.concatenate([known_ids, event_users]))
+        user_codes, event_codes = codes[:len(known_ids)], codes[len(known_ids):]
+        n_users = len(user_ids)
+
+        signup_ts = np.full(n_users, np.iinfo(np.int64).min)
+        if users is not None:
+            signup_ts[user_codes] = users_signup
+        has_signup = signup_ts != np.iinfo(np.int64).min
+
+        stamps = np.concatenate([event_ts, signup_ts[has_signup]])
+        if not len(stamps):
+            return cls(user_ids, 0, np.zeros((0, 0), dtype=np.uint8), np.zeros(n_users, dtype=np.int64))
+        origin = week_origin(stamps)
+        event_week = (event_ts - origin) // WEEK_NS
+
+        # cohort: signup week, else first active week
+        first_week = np.full(n_users, np.iinfo(np.int64).max)
+        np.minimum.at(first_week, event_codes, event_week)
+        cohort_week = np.where(has_signup, (signup_ts - origin) // WEEK_NS, first_week)
+
+        n_weeks = int(max(event_week.max(initial=0), cohort_week.max(initial=0))) + 1
+        # pad to whole uint64 words so popcount can run 8 bytes at a time
+        n_bytes = ((n_users + 63) // 64) * 8
+        # repeated (week, user) pairs just set the same bit again
+        active = cls._bitmap(n_weeks, n_bytes, event_week, event_codes)
+        return cls(user_ids, origin, active, cohort_week)
+
+    def cohort_bitmaps(self):
+        codes = np.arange(len(self.user_ids))
+        return self._bitmap(self.n_weeks, self.n_bytes, self.cohort_week, codes)
+
+    def active_users(self) -> pd.Series:
+        """Distinct active users per week."""
+        return pd.Series(popcount(self.active), index=[self.week_start(w) for w in range(self.n_weeks)])
+
+    def retention(self, max_weeks=DEFAULT_MAX_WEEKS) -> pd.DataFrame:
+        """
+        Rows: cohort week start. Columns: cohort_size, then the number of
+        cohort users active k = 0..max_weeks weeks later (NaN where week
+        c + k is past the data).
+        """
+        cohorts = self.cohort_bitmaps()
+        sizes = popcount(cohorts)
+        counts = np.full((self.n_weeks, max_weeks + 1), np.nan)
+        for k in range(min(max_weeks, self.n_weeks - 1) + 1):
+            counts[:self.n_weeks - k, k] = popcount(cohorts[:self.n_weeks - k] & self.active[k:])
+
+        table = pd.DataFrame(counts, columns=list(range(max_weeks + 1)),
+                             index=pd.Index([self.week_start(w).date() for w in range(self.n_weeks)],
+                                            name="cohort_week"))
+        table.insert(0, "cohort_size", sizes)
+        return table[table["cohort_size"] > 0]
+
+    def retention_rates(self, max_weeks=DEFAULT_MAX_WEEKS) -> pd.DataFrame:
+        counts = self.retention(max_weeks)
+        rates = counts.drop(columns="cohort_size").div(counts["cohort_size"], axis=0)
+        rates.insert(0, "cohort_size", counts["cohort_size"])
+        return rates
+
+
+def load_users(data_dir=DATA_DIR):
+    """users.csv(.gz/.zst) if the export has one, else None."""
+    if not os.path.exists(find_table(data_dir, "users")):
+        return None
+    return read_table(data_dir, "users", usecols=["userId", "createdAt"])
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weekly cohort retention from users and interactions.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--max-weeks", type=int, default=DEFAULT_MAX_WEEKS)
+    parser.add_argument("--counts", action="store_true", help="print user counts instead of rates")
+    parser.add_argument("--out", default=None, help="write the retention table as CSV")
+    args = parser.parse_args()
+
+    users = load_users(args.data_dir)
+    if users is None:
+        print(" No users table found; cohorts are the week of each user's first interaction.")
+    bitmaps = UserBitmaps.build(read_table(args.data_dir, "interactions", usecols=["userId", "createdAt"]), users)
+    table = bitmaps.retention(args.max_weeks) if args.counts else bitmaps.retention_rates(args.max_weeks)
+    if args.out:
+        table.to_csv(args.out)
+    pd.set_option("display.width", 200)
+    print(table.round(3))
@@ -0,0 +1,92 @@
+import gzip
+import io
+import os
+
+# -------------------------------------------------------------------
+# Compressed pipeline files
+#
+# Tables are written as <name>.csv, <name>.csv.gz or <name>.csv.zst and
+# readers take whichever exists (newest first), so every stage reads
+# compressed exports without knowing how they were written. pandas
+# streams through the (de)compressor chunk by chunk in both directions;
+# nothing is decompressed to a temporary file.
+# -------------------------------------------------------------------
+
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# gzip 6 is the usual default; zstd 3 compresses as well and runs faster
+LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def compression_of(path):
+    """'gzip', 'zstd' or 'none', from the file extension."""
+    for name, ext in COMPRESSIONS.items():
+        if ext and path.endswith(ext):
+            return name
+    return "none"
+
+
+def table_file(data_dir, name, compression="none"):
+    """Path a table is written to for the given compression."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression} (choose from {', '.join(COMPRESSIONS)})")
+    return os.path.join(data_dir, f"{name}.csv{COMPRESSIONS[compression]}")
+
+
+def find_table(data_dir, name):
+    """
+    The existing file for a table, preferring the most recently written
+    variant. Falls back to the plain .csv path so callers get the usual
+    FileNotFoundError.
+    """
+    candidates = [table_file(data_dir, name, c) for c in COMPRESSIONS]
+    existing = [p for p in candidates if os.path.exists(p)]
+    if not existing:
+        return candidates[0]
+    return max(existing, key=os.path.getmtime)
+
+
+def read_table(data_dir, name, **kwargs):
+    """pd.read_csv on whichever variant of the table exists."""
+    # imported on use: pandas dominates the import time of every caller
+    import pandas as pd
+
+    return pd.read_csv(find_table(data_dir, name), **kwargs)
+
+
+def _pandas_compression(compression):
+    if compression == "none":
+        return None
+    level_key = "compresslevel" if compression == "gzip" else "level"
+    return {"method": compression, level_key: LEVELS[compression]}
+
+
+def write_table(df, data_dir, name, compression="none"):
+    """
+    Writes a table with streaming compression and removes the other
+    variants, so a stale uncompressed copy can't shadow the new export.
+    """
+    path = table_file(data_dir, name, compression)
+    df.to_csv(path, index=False, compression=_pandas_compression(compression))
+    for other in COMPRESSIONS:
+        stale = table_file(data_dir, name, other)
+        if stale != path and os.path.exists(stale):
+            os.remove(stale)
+    return path
+
+
+def open_text(path, mode="rt"):
+    """Text stream over a plain, .gz or .zst file (for JSON reports and the like)."""
+    compression = compression_of(path)
+    mode = mode.replace("t", "")
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        import zstandard
+
+        raw = open(path, "rb" if "r" in mode else "wb")
+        if "r" in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=LEVELS["zstd"]).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
@@ -0,0 +1,470 @@
+import abc
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import find_table, read_table
+from firestore_client import resilient
+
+# ------------------------------------------------------------------------------
+# Data sources for the Gradio dashboard
+#
+# The dashboard needs three operations:
+#   - load_recipes()                      -> list of recipe dicts
+#   - fetch_recipe_events(recipe_id, days) -> DataFrame of recipe events
+#   - event_counts(days, recipe_ids)       -> recipe_id x event_type counts
+#
+# FirestoreSource reads them live from Firestore, LocalFileSource serves them
+# from the CSVs produced by etl_export_to_csv.py, and cdc_listener.CdcSource
+# from aggregates kept up to date by Firestore change listeners.
+# ------------------------------------------------------------------------------
+
+EVENT_COLUMNS = ["user_id", "recipe_id", "event_type", "timestamp", "source"]
+
+DATA_DIR = "data"
+SERVICE_ACCOUNT_PATH = "serviceAccountKey.json"
+
+# interactions.csv `type` -> recipe_events `event_type`
+INTERACTION_EVENT_MAP = {
+    "view": "view",
+    "like": "favorite",
+    "cook_attempt": "start_cook",
+}
+EVENT_TYPES = ["view", "favorite", "start_cook", "complete_cook"]
+
+
+def empty_events():
+    return pd.DataFrame(columns=EVENT_COLUMNS)
+
+
+class DataSource(abc.ABC):
+    """
+    Interface every dashboard backend implements.
+    """
+
+    label = ""
+    # Firestore client the backend reads through, if it has one
+    db = None
+
+    @abc.abstractmethod
+    def load_recipes(self):
+        ...
+
+    @abc.abstractmethod
+    def fetch_recipe_events(self, recipe_id: str, days: int) -> pd.DataFrame:
+        ...
+
+    @abc.abstractmethod
+    def fetch_all_events(self, days: int) -> pd.DataFrame:
+        ...
+
+    @property
+    def reference_time(self):
+        """End of the dashboard's "last N days" windows (now, for live backends)."""
+        return datetime.now(timezone.utc)
+
+    def top_recipes(self, kind, k=5):
+        """
+        All-time top-k recipes for an interaction type (recipeId index;
+        count and error columns) kept live by a streaming backend, or None
+        when the backend has no such summaries.
+        """
+        return None
+
+    def event_counts(self, days: int, recipe_ids=None) -> pd.DataFrame:
+        """
+        Counts events per recipe and event type in one pass.
+
+        Returns a DataFrame indexed by recipe_id with one column per entry
+        in EVENT_TYPES. recipe_ids restricts the result (missing recipes get
+        zero rows); None means every recipe that has events.
+        """
+        events = self.fetch_all_events(days)
+        if recipe_ids is not None:
+            events = events[events["recipe_id"].isin(recipe_ids)]
+        counts = (
+            events.groupby(["recipe_id", "event_type"]).size()
+            .unstack("event_type", fill_value=0)
+            .reindex(columns=EVENT_TYPES, fill_value=0)
+        )
+        if recipe_ids is not None:
+            counts = counts.reindex(list(recipe_ids), fill_value=0)
+        counts.index.name = "recipe_id"
+        return counts
+
+
+# ------------------------------------------------------------------------------
+# Firestore backend
+# ------------------------------------------------------------------------------
+
+def init_firebase():
+    """
+    Initializes Firebase Admin SDK and returns a Firestore client.
+    Edit the credentials part to match your setup:
+    - Service Account JSON
+    - or Application Default Credentials
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        # Initialize with your service account key
+        cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)  # Update this path
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+class FirestoreSource(DataSource):
+    """
+    Reads `recipes` and `recipe_events` directly from Firestore.
+    """
+
+    label = "Firestore collections: `recipes` + `recipe_events`"
+
+    def __init__(self, db):
+        # reads retry throttling / deadline errors with backoff
+        self.db = resilient(db)
+
+    def load_recipes(self):
+        """
+        Reads recipes from Firestore collection: `recipes`
+
+        Expected document structure:
+        - name (string)
+        - difficulty (string)
+        - avg_rating (number)
+        - total_cook_time_min (number)
+        - tags (array<string>)
+        """
+        recipes = []
+        docs = self.db.stream(self.db.collection("recipes"))
+        for doc in docs:
+            data = doc.to_dict() or {}
+            recipes.append({
+                "id": doc.id,
+                "name": data.get("name"),
+                "difficulty": data.get("difficulty", "Unknown"),
+                "avg_rating": data.get("avg_rating"),
+                "total_cook_time_min": data.get("total_cook_time_min"),
+                "tags": data.get("tags"),
+            })
+        return recipes
+
+    def fetch_recipe_events(self, recipe_id: str, days: int) -> pd.DataFrame:
+        """
+        Reads events from Firestore collection: `recipe_events`
+
+        Expected document structure:
+        - user_id (string)
+        - recipe_id (string)
+        - event_type (string: view/favorite/start_cook/complete_cook)
+        - timestamp (Firestore Timestamp)
+        - source (string)
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+
+        # Query recipe events
+        q = (self.db.collection("recipe_events")
+               .where("recipe_id", "==", recipe_id)
+               .where("timestamp", ">=", cutoff))
+
+        events = []
+        for doc in self.db.stream(q):
+            data = doc.to_dict() or {}
+            ts = data.get("timestamp")
+
+            # Convert Firestore Timestamp -> Python datetime
+            # If already a datetime (e.g. from emulator), keep as is.
+            if hasattr(ts, "to_datetime"):
+                ts = ts.to_datetime()
+
+            events.append({
+                "user_id": data.get("user_id"),
+                "recipe_id": data.get("recipe_id"),
+                "event_type": data.get("event_type"),
+                "timestamp": ts,
+                "source": data.get("source"),
+            })
+
+        if not events:
+            return empty_events()
+
+        return pd.DataFrame(events)
+
+    def fetch_all_events(self, days: int) -> pd.DataFrame:
+        """
+        Reads every `recipe_events` document in the window with one query,
+        fetching only the fields needed for aggregation.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        # timestamp orders the pages, so the cursor needs it
+        q = (self.db.collection("recipe_events")
+               .where("timestamp", ">=", cutoff)
+               .select(["recipe_id", "event_type", "timestamp"]))
+
+        recipe_ids = []
+        event_types = []
+        for doc in self.db.stream(q):
+            data = doc.to_dict() or {}
+            recipe_ids.append(data.get("recipe_id"))
+            event_types.append(data.get("event_type"))
+
+        return pd.DataFrame({"recipe_id": recipe_ids, "event_type": event_types})
+
+
+# ------------------------------------------------------------------------------
+# Local file backend
+# ------------------------------------------------------------------------------
+
+def interactions_to_events(interactions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Maps exported `interactions` rows onto the `recipe_events` vocabulary.
+
+    view -> view, like -> favorite, cook_attempt -> start_cook, and a
+    cook_attempt with successStatus == "success" additionally emits a
+    complete_cook. Ratings have no event equivalent and are dropped.
+    """
+    base = interactions[interactions["type"].isin(list(INTERACTION_EVENT_MAP))]
+    events = pd.DataFrame({
+        "user_id": base["userId"],
+        "recipe_id": base["recipeId"],
+        "event_type": base["type"].map(INTERACTION_EVENT_MAP),
+        "timestamp": base["createdAt"],
+        "source": base["source"],
+    })
+
+    completed = base[(base["type"] == "cook_attempt") & (base["successStatus"] == "success")]
+    completes = pd.DataFrame({
+        "user_id": completed["userId"],
+        "recipe_id": completed["recipeId"],
+        "event_type": "complete_cook",
+        "timestamp": completed["createdAt"],
+        "source": completed["source"],
+    })
+
+    return pd.concat([events, completes], ignore_index=True)
+
+
+def build_columnar_events(csv_path: str, out_dir: str):
+    """
+    Converts interactions.csv into recipe-sorted columnar arrays on disk.
+
+    Layout (all .npy, loadable with mmap_mode="r"):
+    - ts_ns, event_code, user_code, source_code: one entry per event,
+      sorted by (recipe, timestamp)
+    - offsets: events of recipe i live in [offsets[i], offsets[i + 1])
+    plus vocab.json with the recipe/user/event/source dictionaries.
+
+    The arrays are written to a temporary directory next to out_dir and
+    swapped in when complete, so a crash or a concurrent reader never
+    sees a half-written cache.
+    """
+    interactions = pd.read_csv(csv_path)
+    events = interactions_to_events(interactions)
+    # an event without a recipe cannot be served per recipe
+    events = events[events["recipe_id"].notna()]
+
+    ts = pd.to_datetime(events["timestamp"], utc=True, format="ISO8601")
+    recipe_codes, recipe_ids = pd.factorize(events["recipe_id"], sort=True)
+    # a missing user or source gets a code of its own (None in the vocab)
+    # rather than -1, which would index the vocab's last entry
+    user_codes, user_ids = pd.factorize(events["user_id"], use_na_sentinel=False)
+    source_codes, sources = pd.factorize(events["source"], use_na_sentinel=False)
+    event_codes = pd.Categorical(events["event_type"], categories=EVENT_TYPES).codes
+
+    ts_ns = ts.astype("int64").to_numpy()
+    order = np.lexsort((ts_ns, recipe_codes))
+    offsets = np.zeros(len(recipe_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(recipe_codes, minlength=len(recipe_ids)), out=offsets[1:])
+
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}-", dir=os.path.dirname(out_dir))
+    try:
+        np.save(os.path.join(tmp_dir, "ts_ns.npy"), ts_ns[order])
+        np.save(os.path.join(tmp_dir, "event_code.npy"), event_codes[order].astype(np.int8))
+        np.save(os.path.join(tmp_dir, "user_code.npy"), user_codes[order].astype(np.int32))
+        np.save(os.path.join(tmp_dir, "source_code.npy"), source_codes[order].astype(np.int16))
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+
+        vocab = {
+            "recipe_ids": list(recipe_ids),
+            "user_ids": [None if pd.isna(u) else u for u in user_ids],
+            "sources": [None if pd.isna(s) else s for s in sources],
+            "event_types": EVENT_TYPES,
+        }
+        with open(os.path.join(tmp_dir, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # a directory cannot be renamed over a non-empty one: move the old
+    # cache aside first (readers that mapped it keep their mappings)
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}-old-", dir=os.path.dirname(out_dir))
+        os.replace(out_dir, os.path.join(old_dir, "cache"))
+    os.replace(tmp_dir, out_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class LocalFileSource(DataSource):
+    """
+    Serves the dashboard from the batch exports in `data/`.
+
+    Interactions are converted once into memory-mapped columnar arrays
+    (see build_columnar_events) and cached next to the CSVs; the cache is
+    rebuilt whenever interactions.csv is newer than it. Each request is
+    then an offset lookup plus a binary search on the timestamp column,
+    with no backend reads.
+
+    Time windows are anchored at the newest event in the export rather
+    than the wall clock, since a file snapshot does not move forward.
+    """
+
+    label = "local exports: `recipe.csv` + `interactions.csv`"
+
+    def __init__(self, data_dir: str = DATA_DIR, columnar_dir: str = None):
+        self.data_dir = data_dir
+        self.columnar_dir = columnar_dir or os.path.join(data_dir, ".columnar")
+        self._load_columnar()
+
+    def _load_columnar(self):
+        csv_path = find_table(self.data_dir, "interactions")
+        vocab_path = os.path.join(self.columnar_dir, "vocab.json")
+        if (not os.path.exists(vocab_path)
+                or os.path.getmtime(vocab_path) < os.path.getmtime(csv_path)):
+            build_columnar_events(csv_path, self.columnar_dir)
+
+        def load(name):
+            return np.load(os.path.join(self.columnar_dir, name + ".npy"), mmap_mode="r")
+
+        self.ts_ns = load("ts_ns")
+        self.event_code = load("event_code")
+        self.user_code = load("user_code")
+        self.source_code = load("source_code")
+        self.offsets = load("offsets")
+
+        with open(vocab_path) as f:
+            vocab = json.load(f)
+        self.recipe_ids = vocab["recipe_ids"]
+        self.recipe_index = {rid: i for i, rid in enumerate(self.recipe_ids)}
+        self.user_ids = np.array(vocab["user_ids"], dtype=object)
+        self.sources = np.array(vocab["sources"], dtype=object)
+        self.event_types = np.array(vocab["event_types"], dtype=object)
+        self.reference_ns = int(self.ts_ns.max()) if len(self.ts_ns) else 0
+        self._recipe_code_cache = None
+
+    def load_recipes(self):
+        recipes = read_table(self.data_dir, "recipe")
+        interactions = read_table(
+            self.data_dir, "interactions",
+            usecols=["recipeId", "type", "rating"],
+        )
+        ratings = interactions[interactions["type"] == "rating"]
+        avg_rating = ratings.groupby("recipeId")["rating"].mean().round(2)
+
+        out = []
+        for row in recipes.itertuples(index=False):
+            rating = avg_rating.get(row.recipeId)
+            out.append({
+                "id": row.recipeId,
+                "name": row.title,
+                "difficulty": row.difficulty,
+                "avg_rating": None if rating is None else float(rating),
+                "total_cook_time_min": row.totalTimeMinutes,
+                "tags": row.tags.split(",") if isinstance(row.tags, str) and row.tags else None,
+            })
+        return out
+
+    def fetch_recipe_events(self, recipe_id: str, days: int) -> pd.DataFrame:
+        i = self.recipe_index.get(recipe_id)
+        if i is None:
+            return empty_events()
+
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        cutoff_ns = self._cutoff_ns(days)
+        start += int(np.searchsorted(self.ts_ns[start:end], cutoff_ns, side="left"))
+        if start >= end:
+            return empty_events()
+
+        sl = slice(start, end)
+        return pd.DataFrame({
+            "user_id": self.user_ids[self.user_code[sl]],
+            "recipe_id": recipe_id,
+            "event_type": self.event_types[self.event_code[sl]],
+            "timestamp": pd.to_datetime(np.asarray(self.ts_ns[sl]), utc=True),
+            "source": self.sources[self.source_code[sl]],
+        }, columns=EVENT_COLUMNS)
+
+    def fetch_all_events(self, days: int) -> pd.DataFrame:
+        keep = self.ts_ns >= self._cutoff_ns(days)
+        recipe_codes = self._recipe_codes()[keep]
+        return pd.DataFrame({
+            "user_id": self.user_ids[self.user_code[keep]],
+            "recipe_id": np.asarray(self.recipe_ids, dtype=object)[recipe_codes],
+            "event_type": self.event_types[self.event_code[keep]],
+            "timestamp": pd.to_datetime(np.asarray(self.ts_ns[keep]), utc=True),
+            "source": self.sources[self.source_code[keep]],
+        }, columns=EVENT_COLUMNS)
+
+    def event_counts(self, days: int, recipe_ids=None) -> pd.DataFrame:
+        # Rolled up straight from the columnar arrays: one bincount over
+        # recipe_code * n_types + event_code, no DataFrame of raw events.
+        keep = self.ts_ns >= self._cutoff_ns(days)
+        n_recipes, n_types = len(self.recipe_ids), len(self.event_types)
+        flat = self._recipe_codes()[keep] * n_types + self.event_code[keep]
+        grid = np.bincount(flat, minlength=n_recipes * n_types).reshape(n_recipes, n_types)
+
+        counts = pd.DataFrame(grid, index=pd.Index(self.recipe_ids, name="recipe_id"),
+                              columns=list(self.event_types))
+        counts = counts[counts.sum(axis=1) > 0]
+        if recipe_ids is not None:
+            counts = counts.reindex(list(recipe_ids), fill_value=0)
+            counts.index.name = "recipe_id"
+        return counts
+
+    def _cutoff_ns(self, days: int) -> int:
+        return self.reference_ns - days * 86_400 * 1_000_000_000
+
+    def _recipe_codes(self):
+        if self._recipe_code_cache is None:
+            self._recipe_code_cache = np.repeat(
+                np.arange(len(self.recipe_ids), dtype=np.int64), np.diff(self.offsets)
+            )
+        return self._recipe_code_cache
+
+    @property
+    def reference_time(self):
+        return datetime.fromtimestamp(self.reference_ns / 1e9, tz=timezone.utc)
+
+
+# ------------------------------------------------------------------------------
+# Factory
+# ------------------------------------------------------------------------------
+
+def make_source(kind: str = None, data_dir: str = None) -> DataSource:
+    """
+    Builds the configured backend.
+
+    kind defaults to $RECIPE_DATA_SOURCE ("firestore", "local" or "cdc"), and
+    data_dir to $RECIPE_DATA_DIR for the local backend.
+    """
+    kind = (kind or os.environ.get("RECIPE_DATA_SOURCE", "firestore")).lower()
+    if kind == "local":
+        return LocalFileSource(data_dir or os.environ.get("RECIPE_DATA_DIR", DATA_DIR))
+    if kind == "firestore":
+        return FirestoreSource(init_firebase())
+    if kind == "cdc":
+        from cdc_listener import CdcListener, CdcSource
+        from etl_export_to_csv import init_firestore
+        return CdcSource(CdcListener(init_firestore()).start())
+    raise ValueError(f"Unknown data source: {kind}")
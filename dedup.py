@@ -0,0 +1,261 @@
+import argparse
+import json
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import read_table
+
+# -------------------------------------------------------------------
+# Seen-key index for exactly-once interactions
+#
+# Every id is hashed to 128 bits (two uint64 halves). Membership is:
+#   1. Bloom filter over the hashes (numpy bit array, in memory)
+#      -> "definitely new" for almost every new id, no disk access
+#   2. only on a Bloom hit: binary search of the sorted `hi` column of
+#      the on-disk key file (memory-mapped .npy), then compare `lo`
+# New keys collect in memory as sorted runs. Each batch becomes a run,
+# and a run is merged into the one before it whenever that one is not
+# larger (like carries in a binary counter), so there are at most
+# log2(n) runs and each key is re-sorted O(log n) times over a whole run
+# of the process. commit() merges them into the key file, streaming both
+# sorted inputs chunk by chunk, so the historical ids are never loaded
+# into a Python set. The Bloom filter is rebuilt at twice the size once
+# it holds more keys than it was sized for, so its false-positive rate
+# stays at fp_rate as the index grows.
+#
+# check_and_add() can run while commit() merges: commit takes the pending
+# runs under a short lock, merges them without it (lookups keep seeing
+# them as a frozen run) and only swaps the new key file in under the lock.
+#
+# directory=None keeps everything in memory (e.g. one export run).
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+DEDUP_DIR = os.path.join(DATA_DIR, ".dedup")
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_FP_RATE = 0.001
+MERGE_CHUNK = 1 << 20
+_HASH_KEYS = ("recipe-dedup-hi0", "recipe-dedup-lo1")
+
+
+def hash_ids(ids):
+    """(hi, lo) uint64 halves of a 128-bit hash per id."""
+    values = np.asarray(ids, dtype=object)
+    return (pd.util.hash_array(values, hash_key=_HASH_KEYS[0]),
+            pd.util.hash_array(values, hash_key=_HASH_KEYS[1]))
+
+
+class BloomFilter:
+    def __init__(self, capacity=DEFAULT_CAPACITY, fp_rate=DEFAULT_FP_RATE, bits=None, k=None):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        m = int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.m = ((m + 63) // 64) * 64
+        self.k = k or max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros(self.m // 8, dtype=np.uint8)
+
+    def _positions(self, hi, lo):
+        # Kirsch-Mitzenmacher double hashing: h_i = hi + i * lo
+        i = np.arange(self.k, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (hi[:, None] + i[None, :] * (lo[:, None] | np.uint64(1))) % np.uint64(self.m)
+
+    def add(self, hi, lo):
+        pos = self._positions(hi, lo).ravel()
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, hi, lo):
+        pos = self._positions(hi, lo)
+        byte = self.bits[(pos >> np.uint64(3)).astype(np.int64)]
+        return ((byte >> (pos & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1).astype(bool)
+
+
+def _merge_runs(a, b):
+    hi = np.concatenate([a[0], b[0]])
+    lo = np.concatenate([a[1], b[1]])
+    order = np.argsort(hi, kind="stable")
+    return hi[order], lo[order]
+
+
+def _merge_all(runs):
+    """Sorted runs -> one sorted run, merging the shortest first."""
+    runs = list(runs)
+    while len(runs) > 1:
+        last = runs.pop()
+        runs.append(_merge_runs(runs.pop(), last))
+    return runs[0]
+
+
+def _sorted_contains(hi_col, lo_col, hi, lo):
+    """Vectorized membership of (hi, lo) pairs in columns sorted by hi."""
+    left = np.searchsorted(hi_col, hi, side="left")
+    right = np.searchsorted(hi_col, hi, side="right")
+    found = np.zeros(len(hi), dtype=bool)
+    single = right - left == 1
+    found[single] = np.asarray(lo_col[left[single]]) == lo[single]
+    # the same 64-bit hi for two different ids: scan the (tiny) run
+    for j in np.flatnonzero(right - left > 1):
+        found[j] = bool((np.asarray(lo_col[left[j]:right[j]]) == lo[j]).any())
+    return found
+
+
+class SeenIndex:
+    def __init__(self, directory=None, capacity=DEFAULT_CAPACITY, fp_rate=DEFAULT_FP_RATE):
+        self.directory = directory
+        self.stats = {"checked": 0, "duplicates": 0, "bloom_hits": 0}
+        self._runs = []  # sorted (hi, lo) runs not in the key file yet, each at least as long as the next
+        self._frozen = []  # runs a commit in progress is merging into the key file
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self.hi = np.empty(0, dtype=np.uint64)
+        self.lo = np.empty(0, dtype=np.uint64)
+        self.bloom = BloomFilter(capacity, fp_rate)
+        if directory and os.path.exists(self._path("meta.json")):
+            self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        with open(self._path("meta.json")) as f:
+            meta = json.load(f)
+        self.hi = np.load(self._path("keys_hi.npy"), mmap_mode="r")
+        self.lo = np.load(self._path("keys_lo.npy"), mmap_mode="r")
+        bits = np.fromfile(self._path("bloom.bin"), dtype=np.uint8)
+        self.bloom = BloomFilter(meta["capacity"], meta["fp_rate"], bits=bits, k=meta["k"])
+
+    def __len__(self):
+        return len(self.hi) + sum(len(hi) for hi, _ in self._runs + self._frozen)
+
+    def check_and_add(self, ids):
+        """
+        Boolean mask, True where the id has not been seen before (neither
+        in the index nor earlier in `ids`). The new ids are added.
+        """
+        hi, lo = hash_ids(ids)
+        # first occurrence within the batch
+        new = ~pd.DataFrame({"hi": hi, "lo": lo}).duplicated().to_numpy()
+        with self._lock:
+            self._check_and_add(hi, lo, new)
+        return new
+
+    def _check_and_add(self, hi, lo, new):
+        maybe = new & self.bloom.might_contain(hi, lo)
+        self.stats["bloom_hits"] += int(maybe.sum())
+        if maybe.any():
+            idx = np.flatnonzero(maybe)
+            seen = _sorted_contains(self.hi, self.lo, hi[idx], lo[idx])
+            for run_hi, run_lo in self._runs + self._frozen:
+                seen |= _sorted_contains(run_hi, run_lo, hi[idx], lo[idx])
+            new[idx[seen]] = False
+
+        self.bloom.add(hi[new], lo[new])
+        self._add_pending(hi[new], lo[new])
+        if len(self) > self.bloom.capacity:
+            self._grow_bloom()
+        self.stats["checked"] += len(hi)
+        self.stats["duplicates"] += int(len(hi) - new.sum())
+
+    def _add_pending(self, hi, lo):
+        if not len(hi):
+            return
+        order = np.argsort(hi, kind="stable")
+        run = (hi[order], lo[order])
+        while self._runs and len(self._runs[-1][0]) <= len(run[0]):
+            run = _merge_runs(self._runs.pop(), run)
+        self._runs.append(run)
+
+    def _grow_bloom(self):
+        """Rebuilds the Bloom filter for twice the keys the index holds."""
+        bloom = BloomFilter(2 * len(self), self.bloom.fp_rate)
+        for hi, lo in [(self.hi, self.lo)] + self._runs + self._frozen:
+            for start in range(0, len(hi), MERGE_CHUNK):
+                bloom.add(np.asarray(hi[start:start + MERGE_CHUNK]), np.asarray(lo[start:start + MERGE_CHUNK]))
+        self.bloom = bloom
+
+    def commit(self):
+        """Merges the pending keys into the key file and saves the Bloom filter."""
+        if self.directory is None:
+            return
+        with self._commit_lock:
+            with self._lock:
+                if not self._runs:
+                    return
+                self._frozen, self._runs = self._runs, []
+                base_hi, base_lo = self.hi, self.lo
+            pending_hi, pending_lo = _merge_all(self._frozen)
+            os.makedirs(self.directory, exist_ok=True)
+            total = len(base_hi) + len(pending_hi)
+            tmp_hi, tmp_lo = self._path("keys_hi.npy.tmp"), self._path("keys_lo.npy.tmp")
+            out_hi = np.lib.format.open_memmap(tmp_hi, mode="w+", dtype=np.uint64, shape=(total,))
+            out_lo = np.lib.format.open_memmap(tmp_lo, mode="w+", dtype=np.uint64, shape=(total,))
+
+            # streaming merge: each chunk of the key file plus the pending keys
+            # that sort before its last element
+            written, p = 0, 0
+            for start in range(0, len(base_hi), MERGE_CHUNK):
+                chunk_hi = np.asarray(base_hi[start:start + MERGE_CHUNK])
+                chunk_lo = np.asarray(base_lo[start:start + MERGE_CHUNK])
+                last = len(base_hi) <= start + MERGE_CHUNK
+                p_end = len(pending_hi) if last else int(
+                    np.searchsorted(pending_hi, chunk_hi[-1], side="right"))
+                hi = np.concatenate([chunk_hi, pending_hi[p:p_end]])
+                lo = np.concatenate([chunk_lo, pending_lo[p:p_end]])
+                order = np.argsort(hi, kind="stable")
+                out_hi[written:written + len(hi)] = hi[order]
+                out_lo[written:written + len(lo)] = lo[order]
+                written += len(hi)
+                p = p_end
+            out_hi[written:] = pending_hi[p:]
+            out_lo[written:] = pending_lo[p:]
+            out_hi.flush()
+            out_lo.flush()
+            del out_hi, out_lo, base_hi, base_lo
+
+            with self._lock:
+                self.hi = self.lo = None
+                os.replace(tmp_hi, self._path("keys_hi.npy"))
+                os.replace(tmp_lo, self._path("keys_lo.npy"))
+                self.hi = np.load(self._path("keys_hi.npy"), mmap_mode="r")
+                self.lo = np.load(self._path("keys_lo.npy"), mmap_mode="r")
+                self._frozen = []
+                # may also cover keys added during the merge: harmless extra bits
+                self.bloom.bits.tofile(self._path("bloom.bin"))
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"capacity": self.bloom.capacity, "fp_rate": self.bloom.fp_rate,
+                               "k": self.bloom.k, "keys": total}, f)
+
+def drop_duplicates(frame, index, id_col="interactionId"):
+    """Rows of `frame` whose id `index` has not seen, and the number dropped."""
+    keep = index.check_and_add(frame[id_col].astype(str).to_numpy())
+    return frame[keep], int(len(frame) - keep.sum())
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drop interactions already seen in earlier runs from interactions.csv.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--index-dir", default=os.path.join(DEDUP_DIR, "interactions"))
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--out", default=None, help="where to write the new rows (default: print counts only)")
+    args = parser.parse_args()
+
+    index = SeenIndex(args.index_dir)
+    kept = dropped = 0
+    header = True
+    for chunk in read_table(args.data_dir, "interactions", chunksize=args.chunksize):
+        chunk, n_dup = drop_duplicates(chunk, index)
+        kept += len(chunk)
+        dropped += n_dup
+        if args.out:
+            chunk.to_csv(args.out, mode="w" if header else "a", header=header, index=False)
+            header = False
+    index.commit()
+    print(f" {kept} new interactions, {dropped} duplicates dropped; index holds {len(index)} ids")
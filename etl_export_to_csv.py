@@ -1,9 +1,15 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 from datetime import datetime
+from itertools import chain
+import argparse
+import numpy as np
 import pandas as pd
 import os
 
+from compressed_io import COMPRESSIONS, write_table
+from dedup import SeenIndex
+from firestore_client import resilient
+from instrumentation import stage
+
 # -------------------------------------------------------------------
 # CONFIG
 # -------------------------------------------------------------------
@@ -15,6 +21,14 @@ OUTPUT_DIR = "data"
 # INIT FIRESTORE
 # -------------------------------------------------------------------
 def init_firestore():
+    # Local emulator (FIRESTORE_EMULATOR_HOST=localhost:8080) needs no credentials
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        return gcloud_firestore.Client(project=PROJECT_ID)
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not firebase_admin._apps:
         cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
         firebase_admin.initialize_app(cred, {"projectId": PROJECT_ID})
@@ -28,128 +42,203 @@ def to_iso(dt):
         return dt.isoformat()
     return dt  # if it's already string or None, just return
 
+# -------------------------------------------------------------------
+# HELPER: PAGED READS
+#
+# Documents are read PAGE_SIZE at a time (ordered by document id, resumed
+# with start_after), so only one page of snapshots is alive at once and
+# each page is flattened column by column into the buffers below.
+# -------------------------------------------------------------------
+PAGE_SIZE = 1000
+
+RECIPE_COLUMNS = [
+    "recipeId", "title", "description", "authorId", "cuisine", "category", "difficulty",
+    "prepTimeMinutes", "cookTimeMinutes", "totalTimeMinutes", "servings", "tags",
+    "createdAt", "updatedAt", "isPublic",
+]
+INGREDIENT_COLUMNS = ["recipeId", "ingredientId", "name", "quantity", "unit", "notes"]
+STEP_COLUMNS = ["recipeId", "stepNumber", "instruction", "approxMinutes"]
+INTERACTION_COLUMNS = [
+    "interactionId", "userId", "recipeId", "type", "createdAt", "rating",
+    "difficultyRating", "successStatus", "comment", "source",
+]
+# profile fields (displayName, email) stay in Firestore; cohort
+# analysis only needs who signed up when
+USER_COLUMNS = ["userId", "createdAt", "skillLevel", "dietPreferences"]
+TIMESTAMP_COLUMNS = {"createdAt", "updatedAt"}
+
+
+def iter_pages(collection_ref, page_size=PAGE_SIZE, client=None):
+    """
+    Yields lists of document snapshots, page_size per Firestore query.
+    A page read that hits a transient error is retried on its own.
+    """
+    client = client if client is not None else resilient(collection_ref)
+    return client.pages(collection_ref.order_by("__name__"), page_size)
+
+
+def column_buffers(columns):
+    return {col: [] for col in columns}
+
+
+def extend_columns(buffers, records, columns, skip=()):
+    """Appends one page of dicts to per-column lists: one pass per column."""
+    for col in columns:
+        if col in skip:
+            continue
+        values = [r.get(col) for r in records]
+        if col in TIMESTAMP_COLUMNS:
+            values = [to_iso(v) for v in values]
+        buffers[col].extend(values)
+
 # -------------------------------------------------------------------
 # EXTRACT & TRANSFORM: RECIPES → recipe.csv, ingredients.csv, steps.csv
 # -------------------------------------------------------------------
-def export_recipes(db):
-    recipes_ref = db.collection("recipes")
-    docs = list(recipes_ref.stream())
-
-    recipe_rows = []
-    ingredient_rows = []
-    step_rows = []
-
-    for doc in docs:
-        data = doc.to_dict()
-        recipe_id = data.get("recipeId", doc.id)
-
-        # -----------------------
-        # recipe.csv row
-        # -----------------------
-        recipe_rows.append({
-            "recipeId": recipe_id,
-            "title": data.get("title"),
-            "description": data.get("description"),
-            "authorId": data.get("authorId"),
-            "cuisine": data.get("cuisine"),
-            "category": data.get("category"),
-            "difficulty": data.get("difficulty"),
-            "prepTimeMinutes": data.get("prepTimeMinutes"),
-            "cookTimeMinutes": data.get("cookTimeMinutes"),
-            "totalTimeMinutes": data.get("totalTimeMinutes"),
-            "servings": data.get("servings"),
-            "tags": ",".join(data.get("tags", [])) if data.get("tags") else "",
-            "createdAt": to_iso(data.get("createdAt")),
-            "updatedAt": to_iso(data.get("updatedAt")),
-            "isPublic": data.get("isPublic"),
-        })
-
-        # -----------------------
-        # ingredients.csv rows
-        # -----------------------
-        ingredients = data.get("ingredients", [])
-        for ing in ingredients:
-            ingredient_rows.append({
-                "recipeId": recipe_id,
-                "ingredientId": ing.get("ingredientId"),
-                "name": ing.get("name"),
-                "quantity": ing.get("quantity"),
-                "unit": ing.get("unit"),
-                "notes": ing.get("notes"),
-            })
-
-        # -----------------------
-        # steps.csv rows
-        # -----------------------
-        steps = data.get("steps", [])
-        for s in steps:
-            step_rows.append({
-                "recipeId": recipe_id,
-                "stepNumber": s.get("stepNumber"),
-                "instruction": s.get("instruction"),
-                "approxMinutes": s.get("approxMinutes"),
-            })
+def flatten_recipe_docs(docs, buffers=None):
+    """
+    Flattens one page of recipe snapshots into column buffers for the
+    recipe, ingredients and steps tables. The nested ingredients / steps
+    lists are chained into one flat list per page and the parent recipeId
+    is repeated by each recipe's child count, so no dict is built per row.
+    Returns the (recipe, ingredients, steps) buffers.
+    """
+    if buffers is None:
+        buffers = (
+            column_buffers(RECIPE_COLUMNS),
+            column_buffers(INGREDIENT_COLUMNS),
+            column_buffers(STEP_COLUMNS),
+        )
+    recipe_buf, ingredient_buf, step_buf = buffers
+
+    datas = [doc.to_dict() for doc in docs]
+    recipe_ids = [d.get("recipeId", doc.id) for d, doc in zip(datas, docs)]
+
+    recipe_buf["recipeId"].extend(recipe_ids)
+    recipe_buf["tags"].extend(",".join(d["tags"]) if d.get("tags") else "" for d in datas)
+    extend_columns(recipe_buf, datas, RECIPE_COLUMNS, skip={"recipeId", "tags"})
+
+    for key, buf, columns in (
+        ("ingredients", ingredient_buf, INGREDIENT_COLUMNS),
+        ("steps", step_buf, STEP_COLUMNS),
+    ):
+        children = [d.get(key) or [] for d in datas]
+        counts = [len(c) for c in children]
+        flat = list(chain.from_iterable(children))
+        buf["recipeId"].extend(np.repeat(np.array(recipe_ids, dtype=object), counts).tolist())
+        extend_columns(buf, flat, columns, skip={"recipeId"})
+
+    return buffers
+
+def export_recipes(db, output_dir=OUTPUT_DIR, page_size=PAGE_SIZE, compression="none"):
+    client = resilient(db)
+    recipes_ref = client.collection("recipes")
+    buffers = None
+    n_docs = 0
+    with stage("export.recipes.stream_flatten") as s:
+        for page in iter_pages(recipes_ref, page_size, client):
+            buffers = flatten_recipe_docs(page, buffers)
+            n_docs += len(page)
+        s.rows = n_docs
+    if buffers is None:
+        buffers = flatten_recipe_docs([])
 
     # Convert to DataFrames
-    recipes_df = pd.DataFrame(recipe_rows)
-    ingredients_df = pd.DataFrame(ingredient_rows)
-    steps_df = pd.DataFrame(step_rows)
+    recipes_df = pd.DataFrame(buffers[0], columns=RECIPE_COLUMNS)
+    ingredients_df = pd.DataFrame(buffers[1], columns=INGREDIENT_COLUMNS)
+    steps_df = pd.DataFrame(buffers[2], columns=STEP_COLUMNS)
 
     # Ensure output dir exists
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
 
-    # Save CSVs
-    recipes_path = os.path.join(OUTPUT_DIR, "recipe.csv")
-    ingredients_path = os.path.join(OUTPUT_DIR, "ingredients.csv")
-    steps_path = os.path.join(OUTPUT_DIR, "steps.csv")
-
-    recipes_df.to_csv(recipes_path, index=False)
-    ingredients_df.to_csv(ingredients_path, index=False)
-    steps_df.to_csv(steps_path, index=False)
+    # Save CSVs (compressed on the fly when requested)
+    with stage("export.recipes.write_csv", rows=len(recipes_df) + len(ingredients_df) + len(steps_df)):
+        recipes_path = write_table(recipes_df, output_dir, "recipe", compression)
+        ingredients_path = write_table(ingredients_df, output_dir, "ingredients", compression)
+        steps_path = write_table(steps_df, output_dir, "steps", compression)
 
     print(f" Exported recipes to {recipes_path}")
     print(f" Exported ingredients to {ingredients_path}")
     print(f" Exported steps to {steps_path}")
 
+    return recipes_df, ingredients_df, steps_df
+
 # -------------------------------------------------------------------
 # EXTRACT & TRANSFORM: INTERACTIONS → interactions.csv
 # -------------------------------------------------------------------
-def export_interactions(db):
-    interactions_ref = db.collection("interactions")
-    docs = list(interactions_ref.stream())
-
-    rows = []
+def export_interactions(db, output_dir=OUTPUT_DIR, page_size=PAGE_SIZE, seen=None, compression="none"):
+    """
+    `seen` is an optional dedup.SeenIndex of interactionIds exported
+    before (e.g. for an incremental merge); by default duplicates are
+    only dropped within this export.
+    """
+    client = resilient(db)
+    interactions_ref = client.collection("interactions")
+    buffers = column_buffers(INTERACTION_COLUMNS)
+    seen = seen if seen is not None else SeenIndex()
+    duplicates = 0
+    with stage("export.interactions.stream_flatten") as s:
+        for page in iter_pages(interactions_ref, page_size, client):
+            datas = [doc.to_dict() for doc in page]
+            ids = [d.get("interactionId", doc.id) for d, doc in zip(datas, page)]
+            keep = seen.check_and_add(ids)
+            if not keep.all():
+                duplicates += int(len(keep) - keep.sum())
+                datas = [d for d, k in zip(datas, keep) if k]
+                ids = [i for i, k in zip(ids, keep) if k]
+            buffers["interactionId"].extend(ids)
+            extend_columns(buffers, datas, INTERACTION_COLUMNS, skip={"interactionId"})
+        s.rows = len(buffers["interactionId"])
+
+    df = pd.DataFrame(buffers, columns=INTERACTION_COLUMNS)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with stage("export.interactions.write_csv", rows=len(df)):
+        interactions_path = write_table(df, output_dir, "interactions", compression)
+
+    print(f" Exported interactions to {interactions_path} ({duplicates} duplicate interactionIds dropped)")
+
+    return df
 
-    for doc in docs:
-        data = doc.to_dict()
-        interaction_id = data.get("interactionId", doc.id)
+# -------------------------------------------------------------------
+# EXTRACT & TRANSFORM: USERS → users.csv
+# -------------------------------------------------------------------
+def export_users(db, output_dir=OUTPUT_DIR, page_size=PAGE_SIZE, compression="none"):
+    client = resilient(db)
+    buffers = column_buffers(USER_COLUMNS)
+    with stage("export.users.stream_flatten") as s:
+        for page in iter_pages(client.collection("users"), page_size, client):
+            datas = [doc.to_dict() for doc in page]
+            buffers["userId"].extend(d.get("userId", doc.id) for d, doc in zip(datas, page))
+            buffers["dietPreferences"].extend(
+                ",".join(d["dietPreferences"]) if d.get("dietPreferences") else "" for d in datas
+            )
+            extend_columns(buffers, datas, USER_COLUMNS, skip={"userId", "dietPreferences"})
+        s.rows = len(buffers["userId"])
 
-        rows.append({
-            "interactionId": interaction_id,
-            "userId": data.get("userId"),
-            "recipeId": data.get("recipeId"),
-            "type": data.get("type"),
-            "createdAt": to_iso(data.get("createdAt")),
-            "rating": data.get("rating"),
-            "difficultyRating": data.get("difficultyRating"),
-            "successStatus": data.get("successStatus"),
-            "comment": data.get("comment"),
-            "source": data.get("source"),
-        })
+    df = pd.DataFrame(buffers, columns=USER_COLUMNS)
 
-    df = pd.DataFrame(rows)
+    os.makedirs(output_dir, exist_ok=True)
+    with stage("export.users.write_csv", rows=len(df)):
+        users_path = write_table(df, output_dir, "users", compression)
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    interactions_path = os.path.join(OUTPUT_DIR, "interactions.csv")
-    df.to_csv(interactions_path, index=False)
+    print(f" Exported users to {users_path}")
 
-    print(f" Exported interactions to {interactions_path}")
+    return df
 
 # -------------------------------------------------------------------
 # MAIN
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    db = init_firestore()
-    export_recipes(db)
-    export_interactions(db)
+    parser = argparse.ArgumentParser(description="Export Firestore recipes, interactions and users to CSV.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--compression", default="none", choices=list(COMPRESSIONS),
+                        help="write .csv.gz / .csv.zst instead of plain CSV")
+    args = parser.parse_args()
+
+    db = resilient(init_firestore())
+    export_recipes(db, args.output_dir, args.page_size, compression=args.compression)
+    export_interactions(db, args.output_dir, args.page_size, compression=args.compression)
+    export_users(db, args.output_dir, args.page_size, compression=args.compression)
+    print(f" Firestore: {db.stats_line()}")
     print(" ETL export complete.")
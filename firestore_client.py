@@ -0,0 +1,499 @@
+import argparse
+import enum
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+try:
+    from google.api_core import exceptions as gexc
+except ImportError:  # fault stub still works without the Google client libraries
+    gexc = None
+
+# -------------------------------------------------------------------
+# Resilient Firestore calls
+#
+# ResilientClient wraps a Firestore client (or anything shaped like one)
+# and runs each RPC through:
+#   - an AIMD concurrency limit: +1 slot per `limit` successes, x0.5 on a
+#     throttling error (at most once per `limit` completed calls, i.e. once
+#     per round of requests that were already in flight), so parallel
+#     callers ramp up until the backend pushes back, then hover there
+#   - retries with full-jitter exponential backoff for transient errors.
+#     Errors that may have been applied (DEADLINE_EXCEEDED, INTERNAL) are
+#     only retried for idempotent calls; set() on a fixed document id and
+#     reads are idempotent, increments and auto-id creates are not.
+# Counters (ops, ops/sec, retries, throttled, failed) are in stats().
+# stream() reads a query in pages with cursors, each page its own retried
+# call, so neither memory nor a retry grows with the result set.
+#
+# FaultyFirestore is an in-memory stand-in with injected errors, latency,
+# a concurrency quota and per-document write contention, for exercising
+# all of this without a backend.
+# -------------------------------------------------------------------
+
+# transient: worth another attempt
+RETRYABLE = {"ResourceExhausted", "TooManyRequests", "DeadlineExceeded", "ServiceUnavailable",
+             "Aborted", "InternalServerError"}
+# rejected before being applied, so safe to retry even when not idempotent
+REJECTED = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "Aborted"}
+# the backend is overloaded: shrink the concurrency limit
+THROTTLING = {"ResourceExhausted", "TooManyRequests", "DeadlineExceeded"}
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_DELAY_S = 0.1
+DEFAULT_MAX_DELAY_S = 10.0
+DEFAULT_PAGE_SIZE = 1000
+
+
+def error_kind(exc):
+    """Name of the first known transient error class in exc's MRO, else None."""
+    for cls in type(exc).__mro__:
+        if cls.__name__ in RETRYABLE:
+            return cls.__name__
+    return None
+
+
+def is_valid_document_id(doc_id):
+    """Firestore's rules: 1-1500 bytes, no "/", not "." or "..", not __reserved__."""
+    return (isinstance(doc_id, str) and 0 < len(doc_id.encode()) <= 1500 and "/" not in doc_id
+            and doc_id not in (".", "..") and not (doc_id.startswith("__") and doc_id.endswith("__")))
+
+
+class AimdLimiter:
+    """Concurrency limit that grows additively and shrinks multiplicatively."""
+
+    def __init__(self, initial=4, minimum=1, maximum=64, decrease=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._since_decrease = maximum
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            self._since_decrease += 1
+            if throttled:
+                # the other calls of the same round saw the same overload
+                if self._since_decrease >= int(self.limit):
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._since_decrease = 0
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class ResilientClient:
+    def __init__(self, db, limiter=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_delay=DEFAULT_BASE_DELAY_S, max_delay=DEFAULT_MAX_DELAY_S, seed=None):
+        self.db = db
+        self.limiter = limiter or AimdLimiter()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.counters = {"ops": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    def __getattr__(self, name):
+        # collection(), batch(), document() ... come from the wrapped client
+        if name == "db":
+            raise AttributeError(name)
+        return getattr(self.db, name)
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def backoff(self, attempt):
+        """Full jitter: uniform in [0, min(max_delay, base * 2^attempt)]."""
+        with self._lock:
+            return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args, idempotent=True, **kwargs):
+        """Runs one RPC under the concurrency limit, retrying transient errors."""
+        for attempt in range(self.max_attempts):
+            self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                kind = error_kind(exc)
+                self.limiter.release(throttled=kind in THROTTLING)
+                if kind in THROTTLING:
+                    self._count("throttled")
+                retry = kind is not None and (idempotent or kind in REJECTED)
+                if not retry or attempt == self.max_attempts - 1:
+                    self._count("failed")
+                    raise
+                self._count("retries")
+                time.sleep(self.backoff(attempt))
+                continue
+            self.limiter.release()
+            self._count("ops")
+            return result
+
+    def map(self, fn, items, idempotent=True):
+        """
+        fn(item) for every item, as many in parallel as the limiter allows.
+        Results come back in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as pool:
+            return list(pool.map(lambda item: self.call(fn, item, idempotent=idempotent), items))
+
+    # convenience wrappers for the calls the pipeline makes
+    def page(self, query):
+        """One query's documents as a list (re-run from scratch on a retry)."""
+        return self.call(lambda: list(query.stream()))
+
+    def pages(self, query, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Lists of up to page_size documents of a query (which must not have
+        its own limit). Each page is one query resumed after the last
+        document of the page before, so a retry re-reads only that page.
+        Pages follow the query's order (document id unless it orders or
+        range-filters on a field); with select(), keep the ordered fields
+        so the cursor can be built from the last document.
+        """
+        query = query.limit(page_size)
+        last = None
+        while True:
+            page = self.page(query.start_after(last) if last is not None else query)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last = page[-1]
+
+    def stream(self, query, page_size=DEFAULT_PAGE_SIZE):
+        """Documents of a query, one page in memory at a time (see pages())."""
+        for page in self.pages(query, page_size):
+            yield from page
+
+    def set(self, ref, data):
+        return self.call(ref.set, data)
+
+    def commit(self, batch, idempotent=True):
+        return self.call(batch.commit, idempotent=idempotent)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        out["ops_per_sec"] = round(out["ops"] / elapsed, 1)
+        out["concurrency_limit"] = int(self.limiter.limit)
+        return out
+
+    def stats_line(self):
+        s = self.stats()
+        return (f"{s['ops']} ops ({s['ops_per_sec']}/s), {s['retries']} retries, "
+                f"{s['throttled']} throttled, {s['failed']} failed, concurrency {s['concurrency_limit']}")
+
+
+def resilient(db):
+    """db wrapped in a ResilientClient (unchanged if it already is one)."""
+    return db if isinstance(db, ResilientClient) else ResilientClient(db)
+
+# -------------------------------------------------------------------
+# FAULT-INJECTING STUB
+# -------------------------------------------------------------------
+if gexc is not None:
+    ResourceExhausted, DeadlineExceeded = gexc.ResourceExhausted, gexc.DeadlineExceeded
+    AlreadyExists = gexc.AlreadyExists
+else:
+    class ResourceExhausted(Exception):
+        pass
+
+    class DeadlineExceeded(Exception):
+        pass
+
+    class AlreadyExists(Exception):
+        pass
+
+
+ChangeType = enum.Enum("ChangeType", ["ADDED", "MODIFIED", "REMOVED"])
+
+
+class _Snapshot:
+    def __init__(self, doc_id, data, update_time=None):
+        self.id = doc_id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _DocumentRef:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._store._rpc(lambda: self._store._put(self._collection, self.id, data, merge))
+
+    def delete(self):
+        self._store._rpc(lambda: self._store._delete(self._collection, self.id))
+
+    def collection(self, name):
+        return self._store.collection(f"{self._collection}/{self.id}/{name}")
+
+    def get(self):
+        return self._store._rpc(lambda: _Snapshot(self.id, self._store.data[self._collection].get(self.id)))
+
+
+class _Query:
+    def __init__(self, store, collection, limit=None, after=None):
+        self._store = store
+        self._collection = collection
+        self._limit = limit
+        self._after = after
+
+    def order_by(self, field):
+        # documents are always returned in id order
+        return self
+
+    def limit(self, n):
+        return _Query(self._store, self._collection, n, self._after)
+
+    def start_after(self, snapshot):
+        return _Query(self._store, self._collection, self._limit, snapshot.id)
+
+    def on_snapshot(self, callback):
+        """callback(documents, changes, read_time) now with every document, then once per write."""
+        return self._store._watch(self._collection, callback)
+
+    def stream(self):
+        def run():
+            docs = sorted(self._store.data[self._collection].items())
+            if self._after is not None:
+                docs = [(k, v) for k, v in docs if k > self._after]
+            if self._limit is not None:
+                docs = docs[:self._limit]
+            return [_Snapshot(k, v) for k, v in docs]
+        return iter(self._store._rpc(run))
+
+
+class _Collection(_Query):
+    def document(self, doc_id=None):
+        # the real client rejects a path with an odd number of elements the same way
+        if doc_id is not None and "/" in doc_id:
+            raise ValueError("A document must have an even number of path elements")
+        return _DocumentRef(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class _Batch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref, data, merge))
+
+    def create(self, ref, data):
+        self._writes.append((ref, data, None))
+
+    def delete(self, ref):
+        self._writes.append((ref, None, False))
+
+    def commit(self):
+        def run():
+            # all or nothing: one existing document fails the whole batch
+            for ref, _, merge in self._writes:
+                if merge is None and ref.id in self._store.data.get(ref._collection, {}):
+                    raise AlreadyExists(f"Document already exists: {ref._collection}/{ref.id}")
+            for ref, data, merge in self._writes:
+                if data is None:
+                    self._store._delete(ref._collection, ref.id)
+                else:
+                    self._store._put(ref._collection, ref.id, data, bool(merge))
+        self._store._rpc(run)
+
+
+class _Change:
+    def __init__(self, kind, snapshot):
+        self.type = ChangeType[kind]
+        self.document = snapshot
+
+
+class _Watch:
+    def __init__(self, store, collection, callback):
+        self._store = store
+        self.collection = collection
+        self.callback = callback
+
+    def unsubscribe(self):
+        with self._store._lock:
+            if self in self._store._watches:
+                self._store._watches.remove(self)
+
+
+class FaultyFirestore:
+    """
+    In-memory Firestore look-alike. Each RPC sleeps `latency` seconds, fails
+    with probability `error_rate` (ResourceExhausted, or DeadlineExceeded
+    after the write was applied), and is rejected with ResourceExhausted
+    while more than `capacity` RPCs are in flight. Each write holds its
+    document for `contention` seconds, so writes to one document
+    serialize the way they do on a real hot document. set(merge=True)
+    applies Increment transforms, and a batch create() of an existing
+    document fails the batch with AlreadyExists. on_snapshot() watches
+    deliver each write and delete synchronously, stamped with a strictly
+    increasing update_time.
+    """
+
+    def __init__(self, error_rate=0.0, latency=0.0, capacity=None, seed=0, contention=0.0):
+        self.error_rate = error_rate
+        self.latency = latency
+        self.capacity = capacity
+        self.contention = contention
+        self.data = {}
+        self.rpcs = 0
+        self.doc_writes = {}
+        self.update_times = {}
+        self._watches = []
+        self._last_time = datetime.fromtimestamp(0, timezone.utc)
+        # delivers watch callbacks one at a time, in write order
+        self._notify_lock = threading.RLock()
+        self._in_flight = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._doc_locks = {}
+
+    def collection(self, name):
+        self.data.setdefault(name, {})
+        return _Collection(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+    def _now(self):
+        """Server time for a write; caller holds the lock."""
+        self._last_time = max(datetime.now(timezone.utc), self._last_time + timedelta(microseconds=1))
+        return self._last_time
+
+    def _put(self, collection, doc_id, data, merge=False):
+        with self._lock:
+            key = (collection, doc_id)
+            doc_lock = self._doc_locks.setdefault(key, threading.Lock())
+            self.doc_writes[key] = self.doc_writes.get(key, 0) + 1
+        with doc_lock:
+            if self.contention:
+                time.sleep(self.contention)
+            with self._lock:
+                docs = self.data.setdefault(collection, {})
+                kind = "MODIFIED" if doc_id in docs else "ADDED"
+                doc = dict(docs.get(doc_id) or {}) if merge else {}
+                for field, value in data.items():
+                    # firestore.Increment(n) adds n to the stored number
+                    if type(value).__name__ == "Increment":
+                        value = doc.get(field, 0) + value.value
+                    doc[field] = value
+                docs[doc_id] = doc
+                self.update_times[key] = self._now()
+                change = (kind, _Snapshot(doc_id, doc, self.update_times[key]))
+            self._notify(collection, change)
+
+    def _delete(self, collection, doc_id):
+        with self._lock:
+            doc = self.data.setdefault(collection, {}).pop(doc_id, None)
+            if doc is None:
+                return
+            self.update_times.pop((collection, doc_id), None)
+            change = ("REMOVED", _Snapshot(doc_id, doc, self._now()))
+        self._notify(collection, change)
+
+    def _documents(self, collection):
+        return [_Snapshot(k, v, self.update_times.get((collection, k)))
+                for k, v in sorted(self.data.get(collection, {}).items())]
+
+    def _watch(self, collection, callback):
+        with self._notify_lock:
+            with self._lock:
+                watch = _Watch(self, collection, callback)
+                self._watches.append(watch)
+                docs = self._documents(collection)
+                read_time = self._now()
+            callback(docs, [_Change("ADDED", d) for d in docs], read_time)
+        return watch
+
+    def _notify(self, collection, change):
+        kind, snapshot = change
+        with self._notify_lock:
+            with self._lock:
+                watches = [w for w in self._watches if w.collection == collection]
+                if not watches:
+                    return
+                docs = self._documents(collection)
+            for watch in watches:
+                watch.callback(docs, [_Change(kind, snapshot)], snapshot.update_time)
+
+    def _rpc(self, fn):
+        with self._lock:
+            self.rpcs += 1
+            self._in_flight += 1
+            over_quota = self.capacity is not None and self._in_flight > self.capacity
+            roll = self._rng.random()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if over_quota or roll < self.error_rate / 2:
+                raise ResourceExhausted("injected: quota exceeded")
+            result = fn()
+            if roll < self.error_rate:
+                raise DeadlineExceeded("injected: deadline exceeded after apply")
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write and read back documents through ResilientClient to check retries and AIMD.")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="stub only")
+    parser.add_argument("--capacity", type=int, default=16, help="stub only: concurrent RPC quota")
+    parser.add_argument("--latency", type=float, default=0.005, help="stub only: seconds per RPC")
+    parser.add_argument("--emulator", action="store_true",
+                        help="use the Firestore emulator (FIRESTORE_EMULATOR_HOST) instead of the stub")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from etl_export_to_csv import init_firestore
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("FIRESTORE_EMULATOR_HOST is not set")
+        db = init_firestore()
+    else:
+        db = FaultyFirestore(args.error_rate, args.latency, args.capacity)
+
+    from etl_export_to_csv import iter_pages
+
+    client = ResilientClient(db)
+    ref = client.collection("resilience_check")
+    ids = [f"doc_{i:07d}" for i in range(args.docs)]
+    client.map(lambda doc_id: ref.document(doc_id).set({"n": doc_id}), ids)
+    print(f" Writes: {client.stats_line()}")
+
+    found = sum(len(page) for page in iter_pages(ref, 500, client))
+    print(f" Read back {found} documents; totals: {client.stats_line()}")
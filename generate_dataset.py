@@ -0,0 +1,187 @@
+import argparse
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------
+# CONFIG
+# -------------------------------------------------------------------
+INTERACTION_TYPES = np.array(["view", "like", "cook_attempt", "rating"], dtype=object)
+INTERACTION_WEIGHTS = [0.45, 0.30, 0.10, 0.15]
+DIFFICULTIES = np.array(["easy", "medium", "hard"], dtype=object)
+CUISINES = np.array(["Indian", "Italian", "American", "Chinese", "Global"], dtype=object)
+CATEGORIES = np.array(["Main Course", "Breakfast", "Dessert", "Snack", "Salad", "Beverage", "Starter"], dtype=object)
+SUCCESS_STATUSES = np.array(["success", "failed", "partial"], dtype=object)
+COMMENTS = np.array(["Turned out great!", "A bit too spicy.", "Nice and easy recipe.", ""], dtype=object)
+SOURCES = np.array(["web", "mobile"], dtype=object)
+BASE_INGREDIENTS = [
+    "Onion", "Tomato", "Oil", "Salt", "Garlic", "Black pepper", "Butter", "Milk",
+    "Cheese", "Rice", "Paneer", "Flour", "Sugar", "Egg", "Ginger", "Lemon",
+    "Potato", "Carrot", "Peas", "Coriander", "Cumin", "Turmeric", "Chilli", "Bread",
+]
+ID_ALPHABET = np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789", dtype=np.uint8)
+
+# -------------------------------------------------------------------
+# HELPERS
+# -------------------------------------------------------------------
+def random_ids(rng, n, length=20):
+    """Firestore-style auto IDs, generated as one uint8 block."""
+    chars = ID_ALPHABET[rng.integers(0, len(ID_ALPHABET), size=(n, length))]
+    return chars.view(f"S{length}").ravel().astype(str).astype(object)
+
+
+def iso_timestamps(epoch_us):
+    stamps = np.datetime_as_string(epoch_us.astype("datetime64[us]"), unit="us")
+    return pd.Series(stamps, dtype=object) + "+00:00"
+
+
+def scale_for(n_interactions):
+    """Recipe / user counts that keep per-recipe density close to the seed data."""
+    n_recipes = max(16, n_interactions // 100)
+    n_users = max(5, n_interactions // 40)
+    return n_recipes, n_users
+
+# -------------------------------------------------------------------
+# GENERATE
+# -------------------------------------------------------------------
+def generate_recipes(rng, n_recipes, n_users, now_us):
+    recipe_ids = pd.Series([f"recipe_{i:07d}" for i in range(n_recipes)], dtype=object)
+    prep = rng.integers(5, 60, size=n_recipes)
+    cook = rng.integers(0, 90, size=n_recipes)
+    cuisine = CUISINES[rng.integers(0, len(CUISINES), size=n_recipes)]
+    category = CATEGORIES[rng.integers(0, len(CATEGORIES), size=n_recipes)]
+    created = now_us - rng.integers(30, 400, size=n_recipes) * 86_400_000_000
+    updated = created + rng.integers(0, 30, size=n_recipes) * 86_400_000_000
+
+    recipes = pd.DataFrame({
+        "recipeId": recipe_ids,
+        "title": "Recipe " + recipe_ids.str[7:],
+        "description": "A generated recipe for benchmarking.",
+        "authorId": "user_" + pd.Series(rng.integers(0, n_users, size=n_recipes)).astype(str),
+        "cuisine": cuisine,
+        "category": category,
+        "difficulty": DIFFICULTIES[rng.integers(0, 3, size=n_recipes)],
+        "prepTimeMinutes": prep,
+        "cookTimeMinutes": cook,
+        "totalTimeMinutes": prep + cook,
+        "servings": rng.integers(1, 6, size=n_recipes),
+        "tags": pd.Series(cuisine).str.lower() + "," + pd.Series(category).str.lower(),
+        "createdAt": iso_timestamps(created),
+        "updatedAt": iso_timestamps(updated),
+        "isPublic": True,
+    })
+
+    # ingredients: 3-12 per recipe, names drawn from a pool with a few noisy variants
+    n_ing = rng.integers(3, 13, size=n_recipes)
+    ing_recipe = np.repeat(np.arange(n_recipes), n_ing)
+    ing_pos = np.arange(len(ing_recipe)) - np.repeat(np.cumsum(n_ing) - n_ing, n_ing) + 1
+    pool = np.array(BASE_INGREDIENTS + [f"{n} (optional)" for n in BASE_INGREDIENTS[:6]], dtype=object)
+    ingredients = pd.DataFrame({
+        "recipeId": recipe_ids.to_numpy()[ing_recipe],
+        "ingredientId": recipe_ids.to_numpy()[ing_recipe] + "-ING-" + pd.Series(ing_pos).astype(str).str.zfill(2).to_numpy(),
+        "name": pool[rng.integers(0, len(pool), size=len(ing_recipe))],
+        "quantity": np.round(rng.uniform(0.25, 500, size=len(ing_recipe)), 2),
+        "unit": "grams",
+        "notes": "",
+    })
+
+    # steps: 3-8 per recipe
+    n_steps = rng.integers(3, 9, size=n_recipes)
+    step_recipe = np.repeat(np.arange(n_recipes), n_steps)
+    step_no = np.arange(len(step_recipe)) - np.repeat(np.cumsum(n_steps) - n_steps, n_steps) + 1
+    steps = pd.DataFrame({
+        "recipeId": recipe_ids.to_numpy()[step_recipe],
+        "stepNumber": step_no,
+        "instruction": "Follow generated step " + pd.Series(step_no).astype(str),
+        "approxMinutes": rng.integers(1, 20, size=len(step_recipe)),
+    })
+
+    return recipes, ingredients, steps
+
+
+def generate_interactions(rng, n_interactions, recipe_ids, n_users, now_us):
+    # Zipf-ish popularity so a few recipes are hot, like real traffic
+    n_recipes = len(recipe_ids)
+    popularity = 1.0 / np.arange(1, n_recipes + 1) ** 0.8
+    popularity /= popularity.sum()
+    recipe_idx = rng.choice(n_recipes, size=n_interactions, p=popularity)
+    types = INTERACTION_TYPES[rng.choice(4, size=n_interactions, p=INTERACTION_WEIGHTS)]
+    created = now_us - rng.integers(0, 365 * 86_400_000_000, size=n_interactions)
+
+    is_rating = types == "rating"
+    is_cook = types == "cook_attempt"
+    rating = np.where(is_rating, rng.integers(1, 6, size=n_interactions), np.nan)
+    difficulty_rating = np.where(is_cook, rng.integers(1, 6, size=n_interactions), np.nan)
+    success = np.where(is_cook, SUCCESS_STATUSES[rng.integers(0, 3, size=n_interactions)], None)
+    comment = np.where(is_cook, COMMENTS[rng.integers(0, 4, size=n_interactions)], None)
+
+    return pd.DataFrame({
+        "interactionId": random_ids(rng, n_interactions),
+        "userId": "user_" + pd.Series(rng.integers(0, n_users, size=n_interactions)).astype(str),
+        "recipeId": recipe_ids[recipe_idx],
+        "type": types,
+        "createdAt": iso_timestamps(created),
+        "rating": rating,
+        "difficultyRating": difficulty_rating,
+        "successStatus": success,
+        "comment": comment,
+        "source": SOURCES[rng.integers(0, 2, size=n_interactions)],
+    })
+
+
+def generate_users(rng, n_users, now_us):
+    created = now_us - rng.integers(0, 400, size=n_users) * 86_400_000_000
+    return pd.DataFrame({
+        "userId": "user_" + pd.Series(np.arange(n_users)).astype(str),
+        "createdAt": iso_timestamps(created),
+        "skillLevel": np.array(["beginner", "intermediate", "expert"], dtype=object)[rng.integers(0, 3, size=n_users)],
+        "dietPreferences": "",
+    })
+
+
+def generate_dataset(out_dir, n_interactions, seed=42):
+    """
+    Writes recipe.csv, ingredients.csv, steps.csv, interactions.csv and
+    users.csv with the same schema as etl_export_to_csv.py, sized by
+    n_interactions.
+    Returns the row counts per table.
+    """
+    rng = np.random.default_rng(seed)
+    now_us = int(datetime.now(timezone.utc).timestamp() * 1_000_000)
+    n_recipes, n_users = scale_for(n_interactions)
+
+    recipes, ingredients, steps = generate_recipes(rng, n_recipes, n_users, now_us)
+    interactions = generate_interactions(
+        rng, n_interactions, recipes["recipeId"].to_numpy(), n_users, now_us
+    )
+    users = generate_users(rng, n_users, now_us)
+
+    os.makedirs(out_dir, exist_ok=True)
+    recipes.to_csv(os.path.join(out_dir, "recipe.csv"), index=False)
+    ingredients.to_csv(os.path.join(out_dir, "ingredients.csv"), index=False)
+    steps.to_csv(os.path.join(out_dir, "steps.csv"), index=False)
+    interactions.to_csv(os.path.join(out_dir, "interactions.csv"), index=False)
+    users.to_csv(os.path.join(out_dir, "users.csv"), index=False)
+
+    return {
+        "recipes": len(recipes),
+        "ingredients": len(ingredients),
+        "steps": len(steps),
+        "interactions": len(interactions),
+        "users": len(users),
+    }
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset in the export CSV layout.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--interactions", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    counts = generate_dataset(args.out_dir, args.interactions, args.seed)
+    print(f" Generated {counts} in {args.out_dir}")
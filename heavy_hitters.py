@@ -0,0 +1,181 @@
+import argparse
+import heapq
+import json
+import os
+
+import pandas as pd
+
+from compressed_io import find_table
+
+# -------------------------------------------------------------------
+# Streaming top-K recipes per interaction type (Space-Saving)
+#
+# Each interaction type keeps at most `capacity` (recipe, count, error)
+# counters. A recipe already tracked has its count increased; a new
+# recipe replaces the current minimum and inherits its count as error.
+# Any recipe whose true count exceeds N / capacity is guaranteed to be
+# tracked, and every reported count is within `error` of the truth
+# (count - error <= true count <= count).
+#
+# Rows arrive chunk by chunk (update_frame) or one event at a time
+# (update_event); top() is a sort of at most `capacity` counters, so the
+# leaderboard never needs a pass over the raw interactions.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+STATE_PATH = os.path.join(DATA_DIR, ".heavy_hitters", "top_recipes.json")
+DEFAULT_CAPACITY = 1024
+CHUNK_SIZE = 100_000
+
+
+class SpaceSaving:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # (count, key) min-heap; entries go stale when a count changes and
+        # are dropped lazily when they surface
+        self._heap = []
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def update(self, key, weight=1):
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            floor, evicted = self._pop_min()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        # keep the heap from growing without bound on long streams
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def update_counts(self, counts: pd.Series):
+        """Adds a pre-aggregated chunk (index = key, values = counts)."""
+        # largest first, so a chunk's heavy keys are not evicted by its tail
+        for key, weight in counts.sort_values(ascending=False, kind="stable").items():
+            self.update(key, int(weight))
+
+    def top(self, k):
+        """[(key, count, error), ...] for the k largest counters."""
+        best = heapq.nlargest(k, self.counts.items(), key=lambda kv: kv[1])
+        return [(key, count, self.errors[key]) for key, count in best]
+
+    def guaranteed(self, k):
+        """
+        True when the reported top k is exactly the true top k: each one's
+        lower bound beats the next counter's upper bound.
+        """
+        ranked = self.top(k + 1)
+        if len(ranked) <= k:
+            return True
+        next_count = ranked[k][1]
+        return all(count - error >= next_count for _, count, error in ranked[:k])
+
+
+class HeavyHitterTracker:
+    """One Space-Saving summary per interaction type."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.summaries = {}
+
+    def _summary(self, kind):
+        if kind not in self.summaries:
+            self.summaries[kind] = SpaceSaving(self.capacity)
+        return self.summaries[kind]
+
+    def update_event(self, recipe_id, kind):
+        """One live interaction (e.g. from a Firestore listener)."""
+        self._summary(kind).update(recipe_id)
+
+    def update_frame(self, chunk: pd.DataFrame):
+        """A chunk of interactions rows (needs recipeId and type columns)."""
+        counts = chunk.groupby(["type", "recipeId"]).size()
+        for kind, per_recipe in counts.groupby(level="type"):
+            self._summary(kind).update_counts(per_recipe.droplevel("type"))
+
+    def top(self, kind, k=5) -> pd.DataFrame:
+        summary = self.summaries.get(kind)
+        rows = summary.top(k) if summary else []
+        return pd.DataFrame(rows, columns=["recipeId", "count", "error"]).set_index("recipeId")
+
+    @classmethod
+    def from_csv(cls, path, capacity=DEFAULT_CAPACITY, chunksize=CHUNK_SIZE):
+        """Streams interactions.csv without loading it whole."""
+        tracker = cls(capacity)
+        for chunk in pd.read_csv(path, usecols=["recipeId", "type"], chunksize=chunksize):
+            tracker.update_frame(chunk)
+        return tracker
+
+    @classmethod
+    def from_frame(cls, interactions, capacity=DEFAULT_CAPACITY, chunksize=CHUNK_SIZE):
+        tracker = cls(capacity)
+        for start in range(0, len(interactions), chunksize):
+            tracker.update_frame(interactions.iloc[start:start + chunksize])
+        return tracker
+
+    # ---------------------------------------------------------------
+    # persistence
+    # ---------------------------------------------------------------
+    def save(self, path=STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {
+            "capacity": self.capacity,
+            "summaries": {
+                kind: {"total": s.total, "counters": [[k, c, s.errors[k]] for k, c in s.counts.items()]}
+                for kind, s in self.summaries.items()
+            },
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        with open(path) as f:
+            state = json.load(f)
+        tracker = cls(state["capacity"])
+        for kind, data in state["summaries"].items():
+            s = tracker._summary(kind)
+            s.total = data["total"]
+            for key, count, error in data["counters"]:
+                s.counts[key] = count
+                s.errors[key] = error
+            s._heap = [(c, k) for k, c in s.counts.items()]
+            heapq.heapify(s._heap)
+        return tracker
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream interactions.csv into per-type top-K summaries.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out", default=STATE_PATH)
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    tracker = HeavyHitterTracker.from_csv(
+        find_table(args.data_dir, "interactions"), args.capacity, args.chunksize
+    )
+    tracker.save(args.out)
+    for kind in sorted(tracker.summaries):
+        exact = "exact" if tracker.summaries[kind].guaranteed(args.k) else "approximate"
+        print(f"\nTop {args.k} by {kind} ({exact}):")
+        print(tracker.top(kind, args.k))
@@ -0,0 +1,443 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from dedup import DEDUP_DIR, SeenIndex
+from etl_export_to_csv import init_firestore
+from firestore_client import error_kind, is_valid_document_id
+from instrumentation import stage
+from sharded_counters import DEFAULT_SHARDS, ShardedCounters, count_events
+from validate_csv_data import parse_timestamp, validate_interactions, validate_recipe_events
+
+# -------------------------------------------------------------------
+# Buffered event ingestion
+#
+#   POST /events  {event} or [{event}, ...]
+#     -> validated with the validate_csv_data rules
+#     -> appended to the spool file and fsync'ed   (durable from here)
+#     -> 202 Accepted
+#   flusher thread, every FLUSH_INTERVAL_S or FLUSH_SIZE events:
+#     -> spool file rotated to spool-<seq>.pending
+#     -> written to Firestore as batched commits (<= 500 writes each)
+#     -> pending file deleted
+#
+# Only transient errors (firestore_client.error_kind) are retried, with
+# backoff, until the commit lands. A batch that fails any other way is
+# split into single-event commits, and an event that still fails, or
+# cannot even be turned into a document, is appended to
+# dead-letter.jsonl in the spool directory with the error, so one bad
+# event never blocks the rest. Client ids must be valid Firestore
+# document ids (no "/"), or the event is rejected at intake.
+#
+# Every event gets a document id when it is accepted (the client's
+# event_id / interactionId if it sent one), so replaying a pending file
+# after a crash overwrites the same documents instead of duplicating
+# them. Client retries of an id seen before are dropped up front by a
+# dedup.SeenIndex under data/.dedup/. When MAX_BUFFERED events are waiting (Firestore slow
+# or down) new requests get 503 + Retry-After instead of growing memory.
+#
+# With --counters, each commit also carries one Increment per (recipe,
+# event type) it contains, on a sharded counter (sharded_counters.py), so
+# the counts land atomically with the events. Those batches hold at most
+# half as many events, leaving room for the counter writes. Increments
+# are not idempotent, so those batches create() their event documents
+# instead of set()ting them: a retry of a commit that was in fact
+# applied (DEADLINE_EXCEEDED), or a spool replay of one, fails as a
+# whole with ALREADY_EXISTS. It is then retried one event per commit,
+# and an event whose document already exists counts as written.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+SPOOL_DIR = os.path.join(DATA_DIR, ".ingest_spool")
+HOST = "127.0.0.1"
+PORT = 8085
+FLUSH_SIZE = 500
+FLUSH_INTERVAL_S = 1.0
+MAX_BUFFERED = 20_000
+MAX_REQUEST_BYTES = 5 * 1024 * 1024
+DEDUP_COMMIT_INTERVAL_S = 60.0
+FIRESTORE_BATCH_LIMIT = 500
+
+# collection -> (validator, columns it checks, id field, timestamp field)
+COLLECTIONS = {
+    "recipe_events": (
+        validate_recipe_events,
+        ["user_id", "recipe_id", "event_type", "timestamp", "source"],
+        "event_id",
+        "timestamp",
+    ),
+    "interactions": (
+        validate_interactions,
+        ["interactionId", "userId", "recipeId", "type", "createdAt", "rating",
+         "difficultyRating", "successStatus", "comment", "source"],
+        "interactionId",
+        "createdAt",
+    ),
+}
+# collection -> (recipe field, event type field) for the sharded counters
+COUNTER_FIELDS = {
+    "recipe_events": ("recipe_id", "event_type"),
+    "interactions": ("recipeId", "type"),
+}
+
+
+class Backpressure(Exception):
+    pass
+
+
+def already_exists(exc):
+    return any(cls.__name__ == "AlreadyExists" for cls in type(exc).__mro__)
+
+
+class EventIngestor:
+    def __init__(self, db, collection="recipe_events", spool_dir=SPOOL_DIR, flush_size=FLUSH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_S, max_buffered=MAX_BUFFERED, dedup_dir=None, counters=None):
+        self.db = db
+        self.counters = counters
+        self.collection = collection
+        self.validator, self.columns, self.id_field, self.ts_field = COLLECTIONS[collection]
+        self.spool_dir = spool_dir
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        # keys not yet committed to disk are lost in a crash; a retry of
+        # one of those events then rewrites the same document, so the
+        # index only needs to be durable eventually
+        self.seen = SeenIndex(dedup_dir or os.path.join(DEDUP_DIR, collection))
+        self._dedup_committed = time.monotonic()
+
+        self.buffer = []
+        self.in_flight = 0
+        self.stats = {"accepted": 0, "rejected": 0, "duplicates": 0, "written": 0,
+                      "commits": 0, "throttled": 0, "write_errors": 0, "dead_letters": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self.dead_letter_path = os.path.join(spool_dir, "dead-letter.jsonl")
+        self._spool_seq = max([self._seq_of(p) for p in self._spool_files()] + [0])
+        self._spool = None
+
+    # ---------------------------------------------------------------
+    # spool
+    # ---------------------------------------------------------------
+    def _spool_files(self):
+        return glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")) + \
+            glob.glob(os.path.join(self.spool_dir, "spool-*.pending"))
+
+    @staticmethod
+    def _seq_of(path):
+        return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+    def _open_spool(self):
+        self._spool_seq += 1
+        path = os.path.join(self.spool_dir, f"spool-{self._spool_seq:012d}.jsonl")
+        self._spool = open(path, "a", encoding="utf-8")
+
+    def _rotate_spool(self):
+        """Seals the current spool file as pending; caller holds the lock."""
+        if self._spool is None:
+            return None
+        path = self._spool.name
+        self._spool.close()
+        self._spool = None
+        pending = path[:-len(".jsonl")] + ".pending"
+        os.replace(path, pending)
+        return pending
+
+    def replay_spool(self):
+        """Writes events left over from a previous run, oldest file first."""
+        files = sorted(self._spool_files(), key=self._seq_of)
+        replayed = 0
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                # a torn last line is an event that was never acknowledged
+                events = []
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+            self._write(events)
+            os.remove(path)
+            replayed += len(events)
+        return replayed
+
+    # ---------------------------------------------------------------
+    # intake
+    # ---------------------------------------------------------------
+    def validate(self, events):
+        """Returns (valid events, [{"index", "reason"}]) using the CSV validator's rules."""
+        frame = pd.DataFrame(events).reindex(columns=self.columns)
+        results = self.validator(frame)
+        valid, rejected = [], []
+        for i, (event, result) in enumerate(zip(events, results)):
+            doc_id = event.get(self.id_field)
+            if result["valid"] and doc_id and not is_valid_document_id(str(doc_id)):
+                result = {"valid": False, "reason": f"{self.id_field} is not a valid document id"}
+            if result["valid"]:
+                valid.append(event)
+            else:
+                rejected.append({"index": i, "reason": result["reason"]})
+        return valid, rejected
+
+    def submit(self, events):
+        """
+        Validates, dedups, spools (fsync) and buffers a list of events.
+        Returns (accepted, rejected, duplicates). Raises Backpressure when
+        the buffer is full.
+        """
+        bad_shape = [{"index": i, "reason": "Event must be a JSON object"}
+                     for i, e in enumerate(events) if not isinstance(e, dict)]
+        if bad_shape:
+            self.stats["rejected"] += len(events)
+            return 0, bad_shape, 0
+
+        valid, rejected = self.validate(events)
+        for event in valid:
+            event["_id"] = str(event.get(self.id_field) or uuid.uuid4().hex)
+            event[self.id_field] = event["_id"]
+
+        with self._lock:
+            if valid and len(self.buffer) + self.in_flight + len(valid) > self.max_buffered:
+                self.stats["throttled"] += 1
+                raise Backpressure()
+            if valid:
+                keep = self.seen.check_and_add([e["_id"] for e in valid])
+                duplicates = int(len(valid) - keep.sum())
+                valid = [e for e, k in zip(valid, keep) if k]
+            else:
+                duplicates = 0
+            self.stats["duplicates"] += duplicates
+            if valid:
+                if self._spool is None:
+                    self._open_spool()
+                self._spool.write("".join(json.dumps(e) + "\n" for e in valid))
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+                self.buffer.extend(valid)
+                if len(self.buffer) >= self.flush_size:
+                    self._wake.notify()
+            self.stats["accepted"] += len(valid)
+            self.stats["rejected"] += len(rejected)
+        return len(valid), rejected, duplicates
+
+    # ---------------------------------------------------------------
+    # output
+    # ---------------------------------------------------------------
+    def _document(self, event):
+        """(document reference, stored fields) for an event; raises if it can't be a document."""
+        doc = {k: v for k, v in event.items() if k != "_id"}
+        # a datetime, so Firestore stores a Timestamp range queries can use
+        doc[self.ts_field] = parse_timestamp(doc[self.ts_field])
+        return self.db.collection(self.collection).document(event["_id"]), doc
+
+    def _dead_letter(self, events, exc):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps({"error": f"{type(exc).__name__}: {exc}", "event": e}) + "\n"
+                            for e in events))
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["dead_letters"] += len(events)
+        print(f" {len(events)} event(s) moved to {self.dead_letter_path} ({exc})")
+
+    def _commit(self, writes):
+        """One batch of (reference, fields), retrying transient errors until it lands; raises on any other."""
+        delay = 0.5
+        while True:
+            try:
+                with stage("ingest.commit", rows=len(writes)):
+                    batch = self.db.batch()
+                    for ref, doc in writes:
+                        if self.counters:
+                            batch.create(ref, doc)
+                        else:
+                            batch.set(ref, doc)
+                    if self.counters:
+                        self.counters.add_to_batch(
+                            batch, count_events([doc for _, doc in writes], *COUNTER_FIELDS[self.collection]))
+                    batch.commit()
+                return
+            except Exception as exc:
+                self.stats["write_errors"] += 1
+                if error_kind(exc) is None or self._stop.is_set():
+                    # permanent, or shutting down (the pending spool file is replayed on the next start)
+                    raise
+                print(f" Commit of {len(writes)} events failed ({exc}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def _write(self, events):
+        """Batched commits of up to FIRESTORE_BATCH_LIMIT writes; permanent failures are dead-lettered."""
+        items = []
+        for event in events:
+            try:
+                items.append((event, self._document(event)))
+            except Exception as exc:
+                self._dead_letter([event], exc)
+        # every event can add at most one counter write
+        self._write_items(items, FIRESTORE_BATCH_LIMIT // 2 if self.counters else FIRESTORE_BATCH_LIMIT)
+
+    def _write_items(self, items, limit):
+        """items: (event, (reference, fields)) pairs, committed `limit` at a time."""
+        for start in range(0, len(items), limit):
+            chunk = items[start:start + limit]
+            try:
+                self._commit([write for _, write in chunk])
+            except Exception as exc:
+                if error_kind(exc) is not None:
+                    # transient, so raised only when shutting down
+                    raise
+                if len(chunk) > 1:
+                    # a batch fails as a whole: one commit per event keeps out only the bad ones
+                    self._write_items(chunk, 1)
+                elif already_exists(exc):
+                    # written (and counted) by an earlier commit of this event
+                    self.stats["duplicates"] += 1
+                else:
+                    self._dead_letter([chunk[0][0]], exc)
+                continue
+            self.stats["commits"] += 1
+            self.stats["written"] += len(chunk)
+
+    def flush(self):
+        with self._lock:
+            events, self.buffer = self.buffer, []
+            pending = self._rotate_spool()
+            self.in_flight = len(events)
+        if events:
+            self._write(events)
+        if pending:
+            os.remove(pending)
+        with self._lock:
+            self.in_flight = 0
+            commit_dedup = (time.monotonic() - self._dedup_committed >= DEDUP_COMMIT_INTERVAL_S
+                            or self._stop.is_set())
+            if commit_dedup:
+                self._dedup_committed = time.monotonic()
+        if commit_dedup:
+            # outside the lock: the merge rewrites the whole key file, and
+            # submit() keeps checking ids against the index meanwhile
+            self.seen.commit()
+        return len(events)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                self._wake.wait_for(
+                    lambda: len(self.buffer) >= self.flush_size or self._stop.is_set(),
+                    timeout=self.flush_interval,
+                )
+            self.flush()
+        self.flush()
+
+    def start(self):
+        replayed = self.replay_spool()
+        if replayed:
+            print(f" Replayed {replayed} spooled events from a previous run.")
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+# -------------------------------------------------------------------
+# HTTP
+# -------------------------------------------------------------------
+def make_handler(ingestor):
+    class IngestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._reply(404, {"error": "not found"})
+            with ingestor._lock:
+                buffered = len(ingestor.buffer) + ingestor.in_flight
+            self._reply(200, {"buffered": buffered, **ingestor.stats})
+
+        def do_POST(self):
+            if self.path != "/events":
+                return self._reply(404, {"error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                return self._reply(400, {"error": "invalid Content-Length"})
+            if length > MAX_REQUEST_BYTES:
+                return self._reply(413, {"error": "request too large"})
+            try:
+                body = json.loads(self.rfile.read(length) or b"null")
+            except json.JSONDecodeError:
+                return self._reply(400, {"error": "invalid JSON"})
+            events = body if isinstance(body, list) else [body]
+
+            try:
+                accepted, rejected, duplicates = ingestor.submit(events)
+            except Backpressure:
+                return self._reply(503, {"error": "ingest buffer full, retry later"}, {"Retry-After": "1"})
+            status = 202 if accepted or duplicates or not events else 400
+            self._reply(status, {"accepted": accepted, "duplicates": duplicates, "rejected": rejected})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return IngestHandler
+
+
+def serve(ingestor, host=HOST, port=PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(ingestor))
+    print(f" Ingesting into `{ingestor.collection}` on http://{host}:{server.server_port}/events")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ingestor.stop()
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP endpoint that buffers events into batched Firestore commits.")
+    parser.add_argument("--collection", default="recipe_events", choices=list(COLLECTIONS))
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--spool-dir", default=SPOOL_DIR)
+    parser.add_argument("--flush-size", type=int, default=FLUSH_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL_S)
+    parser.add_argument("--max-buffered", type=int, default=MAX_BUFFERED)
+    parser.add_argument("--dedup-dir", default=None, help=f"default: {DEDUP_DIR}/<collection>")
+    parser.add_argument("--counters", action="store_true",
+                        help="also keep sharded per-recipe counters (sharded_counters.py)")
+    parser.add_argument("--counter-shards", type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args()
+
+    db = init_firestore()
+    counters = ShardedCounters(db, args.counter_shards) if args.counters else None
+    ingestor = EventIngestor(db, args.collection, args.spool_dir, args.flush_size,
+                             args.flush_interval, args.max_buffered, args.dedup_dir, counters).start()
+    serve(ingestor, args.host, args.port)
@@ -0,0 +1,138 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# -------------------------------------------------------------------
+# Ingredient dimension + sparse recipe x ingredient incidence matrix
+#
+# Raw ingredient names are normalized ("Cheese (optional)" -> "cheese"),
+# mapped to integer codes, and recipes are rows of a binary CSR matrix M
+# (n_recipes x n_ingredients). Then:
+#   frequency        = M.T @ 1          recipes using each ingredient
+#   engagement       = M.T @ v / freq   mean of a per-recipe metric v
+#   co-occurrence    = M.T @ M          recipes sharing each pair
+# -------------------------------------------------------------------
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """
+    Canonical ingredient key: lowercase, parenthetical notes dropped,
+    whitespace collapsed. "All-purpose flour (maida)" -> "all-purpose flour".
+    """
+    return (
+        names.fillna("")
+        .astype(str)
+        .str.replace(r"\([^)]*\)", " ", regex=True)
+        .str.lower()
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip(" ,.-")
+    )
+
+
+class IngredientIndex:
+    def __init__(self, recipe_ids, names, display_names, matrix):
+        self.recipe_ids = pd.Index(recipe_ids, name="recipeId")
+        self.names = pd.Index(names, name="ingredient")
+        self.display_names = pd.Index(display_names, name="ingredient")
+        self.matrix = matrix.tocsr()
+
+    def frequency(self) -> pd.Series:
+        """Number of recipes using each ingredient."""
+        counts = np.asarray(self.matrix.sum(axis=0)).ravel()
+        return pd.Series(counts, index=self.display_names)
+
+    def engagement(self, per_recipe: pd.Series) -> pd.Series:
+        """
+        Mean of a per-recipe metric (e.g. like counts, indexed by recipeId)
+        over the recipes using each ingredient. Recipes missing from
+        per_recipe count as 0.
+        """
+        v = per_recipe.reindex(self.recipe_ids, fill_value=0).to_numpy(dtype=np.float64)
+        totals = self.matrix.T @ v
+        freq = np.asarray(self.matrix.sum(axis=0)).ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(freq > 0, totals / freq, np.nan)
+        return pd.Series(means, index=self.display_names)
+
+    def cooccurrence(self):
+        """n_ingredients x n_ingredients sparse matrix of shared recipe counts."""
+        return (self.matrix.T @ self.matrix).tocsr()
+
+    def top_pairs(self, k=10) -> pd.Series:
+        """The k ingredient pairs that appear together in the most recipes."""
+        upper = sparse.triu(self.cooccurrence(), k=1).tocoo()
+        if upper.nnz == 0:
+            return pd.Series(dtype=np.int64)
+        top = np.argsort(-upper.data, kind="stable")[:k]
+        labels = [
+            f"{self.display_names[i]} + {self.display_names[j]}"
+            for i, j in zip(upper.row[top], upper.col[top])
+        ]
+        return pd.Series(upper.data[top], index=labels)
+
+    # ---------------------------------------------------------------
+    # persistence
+    # ---------------------------------------------------------------
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(os.path.join(directory, "recipe_ingredient.npz"), self.matrix)
+        with open(os.path.join(directory, "ingredient_vocab.json"), "w") as f:
+            json.dump({
+                "recipe_ids": list(self.recipe_ids),
+                "names": list(self.names),
+                "display_names": list(self.display_names),
+            }, f)
+
+    @classmethod
+    def load(cls, directory):
+        matrix = sparse.load_npz(os.path.join(directory, "recipe_ingredient.npz"))
+        with open(os.path.join(directory, "ingredient_vocab.json")) as f:
+            vocab = json.load(f)
+        return cls(vocab["recipe_ids"], vocab["names"], vocab["display_names"], matrix)
+
+
+def build_ingredient_index(ingredients: pd.DataFrame, recipe_ids=None) -> IngredientIndex:
+    """
+    Builds the dimension from ingredients.csv rows. recipe_ids fixes the row
+    order (and includes recipes with no ingredients); by default rows are the
+    recipes that appear in `ingredients`.
+    """
+    keys = normalize_names(ingredients["name"])
+    keep = keys != ""
+    keys = keys[keep]
+    recipes_col = ingredients.loc[keep, "recipeId"]
+
+    codes, names = pd.factorize(keys, sort=True)
+
+    # display name: the most common original spelling, minus the notes
+    originals = (
+        ingredients.loc[keep, "name"].astype(str)
+        .str.replace(r"\s*\([^)]*\)", "", regex=True)
+        .str.strip()
+    )
+    spellings = pd.DataFrame({"code": codes, "name": originals.to_numpy()}).value_counts()
+    display = (
+        spellings.reset_index()
+        .drop_duplicates("code")
+        .set_index("code")["name"]
+        .reindex(range(len(names)))
+    )
+
+    if recipe_ids is None:
+        row_codes, recipe_ids = pd.factorize(recipes_col, sort=True)
+    else:
+        recipe_ids = pd.Index(recipe_ids)
+        row_codes = recipe_ids.get_indexer(recipes_col)
+        known = row_codes >= 0
+        row_codes, codes = row_codes[known], codes[known]
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(codes), dtype=np.int32), (row_codes, codes)),
+        shape=(len(recipe_ids), len(names)),
+    )
+    # an ingredient listed twice in one recipe still counts once
+    matrix.data[:] = 1
+
+    return IngredientIndex(recipe_ids, names, display.to_numpy(), matrix)
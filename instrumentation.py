@@ -0,0 +1,254 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+# -------------------------------------------------------------------
+# Lightweight stage instrumentation
+#
+#   with stage("analytics.read_csv.interactions") as s:
+#       df = pd.read_csv(...)
+#       s.rows = len(df)
+#
+#   @instrumented("seed.users")
+#   def seed_users(db): ...
+#
+# Disabled by default. Set PIPELINE_PROFILE=<path> to enable it for a run
+# and write the report at exit; the format follows the file name:
+#   *.prom        Prometheus textfile (node_exporter textfile collector)
+#   *.trace.json  Chrome trace events (chrome://tracing, Perfetto)
+#   anything else JSON list of records
+# When disabled, stage() returns a shared no-op object, so the cost is one
+# function call and a flag check.
+# -------------------------------------------------------------------
+
+_enabled = False
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+def _page_size():
+    try:
+        return os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+
+_PAGE_SIZE = _page_size()
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where it can't be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Not Linux: fall back to peak RSS (KiB on BSD, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "rows", "start", "rss_start", "depth")
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.depth = getattr(_local, "depth", 0)
+        _local.depth = self.depth + 1
+        self.rss_start = current_rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        rss_end = current_rss_bytes()
+        _local.depth = self.depth
+        record = {
+            "name": self.name,
+            "start_s": self.start - _origin,
+            "duration_s": end - self.start,
+            "rows": self.rows,
+            "mem_delta_bytes": (
+                rss_end - self.rss_start
+                if rss_end is not None and self.rss_start is not None else None
+            ),
+            "depth": self.depth,
+            "thread": threading.get_ident(),
+            "error": exc_type.__name__ if exc_type else None,
+        }
+        with _lock:
+            _records.append(record)
+        return False
+
+
+def stage(name, rows=None):
+    """Context manager timing one named stage; set `.rows` on it if known."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, rows)
+
+
+def instrumented(name=None):
+    """
+    Decorator version of stage(). If the function returns something with a
+    len() (a DataFrame, a list of results), that is recorded as rows.
+    """
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label) as span:
+                out = fn(*args, **kwargs)
+                if hasattr(out, "__len__"):
+                    span.rows = len(out)
+                elif isinstance(out, int):
+                    span.rows = out
+                return out
+        return wrapper
+    return decorate
+
+# -------------------------------------------------------------------
+# CONTROL
+# -------------------------------------------------------------------
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+# -------------------------------------------------------------------
+# EXPORT
+# -------------------------------------------------------------------
+def write_json(path):
+    with open(path, "w") as f:
+        json.dump(records(), f, indent=4)
+
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(path, job="recipe_pipeline"):
+    """
+    Prometheus textfile format. Repeated stage names are summed so every
+    series appears once.
+    """
+    totals = {}
+    for r in records():
+        t = totals.setdefault(r["name"], {"duration": 0.0, "rows": 0, "mem": 0, "count": 0})
+        t["duration"] += r["duration_s"]
+        t["rows"] += r["rows"] or 0
+        t["mem"] += r["mem_delta_bytes"] or 0
+        t["count"] += 1
+
+    metrics = [
+        ("pipeline_stage_duration_seconds", "gauge", "Wall time spent in the stage.", "duration"),
+        ("pipeline_stage_rows", "gauge", "Rows processed by the stage.", "rows"),
+        ("pipeline_stage_memory_delta_bytes", "gauge", "RSS change across the stage.", "mem"),
+        ("pipeline_stage_calls", "gauge", "Times the stage ran.", "count"),
+    ]
+    lines = []
+    for metric, kind, help_text, key in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage_name, t in totals.items():
+            lines.append(f'{metric}{{job="{job}",stage="{_prom_label(stage_name)}"}} {t[key]}')
+
+    # write-then-rename so the textfile collector never reads a partial file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def write_chrome_trace(path):
+    pid = os.getpid()
+    events = []
+    for r in records():
+        events.append({
+            "name": r["name"],
+            "ph": "X",
+            "ts": r["start_s"] * 1e6,
+            "dur": r["duration_s"] * 1e6,
+            "pid": pid,
+            "tid": r["thread"],
+            "args": {"rows": r["rows"], "mem_delta_bytes": r["mem_delta_bytes"]},
+        })
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def write_report(path):
+    """Picks the format from the file name (see module header)."""
+    if path.endswith(".prom"):
+        write_prometheus(path)
+    elif path.endswith(".trace.json"):
+        write_chrome_trace(path)
+    else:
+        write_json(path)
+
+
+def summary():
+    """One line per record, indented by nesting depth."""
+    lines = []
+    for r in sorted(records(), key=lambda r: r["start_s"]):
+        rows = f" rows={r['rows']:,}" if r["rows"] is not None else ""
+        mem = r["mem_delta_bytes"]
+        mem = f" mem={mem / 1_048_576:+.1f}MB" if mem is not None else ""
+        lines.append(f"{'  ' * r['depth']}{r['name']}: {r['duration_s'] * 1000:.1f} ms{rows}{mem}")
+    return "\n".join(lines)
+
+
+_PROFILE_PATH = os.environ.get("PIPELINE_PROFILE")
+if _PROFILE_PATH:
+    enable()
+    atexit.register(write_report, _PROFILE_PATH)
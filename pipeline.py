@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from compressed_io import COMPRESSIONS, compression_of, find_table, read_table, table_file
+from instrumentation import stage
+
+# -------------------------------------------------------------------
+# CONFIG
+# -------------------------------------------------------------------
+DATA_DIR = "data"
+IMAGES_DIR = "images"
+REPORT_PATH = "validation_report.json"
+STATE_PATH = ".pipeline_state.json"
+TABLES = ["recipe", "ingredients", "steps", "interactions"]
+
+# -------------------------------------------------------------------
+# DAG MODEL
+#
+#   seed (opt-in) -> export (opt-in) -> validate
+#                                    \-> analyze
+#
+# A stage declares the files it reads (inputs), the files it writes
+# (outputs) and the source files that implement it (code). It is skipped
+# when the fingerprint of inputs + code matches the last successful run and
+# all outputs still exist. Stages with no inputs (seed, export read from
+# Firestore) always run when selected. Independent stages run on a thread
+# pool, except main_thread stages (analyze: matplotlib and its bootstrap
+# process pool), which the scheduler runs itself.
+# -------------------------------------------------------------------
+class Stage:
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), code=(), main_thread=False):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.main_thread = main_thread
+
+
+class Context:
+    """
+    Shared state handed to every stage. Tables produced upstream are kept
+    in memory; anything not produced in this run is read from disk once,
+    on first use.
+    """
+
+    def __init__(self, data_dir, images_dir, report_path, compression="none"):
+        self.data_dir = data_dir
+        self.images_dir = images_dir
+        self.report_path = report_path
+        self.compression = compression
+        self.frames = {}
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        with self._lock:
+            if name not in self.frames:
+                with stage(f"pipeline.read_csv.{name}") as s:
+                    self.frames[name] = read_table(self.data_dir, name)
+                    s.rows = len(self.frames[name])
+            return self.frames[name]
+
+    def tables(self):
+        return tuple(self.table(name) for name in TABLES)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(st):
+    if not st.inputs:
+        return None
+    h = hashlib.sha256()
+    for path in st.inputs + st.code:
+        h.update(path.encode())
+        h.update(file_digest(path).encode() if os.path.exists(path) else b"missing")
+    return h.hexdigest()
+
+# -------------------------------------------------------------------
+# STAGE IMPLEMENTATIONS
+# -------------------------------------------------------------------
+def run_seed(ctx):
+    import seed_firestore
+
+    db = seed_firestore.init_firestore()
+    seed_firestore.seed_users(db)
+    seed_firestore.seed_recipes(db)
+    seed_firestore.seed_interactions(db)
+
+
+def run_export(ctx):
+    import etl_export_to_csv
+
+    db = etl_export_to_csv.init_firestore()
+    recipes, ingredients, steps = etl_export_to_csv.export_recipes(
+        db, ctx.data_dir, compression=ctx.compression)
+    interactions = etl_export_to_csv.export_interactions(
+        db, ctx.data_dir, compression=ctx.compression)
+
+    # Hand the exported frames straight to downstream stages. infer_objects
+    # gives them the same numeric dtypes a CSV round trip would.
+    with ctx._lock:
+        for name, df in zip(TABLES, (recipes, ingredients, steps, interactions)):
+            ctx.frames[name] = df.infer_objects()
+
+
+def run_validate(ctx):
+    import validate_csv_data
+
+    validate_csv_data.run_validation(ctx.data_dir, ctx.report_path, frames=ctx.tables())
+
+
+def run_analyze(ctx):
+    # charts are only saved to disk, so no GUI backend is needed
+    import matplotlib
+    matplotlib.use("Agg")
+    import analytics
+
+    analytics.main(ctx.data_dir, ctx.images_dir, frames=ctx.tables())
+
+
+def build_stages(data_dir, images_dir, report_path, compression=None):
+    # without an explicit compression, stages use whichever variant
+    # (.csv / .csv.gz / .csv.zst) is already on disk
+    if compression:
+        csvs = [table_file(data_dir, name, compression) for name in TABLES]
+    else:
+        csvs = [find_table(data_dir, name) for name in TABLES]
+    charts = [
+        os.path.join(images_dir, name)
+        for name in ("views_top5.png", "difficulty_distribution.png", "interactions_by_type.png")
+    ]
+    # every stage reads and writes tables through compressed_io and times itself with instrumentation
+    shared = ["compressed_io.py", "instrumentation.py"]
+    return {
+        "seed": Stage("seed", run_seed, code=["seed_firestore.py", "firestore_client.py"] + shared),
+        "export": Stage("export", run_export, deps=["seed"], outputs=csvs,
+                        code=["etl_export_to_csv.py", "dedup.py", "firestore_client.py"] + shared),
+        "validate": Stage("validate", run_validate, deps=["export"], inputs=csvs,
+                          outputs=[report_path], code=["validate_csv_data.py"] + shared),
+        "analyze": Stage("analyze", run_analyze, deps=["export"], inputs=csvs,
+                         outputs=charts, main_thread=True,
+                         code=["analytics.py", "ingredient_index.py",
+                               "recipe_stats.py", "sampling.py", "sketches.py"] + shared),
+    }
+
+# -------------------------------------------------------------------
+# SCHEDULER
+# -------------------------------------------------------------------
+def load_state(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp, path)
+
+
+def run_pipeline(selected, data_dir=DATA_DIR, images_dir=IMAGES_DIR, report_path=REPORT_PATH,
+                 state_path=STATE_PATH, force=False, workers=2, compression=None):
+    """
+    Runs the selected stages in dependency order, independent stages in
+    parallel. Dependencies that were not selected are treated as already
+    satisfied. `compression` is how a fresh export is written (default:
+    the same as the existing files). Returns {stage: "ran" | "skipped"}.
+    """
+    stages = build_stages(data_dir, images_dir, report_path, compression)
+    selected = [name for name in stages if name in selected]
+    deps = {name: [d for d in stages[name].deps if d in selected] for name in selected}
+
+    compression = compression or compression_of(find_table(data_dir, "interactions"))
+    ctx = Context(data_dir, images_dir, report_path, compression)
+    state = load_state(state_path)
+    status = {}
+
+    def execute(name):
+        st = stages[name]
+        fp = fingerprint(st)
+        up_to_date = (
+            not force
+            and fp is not None
+            and state.get(name) == fp
+            and all(os.path.exists(p) for p in st.outputs)
+        )
+        if up_to_date:
+            return "skipped", 0.0
+        start = time.perf_counter()
+        with stage(f"pipeline.{name}"):
+            st.run(ctx)
+        # fingerprint inputs as they were consumed
+        if fp is not None:
+            state[name] = fp
+        return "ran", time.perf_counter() - start
+
+    def finish(name, result, seconds):
+        status[name] = result
+        suffix = f" in {seconds:.2f}s" if result == "ran" else " (inputs unchanged)"
+        print(f" [{name}] {result}{suffix}")
+
+    pending = set(selected)
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                ready = [n for n in selected if n in pending and all(d in status for d in deps[n])]
+                for name in ready:
+                    pending.discard(name)
+                    if not stages[name].main_thread:
+                        running[pool.submit(execute, name)] = name
+                # while the pool works on the others
+                for name in ready:
+                    if stages[name].main_thread:
+                        finish(name, *execute(name))
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        finish(running.pop(fut), *fut.result())
+    finally:
+        # keep the fingerprints of stages that did succeed
+        save_state(state_path, state)
+
+    return status
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the recipe pipeline as a DAG with cached stages.")
+    parser.add_argument("--seed", action="store_true", help="seed Firestore first")
+    parser.add_argument("--export", action="store_true", help="export fresh CSVs from Firestore")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["validate", "analyze"])
+    parser.add_argument("--force", action="store_true", help="ignore cached fingerprints")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--images-dir", default=IMAGES_DIR)
+    parser.add_argument("--compression", default=None, choices=list(COMPRESSIONS),
+                        help="how --export writes the CSVs (default: as the existing ones)")
+    args = parser.parse_args()
+
+    selected = {"validate", "analyze"} - set(args.skip)
+    if args.seed:
+        selected |= {"seed", "export"}
+    if args.export:
+        selected.add("export")
+
+    run_pipeline(selected, args.data_dir, args.images_dir, force=args.force, workers=args.workers,
+                 compression=args.compression)
+    print(" Pipeline complete.")
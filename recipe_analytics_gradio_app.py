@@ -1,119 +1,148 @@
-import gradio as gr
+import os
+from functools import lru_cache
+
 import pandas as pd
-import plotly.express as px
-from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, firestore
+
+from data_sources import EVENT_TYPES, make_source
+from heavy_hitters import STATE_PATH as HEAVY_HITTERS_PATH, HeavyHitterTracker
+from recommendations import INDEX_PATH, RecommendationIndex
+from sessions import build_journeys
+from sharded_counters import ShardedCounters
+from sketches import SKETCH_PATH, UniqueUserSketches
+
+# gradio and plotly are imported where the UI and the charts are built, and
+# the data source connects on first use, so importing this module (e.g. to
+# reuse funnel_metrics) costs neither a UI toolkit nor a Firestore client.
 
 # ------------------------------------------------------------------------------
-# Firebase initialization
+# Data source (Firestore by default, RECIPE_DATA_SOURCE=local for data/*.csv)
 # ------------------------------------------------------------------------------
 
-def init_firebase():
-    """
-    Initializes Firebase Admin SDK and returns a Firestore client.
-    Edit the credentials part to match your setup:
-    - Service Account JSON
-    - or Application Default Credentials
-    """
-    if not firebase_admin._apps:
-        # Initialize with your service account key
-        cred = credentials.Certificate("serviceAccountKey.json")  # Update this path
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
-
-db = init_firebase()
+@lru_cache(maxsize=None)
+def get_source():
+    return make_source()
 
 # ------------------------------------------------------------------------------
-# Firestore-backed recipe + event helpers
+# Recipe + event helpers
 # ------------------------------------------------------------------------------
 
+# Loaded once, on first use
+@lru_cache(maxsize=None)
 def load_recipes():
     """
-    Reads recipes from Firestore collection: `recipes`
-
-    Expected document structure:
-    - name (string)
-    - difficulty (string)
-    - avg_rating (number)
-    - total_cook_time_min (number)
-    - tags (array<string>)
+    Reads recipe metadata from the configured data source.
+    See data_sources.FirestoreSource.load_recipes for the document structure.
     """
-    recipes = []
-    docs = db.collection("recipes").stream()
-    for doc in docs:
-        data = doc.to_dict() or {}
-        recipes.append({
-            "id": doc.id,
-            "name": data.get("name"),
-            "difficulty": data.get("difficulty", "Unknown"),
-            "avg_rating": data.get("avg_rating"),
-            "total_cook_time_min": data.get("total_cook_time_min"),
-            "tags": data.get("tags"),
-        })
-    return recipes
-
-# Loaded once at startup
-RECIPES = load_recipes()
-
-def get_recipe_by_name(name: str):
-    for r in RECIPES:
-        if r["name"] == name:
-            return r
-    return None
+    return get_source().load_recipes()
 
-def fetch_recipe_events(recipe_id: str, days: int) -> pd.DataFrame:
+@lru_cache(maxsize=None)
+def load_recommendations():
     """
-    Reads events from Firestore collection: `recipe_events`
-
-    Expected document structure:
-    - user_id (string)
-    - recipe_id (string)
-    - event_type (string: view/favorite/start_cook/complete_cook)
-    - timestamp (Firestore Timestamp)
-    - source (string)
+    Loads the precomputed neighbour index built by `python recommendations.py`,
+    or None when it hasn't been built yet.
     """
-    now = datetime.utcnow()
-    cutoff = now - timedelta(days=days)
+    if not os.path.exists(INDEX_PATH):
+        return None
+    return RecommendationIndex.load(INDEX_PATH)
 
-    # Query recipe events
-    q = (db.collection("recipe_events")
-           .where("recipe_id", "==", recipe_id)
-           .where("timestamp", ">=", cutoff))
+@lru_cache(maxsize=None)
+def load_sketches():
+    """
+    Loads the unique-user HyperLogLog sketches persisted by analytics.py,
+    or None when they haven't been built yet.
+    """
+    if not os.path.exists(SKETCH_PATH):
+        return None
+    return UniqueUserSketches.load(SKETCH_PATH)
 
-    events = []
-    for doc in q.stream():
-        data = doc.to_dict() or {}
-        ts = data.get("timestamp")
+@lru_cache(maxsize=None)
+def load_heavy_hitters():
+    """
+    Loads the top-K summaries saved by `python heavy_hitters.py`, or None
+    when they haven't been built yet.
+    """
+    if not os.path.exists(HEAVY_HITTERS_PATH):
+        return None
+    return HeavyHitterTracker.load(HEAVY_HITTERS_PATH)
 
-        # Convert Firestore Timestamp -> Python datetime
-        # If already a datetime (e.g. from emulator), keep as is.
-        if hasattr(ts, "to_datetime"):
-            ts = ts.to_datetime()
+@lru_cache(maxsize=None)
+def load_counters():
+    """
+    The sharded all-time counters kept by `ingest_service.py --counters`,
+    when RECIPE_COUNTERS=1; None otherwise. Built once, on the data
+    source's Firestore client when it has one (the local backend has none,
+    so it gets one client of its own for the counters).
+    """
+    if os.environ.get("RECIPE_COUNTERS") != "1":
+        return None
+    db = get_source().db
+    if db is None:
+        from etl_export_to_csv import init_firestore
+        db = init_firestore()
+    return ShardedCounters(db)
+
+def counters_md(recipe_id: str) -> str:
+    """All-time counts per event type summed from the counter shards (no event scan)."""
+    counters = load_counters()
+    if counters is None:
+        return ""
+    totals = counters.get_many([recipe_id], EVENT_TYPES).iloc[0]
+    return "- **All-time (sharded counters)**: " + ", ".join(f"`{totals[t]}` {t}" for t in EVENT_TYPES) + "\n"
+
+def unique_users_md(recipe_id: str, days: int) -> str:
+    """Approximate unique viewers / cooks from the sketches, as markdown lines."""
+    sketches = load_sketches()
+    if sketches is None:
+        return ""
+    # the same window the source's events and counts use (LocalFileSource
+    # anchors it at the newest exported event, not at now)
+    start = (pd.Timestamp(get_source().reference_time) - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    viewers, viewers_err = sketches.unique_users(recipe_id, start=start, types=["view"])
+    cooks, cooks_err = sketches.unique_users(recipe_id, start=start, types=["cook_attempt"])
+    return (
+        f"- **Unique Viewers (approx.)**: `{viewers:.0f} ± {viewers_err:.0f}`\n"
+        f"- **Unique Cooks (approx.)**: `{cooks:.0f} ± {cooks_err:.0f}`\n"
+    )
 
-        events.append({
-            "user_id": data.get("user_id"),
-            "recipe_id": data.get("recipe_id"),
-            "event_type": data.get("event_type"),
-            "timestamp": ts,
-            "source": data.get("source"),
-        })
+def ordered_funnel_md(df: pd.DataFrame) -> str:
+    """
+    Per-user funnel (view -> favorite -> start_cook -> complete_cook), each
+    step counted only when the same user reached it after the previous one.
+    """
+    journeys = build_journeys(df["user_id"], df["recipe_id"], df["event_type"], df["timestamp"],
+                              steps=EVENT_TYPES)
+    reached = journeys[EVENT_TYPES].notna().sum()
+    lines = [f"- **Ordered Funnel (users)**: `{reached['view']}` viewed"]
+    for prev, step in zip(EVENT_TYPES, EVENT_TYPES[1:]):
+        rate = reached[step] / reached[prev] * 100 if reached[prev] else 0
+        lines.append(f"→ `{reached[step]}` {step} ({rate:.1f}%)")
+    return " ".join(lines) + "\n"
 
-    if not events:
-        return pd.DataFrame(columns=["user_id", "recipe_id", "event_type", "timestamp", "source"])
+def get_recipe_by_name(name: str):
+    for r in load_recipes():
+        if r["name"] == name:
+            return r
+    return None
 
-    return pd.DataFrame(events)
+def fetch_recipe_events(recipe_id: str, days: int) -> pd.DataFrame:
+    """
+    Reads the last `days` of events for one recipe from the configured data
+    source. Columns: user_id, recipe_id, event_type, timestamp, source.
+    """
+    return get_source().fetch_recipe_events(recipe_id, days)
 
 # ------------------------------------------------------------------------------
 # Analytics logic
 # ------------------------------------------------------------------------------
 
+TIME_WINDOWS = {"Last 7 days": 7, "Last 14 days": 14, "Last 30 days": 30}
+
 def compute_recipe_analytics(recipe_name: str, time_window: str):
     """
-    Core analytics function using REAL Firestore data.
+    Core analytics function using REAL data from the configured source.
     time_window: 'Last 7 days' | 'Last 14 days' | 'Last 30 days'
     """
-    if not RECIPES:
+    if not load_recipes():
         return (
             "No recipes found in Firestore collection `recipes`.",
             None,
@@ -128,8 +157,7 @@ def compute_recipe_analytics(recipe_name: str, time_window: str):
             "Check the recipe name or Firestore data."
         )
 
-    days_map = {"Last 7 days": 7, "Last 14 days": 14, "Last 30 days": 30}
-    days = days_map.get(time_window, 7)
+    days = TIME_WINDOWS.get(time_window, 7)
 
     df = fetch_recipe_events(recipe["id"], days)
 
@@ -155,7 +183,7 @@ def compute_recipe_analytics(recipe_name: str, time_window: str):
     summary_md = f"""
 ### 📊 Analytics for **{recipe_name}** ({time_window})
 
-**From Firestore collections: `recipes` + `recipe_events`**
+**From {get_source().label}**
 
 - **Total Views**: `{total_views}`
 - **Times Marked Favorite**: `{favorites}`  
@@ -163,7 +191,7 @@ def compute_recipe_analytics(recipe_name: str, time_window: str):
 - **Cooking Sessions Completed**: `{completes}`  
 - **Completion Rate**: `{completion_rate:.1f}%`  
 - **Favorite / View Rate**: `{fav_rate:.1f}%`
-
+{ordered_funnel_md(df)}{unique_users_md(recipe["id"], days)}{counters_md(recipe["id"])}
 **Recipe Meta (from `recipes/{recipe['id']}`)**
 
 - Difficulty: **{recipe['difficulty']}**
@@ -173,6 +201,8 @@ def compute_recipe_analytics(recipe_name: str, time_window: str):
 """
 
     # Bar chart
+    import plotly.express as px
+
     fig = px.bar(
         counts,
         x="event_type",
@@ -186,6 +216,123 @@ def compute_recipe_analytics(recipe_name: str, time_window: str):
 
     return summary_md, fig, df_preview_str
 
+LEADERBOARD_SORTS = {
+    "Views": "views",
+    "Favorites": "favorites",
+    "Completion Rate": "completion_rate",
+    "Favorite / View Rate": "fav_rate",
+}
+
+def funnel_metrics(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized funnel metrics for a recipe_id x event_type count table
+    (as returned by DataSource.event_counts).
+    """
+    views = counts["view"]
+    starts = counts["start_cook"]
+    out = pd.DataFrame({
+        "views": views,
+        "favorites": counts["favorite"],
+        "starts": starts,
+        "completes": counts["complete_cook"],
+    })
+    out["completion_rate"] = (out["completes"] / starts.where(starts > 0) * 100).fillna(0).round(1)
+    out["fav_rate"] = (out["favorites"] / views.where(views > 0) * 100).fillna(0).round(1)
+    return out
+
+def compute_leaderboard(recipe_names, time_window: str, sort_label: str, top_n: int = 20):
+    """
+    Funnel metrics for every recipe (or the selected ones) in one batched
+    pass: a single event_counts call on the data source, then column math.
+    """
+    days = TIME_WINDOWS.get(time_window, 7)
+    recipes = load_recipes()
+    names_by_id = {r["id"]: r["name"] for r in recipes}
+
+    if recipe_names:
+        ids_by_name = {r["name"]: r["id"] for r in recipes}
+        recipe_ids = [ids_by_name[n] for n in recipe_names if n in ids_by_name]
+    else:
+        recipe_ids = None
+
+    counts = get_source().event_counts(days, recipe_ids)
+    if counts.empty:
+        return (
+            f"No events in the selected window ({time_window}).",
+            None,
+        )
+
+    board = funnel_metrics(counts)
+    sort_col = LEADERBOARD_SORTS.get(sort_label, "views")
+    board = board.sort_values([sort_col, "views"], ascending=False).head(int(top_n))
+    board.insert(0, "recipe", [names_by_id.get(rid, rid) for rid in board.index])
+    board = board.reset_index(drop=True)
+
+    import plotly.express as px
+
+    fig = px.bar(
+        board,
+        x="recipe",
+        y=sort_col,
+        title=f"Top {len(board)} Recipes by {sort_label} ({time_window})",
+    )
+
+    table = board.rename(columns={
+        "completion_rate": "completion_rate_%",
+        "fav_rate": "fav_rate_%",
+    }).to_markdown(index=False)
+    return table, fig
+
+ALL_TIME_KINDS = {"Views": "view", "Likes": "like", "Cook Attempts": "cook_attempt"}
+
+def all_time_top(kind_label: str, top_n: int = 10):
+    """
+    All-time top recipes straight from the Space-Saving summaries: no pass
+    over the events, just a sort of the tracked counters. A streaming
+    source (RECIPE_DATA_SOURCE=cdc) keeps them live; otherwise they are
+    the snapshot saved by `python heavy_hitters.py`.
+    """
+    kind = ALL_TIME_KINDS.get(kind_label, "view")
+    top = get_source().top_recipes(kind, int(top_n))
+    if top is None:
+        heavy_hitters = load_heavy_hitters()
+        if heavy_hitters is None:
+            return f"No top-K summaries at `{HEAVY_HITTERS_PATH}`. Build them with `python heavy_hitters.py`."
+        top = heavy_hitters.top(kind, int(top_n))
+    if top.empty:
+        return f"No {kind_label.lower()} recorded yet."
+
+    names_by_id = {r["id"]: r["name"] for r in load_recipes()}
+    top.insert(0, "recipe", [names_by_id.get(rid, rid) for rid in top.index])
+    return (
+        f"### All-time Top {len(top)} by {kind_label}\n\n"
+        "`count` is an upper bound; the true count is at least `count - error`.\n\n"
+        + top.reset_index(drop=True).to_markdown(index=False)
+    )
+
+def similar_recipes(recipe_name: str, top_n: int = 10):
+    """
+    Item-item recommendations for one recipe from the precomputed index.
+    """
+    recommendations = load_recommendations()
+    if recommendations is None:
+        return f"No similarity index at `{INDEX_PATH}`. Build it with `python recommendations.py`."
+
+    recipe = get_recipe_by_name(recipe_name)
+    if recipe is None:
+        return f"Recipe **{recipe_name}** not found in `recipes` collection."
+
+    neighbors = recommendations.similar(recipe["id"], int(top_n))
+    if not neighbors:
+        return f"No similar recipes for **{recipe_name}** (no shared interactions)."
+
+    names_by_id = {r["id"]: r["name"] for r in load_recipes()}
+    table = pd.DataFrame(
+        [(names_by_id.get(rid, rid), round(score, 3)) for rid, score in neighbors],
+        columns=["recipe", "cosine_similarity"],
+    )
+    return f"### Recipes similar to **{recipe_name}**\n\n" + table.to_markdown(index=False)
+
 # ------------------------------------------------------------------------------
 # Project Overview + Data Flow text (updated to mention collections)
 # ------------------------------------------------------------------------------
@@ -234,6 +381,9 @@ def data_flow_description():
      }
      ```
    - Similar docs for `favorite`, `start_cook`, `complete_cook`.
+   - At high event rates, clients POST events (one or an array) to
+     `ingest_service.py` instead: it validates them, spools them to disk,
+     and writes them to `recipe_events` as batched commits.
 
 2. **Recipe Metadata → Firestore (`recipes`)**
    - Each recipe is a document in **`recipes`**:
@@ -277,51 +427,130 @@ def data_flow_description():
 # Build Gradio UI
 # ------------------------------------------------------------------------------
 
-with gr.Blocks(title="Recipe Analytics Pipeline Demo") as demo:
-    gr.Markdown("# 🍽️ Recipe Analytics Dashboard\nFirebase collections: `recipes` + `recipe_events`")
-
-    with gr.Tab("Project Overview"):
-        gr.Markdown(project_overview())
-        gr.Markdown("Use the other tabs to explore the data flow and live analytics.")
-
-    with gr.Tab("Data Flow"):
-        gr.Markdown(data_flow_description())
-
-    with gr.Tab("Analytics Demo"):
-        if RECIPES:
-            recipe_names = [r["name"] for r in RECIPES]
-            default_recipe = recipe_names[0]
-        else:
-            recipe_names = ["No recipes found"]
-            default_recipe = "No recipes found"
-
-        with gr.Row():
-            with gr.Column(scale=1):
-                recipe_dropdown = gr.Dropdown(
-                    recipe_names,
-                    label="Select Recipe (from `recipes`)",
-                    value=default_recipe,
-                )
-                time_window_dropdown = gr.Dropdown(
-                    ["Last 7 days", "Last 14 days", "Last 30 days"],
-                    label="Time Window",
-                    value="Last 7 days",
-                )
-                run_btn = gr.Button("Run Analytics")
-
-            with gr.Column(scale=2):
-                summary_output = gr.Markdown(label="Summary")
-                chart_output = gr.Plot(label="Event Breakdown")
-                table_output = gr.Markdown(label="Sample Events Preview (latest 10)")
-
-        def on_run(recipe_name, time_window):
-            return compute_recipe_analytics(recipe_name, time_window)
-
-        run_btn.click(
-            fn=on_run,
-            inputs=[recipe_dropdown, time_window_dropdown],
-            outputs=[summary_output, chart_output, table_output],
-        )
+def build_demo():
+    """The Gradio Blocks app (loads the recipe list for the dropdowns)."""
+    import gradio as gr
+
+    recipes = load_recipes()
+
+    with gr.Blocks(title="Recipe Analytics Pipeline Demo") as demo:
+        gr.Markdown("# 🍽️ Recipe Analytics Dashboard\nFirebase collections: `recipes` + `recipe_events`")
+
+        with gr.Tab("Project Overview"):
+            gr.Markdown(project_overview())
+            gr.Markdown("Use the other tabs to explore the data flow and live analytics.")
+
+        with gr.Tab("Data Flow"):
+            gr.Markdown(data_flow_description())
+
+        with gr.Tab("Analytics Demo"):
+            if recipes:
+                recipe_names = [r["name"] for r in recipes]
+                default_recipe = recipe_names[0]
+            else:
+                recipe_names = ["No recipes found"]
+                default_recipe = "No recipes found"
+
+            with gr.Row():
+                with gr.Column(scale=1):
+                    recipe_dropdown = gr.Dropdown(
+                        recipe_names,
+                        label="Select Recipe (from `recipes`)",
+                        value=default_recipe,
+                    )
+                    time_window_dropdown = gr.Dropdown(
+                        ["Last 7 days", "Last 14 days", "Last 30 days"],
+                        label="Time Window",
+                        value="Last 7 days",
+                    )
+                    run_btn = gr.Button("Run Analytics")
+
+                with gr.Column(scale=2):
+                    summary_output = gr.Markdown(label="Summary")
+                    chart_output = gr.Plot(label="Event Breakdown")
+                    table_output = gr.Markdown(label="Sample Events Preview (latest 10)")
+
+            def on_run(recipe_name, time_window):
+                return compute_recipe_analytics(recipe_name, time_window)
+
+            run_btn.click(
+                fn=on_run,
+                inputs=[recipe_dropdown, time_window_dropdown],
+                outputs=[summary_output, chart_output, table_output],
+            )
+
+        with gr.Tab("Leaderboard"):
+            with gr.Row():
+                with gr.Column(scale=1):
+                    compare_dropdown = gr.Dropdown(
+                        recipe_names,
+                        label="Compare Recipes (empty = all)",
+                        multiselect=True,
+                        value=[],
+                    )
+                    board_window_dropdown = gr.Dropdown(
+                        list(TIME_WINDOWS),
+                        label="Time Window",
+                        value="Last 7 days",
+                    )
+                    board_sort_dropdown = gr.Dropdown(
+                        list(LEADERBOARD_SORTS),
+                        label="Rank By",
+                        value="Views",
+                    )
+                    board_top_n = gr.Slider(5, 100, value=20, step=5, label="Show Top N")
+                    board_btn = gr.Button("Build Leaderboard")
+
+                with gr.Column(scale=2):
+                    board_chart = gr.Plot(label="Leaderboard")
+                    board_table = gr.Markdown(label="Funnel Metrics")
+
+            board_btn.click(
+                fn=compute_leaderboard,
+                inputs=[compare_dropdown, board_window_dropdown, board_sort_dropdown, board_top_n],
+                outputs=[board_table, board_chart],
+            )
+
+            with gr.Accordion("All-time Top Recipes (streaming summaries)", open=False):
+                with gr.Row():
+                    all_time_kind = gr.Dropdown(list(ALL_TIME_KINDS), label="Rank By", value="Views")
+                    all_time_n = gr.Slider(1, 50, value=10, step=1, label="Show Top N")
+                    all_time_btn = gr.Button("Show All-time Top")
+                all_time_output = gr.Markdown()
+
+            all_time_btn.click(
+                fn=all_time_top,
+                inputs=[all_time_kind, all_time_n],
+                outputs=all_time_output,
+            )
+
+        with gr.Tab("Similar Recipes"):
+            with gr.Row():
+                with gr.Column(scale=1):
+                    similar_dropdown = gr.Dropdown(
+                        recipe_names,
+                        label="Select Recipe (from `recipes`)",
+                        value=default_recipe,
+                    )
+                    similar_top_n = gr.Slider(1, 20, value=10, step=1, label="Neighbours")
+                    similar_btn = gr.Button("Find Similar Recipes")
+
+                with gr.Column(scale=2):
+                    similar_output = gr.Markdown(label="Similar Recipes")
+
+            similar_btn.click(
+                fn=similar_recipes,
+                inputs=[similar_dropdown, similar_top_n],
+                outputs=[similar_output],
+            )
+
+    return demo
+
+def __getattr__(name):
+    # `demo` for tools that look the app up by that module attribute
+    if name == "demo":
+        return build_demo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    demo.launch()
+    build_demo().launch()
@@ -0,0 +1,240 @@
+import argparse
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import read_table
+
+# -------------------------------------------------------------------
+# Per-recipe correlation statistics
+#
+# recipes + ingredients + interactions -> feature matrix X (n_recipes x p)
+#   -> Pearson and Spearman matrices from one set of weighted sums
+#   -> bootstrap CIs: each resample is a vector of row counts (bincount
+#      of random row indexes), so a resample is one more weighted-sum
+#      pass instead of a copy of X. Batches of resamples run in a process
+#      pool; every batch has its own seed, so results don't depend on the
+#      number of workers. Workers are spawned, not forked: the pipeline
+#      runs this while other stages' threads are alive, and forking a
+#      multithreaded process can copy a lock some other thread holds.
+#
+# Missing values (e.g. avgRating of an unrated recipe) are NaN and each
+# pair of features uses the rows where both are present. Spearman ranks
+# are taken over each column's present values.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+DIFFICULTY_LEVELS = {"easy": 1, "medium": 2, "hard": 3}
+INTERACTION_FEATURES = {"view": "views", "like": "likes", "cook_attempt": "cookAttempts"}
+FEATURES = [
+    "prepTimeMinutes", "cookTimeMinutes", "servings", "difficulty",
+    "ingredientCount", "avgRating", "views", "likes", "cookAttempts",
+]
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_BATCH = 50
+DEFAULT_CONFIDENCE = 0.95
+# rows per block of the weighted sums (keeps the temporaries in cache)
+CHUNK_ROWS = 65536
+# rows x resamples below which the bootstrap runs inline: spawning the
+# pool costs about a second, as much as ~1.5M row-resamples of work
+POOL_MIN_WORK = 2_000_000
+
+
+def feature_matrix(recipes, ingredients, interactions, weights=None):
+    """
+    (X, recipe_ids) with X[:, j] = FEATURES[j] per recipe, NaN where
+    unknown. `weights` counts each interaction row that many times (the
+    sample weights of a stratified sample).
+    """
+    recipe_ids = recipes["recipeId"].to_numpy()
+    n = len(recipe_ids)
+    pos = pd.Index(recipe_ids)
+
+    X = np.full((n, len(FEATURES)), np.nan)
+    X[:, 0] = pd.to_numeric(recipes["prepTimeMinutes"], errors="coerce")
+    X[:, 1] = pd.to_numeric(recipes["cookTimeMinutes"], errors="coerce")
+    X[:, 2] = pd.to_numeric(recipes["servings"], errors="coerce")
+    X[:, 3] = recipes["difficulty"].astype(str).str.lower().map(DIFFICULTY_LEVELS).to_numpy(float)
+
+    codes = pos.get_indexer(ingredients["recipeId"])
+    X[:, 4] = np.bincount(codes[codes >= 0], minlength=n)
+
+    codes = pos.get_indexer(interactions["recipeId"])
+    known = codes >= 0
+    kinds = interactions["type"].to_numpy()
+    w = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=float)
+    rating = pd.to_numeric(interactions["rating"], errors="coerce").to_numpy()
+    rated = known & (kinds == "rating") & ~np.isnan(rating)
+    n_ratings = np.bincount(codes[rated], weights=w[rated], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        X[:, 5] = np.bincount(codes[rated], weights=(w * rating)[rated], minlength=n) / n_ratings
+    for j, kind in enumerate(INTERACTION_FEATURES, start=6):
+        sel = known & (kinds == kind)
+        # a stratum's weights add up to its size, up to float rounding
+        X[:, j] = np.rint(np.bincount(codes[sel], weights=w[sel], minlength=n))
+    return X, recipe_ids
+
+
+def rank_groups(X):
+    """
+    Per column: the rows where it is present and their dense tie-group
+    ids, plus the number of groups. Ranks under any row weighting follow
+    from these without sorting again.
+    """
+    groups = []
+    for j in range(X.shape[1]):
+        rows = np.flatnonzero(~np.isnan(X[:, j]))
+        uniques, inverse = np.unique(X[rows, j], return_inverse=True)
+        groups.append((rows, inverse, len(uniques)))
+    return groups
+
+
+def weighted_ranks(groups, w):
+    """Average (tie-aware) ranks of each column when row i appears w[i] times."""
+    R = np.full((len(w), len(groups)), np.nan)
+    for j, (rows, g, k) in enumerate(groups):
+        gw = np.bincount(g, weights=w[rows], minlength=k)
+        below = np.cumsum(gw) - gw
+        R[rows, j] = (below + (gw + 1) / 2)[g]
+    return R
+
+
+def weighted_corr(X, w, chunk=CHUNK_ROWS):
+    """
+    Pairwise-complete Pearson matrix of the columns of X with row weights
+    w. Every sum it needs comes out of one [x, x^2, present] x [present, x]
+    product, accumulated over row chunks.
+    """
+    p = X.shape[1]
+    sums = np.zeros((3 * p, 2 * p))
+    for start in range(0, len(X), chunk):
+        x = X[start:start + chunk]
+        m = ~np.isnan(x)
+        x0 = np.where(m, x, 0.0)
+        mf = m.astype(float)
+        wc = w[start:start + chunk, None]
+        sums += np.hstack([x0 * wc, x0 * x0 * wc, mf * wc]).T @ np.hstack([mf, x0])
+    sx = sums[:p, :p]           # sum of x_i over rows where x_j is present
+    sxx = sums[p:2 * p, :p]     # sum of x_i^2 over the same rows
+    cnt = sums[2 * p:, :p]      # weighted count of rows with both present
+    sxy = sums[:p, p:]          # sum of x_i * x_j
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / cnt
+        var_i = sxx - sx ** 2 / cnt
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr[cnt < 3] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlations(X, w=None, groups=None):
+    """(pearson, spearman) matrices; w defaults to every row once."""
+    w = np.ones(len(X)) if w is None else w
+    if groups is None:
+        groups = rank_groups(X)
+    R = weighted_ranks(groups, w)
+    # about a third of a bootstrap resample's rows have weight 0
+    drawn = np.flatnonzero(w)
+    if len(drawn) < len(w):
+        X, R, w = X[drawn], R[drawn], w[drawn]
+    return weighted_corr(X, w), weighted_corr(R, w)
+
+# -------------------------------------------------------------------
+# BOOTSTRAP
+# -------------------------------------------------------------------
+_worker_state = {}
+
+
+def _init_worker(X, groups):
+    _worker_state["X"] = X
+    _worker_state["groups"] = groups
+
+
+def _bootstrap_batch(seed, size):
+    """(size, 2, p, p) resampled Pearson/Spearman matrices for one batch."""
+    X, groups = _worker_state["X"], _worker_state["groups"]
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    out = np.empty((size, 2) + (X.shape[1],) * 2)
+    for b in range(size):
+        w = np.bincount(rng.integers(0, n, n), minlength=n).astype(float)
+        out[b] = correlations(X, w, groups)
+    return out
+
+
+def bootstrap(X, n_boot=DEFAULT_BOOTSTRAP, batch_size=DEFAULT_BATCH, workers=None, seed=0):
+    """
+    (n_boot, 2, p, p) bootstrap replicates of (pearson, spearman).
+    workers=None uses every CPU once the work is worth a process pool.
+    """
+    groups = rank_groups(X)
+    sizes = [min(batch_size, n_boot - start) for start in range(0, n_boot, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers is None:
+        workers = os.cpu_count() if len(X) * n_boot >= POOL_MIN_WORK else 1
+    workers = min(workers, len(sizes))
+    if workers <= 1:
+        _init_worker(X, groups)
+        return np.concatenate([_bootstrap_batch(s, k) for s, k in zip(seeds, sizes)])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(X, groups)) as pool:
+        return np.concatenate(list(pool.map(_bootstrap_batch, seeds, sizes)))
+
+
+def correlation_report(X, n_boot=DEFAULT_BOOTSTRAP, confidence=DEFAULT_CONFIDENCE,
+                       batch_size=DEFAULT_BATCH, workers=None, seed=0) -> pd.DataFrame:
+    """
+    One row per feature pair and method: r, percentile bootstrap interval
+    and the number of rows behind it.
+    """
+    pearson, spearman = correlations(X)
+    reps = bootstrap(X, n_boot, batch_size, workers, seed)
+    alpha = (1 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        low, high = np.nanquantile(reps, [alpha, 1 - alpha], axis=0)
+    present = ~np.isnan(X)
+    n_pairs = present.T.astype(int) @ present.astype(int)
+
+    rows = []
+    i, j = np.triu_indices(X.shape[1], k=1)
+    for m, (method, r) in enumerate((("pearson", pearson), ("spearman", spearman))):
+        rows.append(pd.DataFrame({
+            "feature_a": np.array(FEATURES)[i], "feature_b": np.array(FEATURES)[j],
+            "method": method, "r": r[i, j], "ci_low": low[m][i, j], "ci_high": high[m][i, j],
+            "n": n_pairs[i, j],
+        }))
+    return pd.concat(rows, ignore_index=True)
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correlation matrices with bootstrap CIs over recipe features.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--n-boot", type=int, default=DEFAULT_BOOTSTRAP)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--out", default=None, help="write the pairwise report as CSV")
+    args = parser.parse_args()
+
+    X, _ = feature_matrix(
+        read_table(args.data_dir, "recipe"),
+        read_table(args.data_dir, "ingredients"),
+        read_table(args.data_dir, "interactions", usecols=["recipeId", "type", "rating"]),
+    )
+    pearson, spearman = correlations(X)
+    pd.set_option("display.width", 160)
+    print("\nPearson:")
+    print(pd.DataFrame(pearson, index=FEATURES, columns=FEATURES).round(3))
+    print("\nSpearman:")
+    print(pd.DataFrame(spearman, index=FEATURES, columns=FEATURES).round(3))
+
+    report = correlation_report(X, args.n_boot, args.confidence, args.batch_size, args.workers, args.seed)
+    if args.out:
+        report.to_csv(args.out, index=False)
+    print(f"\nCorrelations with likes ({args.confidence:.0%} bootstrap CI, {args.n_boot} resamples):")
+    print(report[(report["feature_b"] == "likes") | (report["feature_a"] == "likes")].round(3).to_string(index=False))
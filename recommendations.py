@@ -0,0 +1,212 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from compressed_io import read_table
+
+# -------------------------------------------------------------------
+# Item-item recipe similarity
+#
+# interactions.csv -> weighted user x recipe matrix R (CSR)
+#                  -> column-normalized Rn
+#                  -> cosine S = Rn.T @ Rn, computed one block of recipes
+#                     at a time so only block_size x n_recipes is ever held
+#                  -> top-K neighbours per recipe, stored as dense
+#                     (n_recipes, K) arrays for O(1) lookups
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+INDEX_PATH = os.path.join(DATA_DIR, ".recommendations", "recipe_neighbors.npz")
+
+# How much one interaction says about a user's taste. Ratings use the
+# rating itself (1-5) as the weight.
+INTERACTION_WEIGHTS = {
+    "view": 1.0,
+    "like": 3.0,
+    "cook_attempt": 4.0,
+}
+DEFAULT_K = 20
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def build_user_recipe_matrix(interactions: pd.DataFrame):
+    """
+    Returns (R, user_ids, recipe_ids) where R[u, r] is the summed,
+    log-damped interaction weight of user u on recipe r.
+    """
+    weights = interactions["type"].map(INTERACTION_WEIGHTS)
+    is_rating = interactions["type"] == "rating"
+    weights = weights.where(~is_rating, interactions["rating"])
+    keep = weights.notna() & interactions["userId"].notna() & interactions["recipeId"].notna()
+
+    user_codes, user_ids = pd.factorize(interactions.loc[keep, "userId"])
+    recipe_codes, recipe_ids = pd.factorize(interactions.loc[keep, "recipeId"], sort=True)
+
+    R = sparse.csr_matrix(
+        (weights[keep].to_numpy(dtype=np.float32), (user_codes, recipe_codes)),
+        shape=(len(user_ids), len(recipe_ids)),
+    )
+    R.sum_duplicates()
+    # ten views should not outweigh one cook attempt tenfold
+    np.log1p(R.data, out=R.data)
+    return R, pd.Index(user_ids), pd.Index(recipe_ids)
+
+
+def _topk_rows(block, k, row_offset):
+    """
+    Top-k entries of every row of a CSR block, excluding the diagonal.
+    Fully vectorized: one lexsort over (row, -score).
+    """
+    block = block.tocoo()
+    rows, cols, vals = block.row, block.col, block.data
+    not_self = cols != rows + row_offset
+    rows, cols, vals = rows[not_self], cols[not_self], vals[not_self]
+
+    n_rows = block.shape[0]
+    neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+    if len(vals) == 0:
+        return neighbors, scores
+
+    order = np.lexsort((-vals, rows))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    rank = np.arange(len(rows)) - starts[rows]
+    take = rank < k
+    neighbors[rows[take], rank[take]] = cols[take]
+    scores[rows[take], rank[take]] = vals[take]
+    return neighbors, scores
+
+
+def item_similarity_topk(R, k=DEFAULT_K, block_size=DEFAULT_BLOCK_SIZE, workers=None):
+    """
+    Top-k cosine neighbours for every column (recipe) of R.
+
+    Memory is bounded by one block_size x n_recipes sparse product per
+    worker. Blocks run on a thread pool; scipy's sparse matmul runs in C
+    without the GIL, so the blocks use multiple cores.
+    """
+    R = sparse.csc_matrix(R, dtype=np.float32)
+    norms = np.sqrt(np.asarray(R.multiply(R).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    Rn = (R @ sparse.diags(1.0 / norms)).tocsc()
+    Rt = Rn.T.tocsr()
+    n_items = R.shape[1]
+
+    def run_block(start):
+        stop = min(start + block_size, n_items)
+        sims = Rt[start:stop] @ Rn
+        return start, _topk_rows(sims, k, start)
+
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for start, (nb, sc) in pool.map(run_block, range(0, n_items, block_size)):
+            neighbors[start:start + len(nb)] = nb
+            scores[start:start + len(sc)] = sc
+    return neighbors, scores
+
+# -------------------------------------------------------------------
+# INDEX
+# -------------------------------------------------------------------
+class RecommendationIndex:
+    """
+    Precomputed neighbour lists plus each user's interaction row, loaded
+    from one .npz file. Lookups are a dict hit and an array slice.
+    """
+
+    def __init__(self, recipe_ids, neighbors, scores, user_ids=None, user_matrix=None):
+        self.recipe_ids = np.asarray(recipe_ids, dtype=object)
+        self.recipe_pos = {rid: i for i, rid in enumerate(self.recipe_ids)}
+        self.neighbors = neighbors
+        self.scores = scores
+        self.user_ids = None if user_ids is None else np.asarray(user_ids, dtype=object)
+        self.user_pos = {} if user_ids is None else {u: i for i, u in enumerate(self.user_ids)}
+        self.user_matrix = user_matrix
+
+    def similar(self, recipe_id, n=10):
+        """[(recipe_id, cosine), ...] for the n most similar recipes."""
+        i = self.recipe_pos.get(recipe_id)
+        if i is None:
+            return []
+        nb, sc = self.neighbors[i, :n], self.scores[i, :n]
+        valid = nb >= 0
+        return list(zip(self.recipe_ids[nb[valid]], sc[valid].tolist()))
+
+    def recommend(self, user_id, n=10):
+        """
+        Recipes the user has not interacted with, scored by the summed
+        similarity to the recipes they have, weighted by their interaction
+        strength.
+        """
+        u = self.user_pos.get(user_id)
+        if u is None or self.user_matrix is None:
+            return []
+        row = self.user_matrix[u]
+        seen, weights = row.indices, row.data
+
+        cand = self.neighbors[seen].ravel()
+        cand_scores = (self.scores[seen] * weights[:, None]).ravel()
+        valid = (cand >= 0) & ~np.isin(cand, seen)
+        if not valid.any():
+            return []
+        totals = np.bincount(cand[valid], weights=cand_scores[valid], minlength=len(self.recipe_ids))
+        top = np.argsort(-totals, kind="stable")[:n]
+        top = top[totals[top] > 0]
+        return list(zip(self.recipe_ids[top], totals[top].tolist()))
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        extra = {}
+        if self.user_matrix is not None:
+            m = self.user_matrix
+            extra = {
+                "user_ids": self.user_ids.astype(str),
+                "user_indptr": m.indptr, "user_indices": m.indices, "user_data": m.data,
+            }
+        np.savez(
+            path,
+            recipe_ids=self.recipe_ids.astype(str),
+            neighbors=self.neighbors,
+            scores=self.scores,
+            **extra,
+        )
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path, allow_pickle=False) as z:
+            user_ids = user_matrix = None
+            if "user_ids" in z:
+                user_ids = z["user_ids"]
+                user_matrix = sparse.csr_matrix(
+                    (z["user_data"], z["user_indices"], z["user_indptr"]),
+                    shape=(len(user_ids), len(z["recipe_ids"])),
+                )
+            return cls(z["recipe_ids"], z["neighbors"], z["scores"], user_ids, user_matrix)
+
+
+def build_index(interactions, k=DEFAULT_K, block_size=DEFAULT_BLOCK_SIZE, workers=None):
+    R, user_ids, recipe_ids = build_user_recipe_matrix(interactions)
+    neighbors, scores = item_similarity_topk(R, k, block_size, workers)
+    return RecommendationIndex(recipe_ids, neighbors, scores, user_ids, R.tocsr())
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the recipe similarity index from interactions.csv.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out", default=INDEX_PATH)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    interactions = read_table(args.data_dir, "interactions")
+    index = build_index(interactions, args.k, args.block_size, args.workers)
+    index.save(args.out)
+    print(f" Indexed {len(index.recipe_ids)} recipes (top {args.k} neighbours) -> {args.out}")
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from compressed_io import find_table
+
+# -------------------------------------------------------------------
+# Stratified interaction samples for preview runs
+#
+# Strata are (recipeId, type). A first pass reads only those two columns
+# to get every stratum size N_h; each stratum keeps
+# n_h = max(1, round(fraction * N_h)) rows chosen by a seeded random key,
+# and a second pass parses only the kept rows. Each kept row carries
+# weight N_h / n_h, so weighted counts per (recipe, type) equal the full
+# counts exactly; per-row values such as ratings are estimated from the
+# stratum's sample with a finite-population-corrected standard error and
+# a Student t bound (most strata keep only a handful of rows).
+# -------------------------------------------------------------------
+
+STRATA = ["recipeId", "type"]
+WEIGHT_COLUMN = "sampleWeight"
+CONFIDENCE = 0.95
+
+
+def stratified_positions(strata: pd.DataFrame, fraction, seed=0):
+    """(positions, weights): sampled row positions (sorted) and their N_h / n_h weights."""
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Sample fraction must be in (0, 1], got {fraction}")
+    codes = strata.groupby(list(strata.columns), sort=False, dropna=False).ngroup().to_numpy()
+    sizes = np.bincount(codes)
+    quota = np.maximum(1, np.rint(fraction * sizes)).astype(np.int64)
+
+    # rank rows inside their stratum by a random key; keep the first n_h
+    keys = np.random.default_rng(seed).random(len(codes))
+    # codes are small integers, so code + key in [0, 1) sorts by both at once
+    order = np.argsort(codes + keys)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(len(order)) - starts[codes[order]]
+    chosen = np.sort(order[rank < quota[codes[order]]])
+    return chosen, (sizes / quota)[codes[chosen]]
+
+
+def sample_frame(frame: pd.DataFrame, fraction, seed=0) -> pd.DataFrame:
+    """Stratified sample of an in-memory interactions frame, with a weight column."""
+    positions, weights = stratified_positions(frame[STRATA], fraction, seed)
+    out = frame.iloc[positions].reset_index(drop=True)
+    out[WEIGHT_COLUMN] = weights
+    return out
+
+
+def read_sample(data_dir, name, fraction, seed=0) -> pd.DataFrame:
+    """Stratified sample of a table on disk, parsing only the sampled rows in full."""
+    path = find_table(data_dir, name)
+    strata = pd.read_csv(path, usecols=STRATA)
+    positions, weights = stratified_positions(strata, fraction, seed)
+    # skiprows counts the header as line 0
+    skip = np.ones(len(strata) + 1, dtype=bool)
+    skip[0] = False
+    skip[positions + 1] = False
+    out = pd.read_csv(path, skiprows=np.flatnonzero(skip))
+    out[WEIGHT_COLUMN] = weights
+    return out
+
+
+def weighted_counts(frame: pd.DataFrame, by) -> pd.Series:
+    """Estimated row counts per group (sum of sample weights)."""
+    return frame.groupby(by)[WEIGHT_COLUMN].sum()
+
+
+def stratum_mean(frame: pd.DataFrame, value, by="recipeId") -> pd.DataFrame:
+    """
+    Mean of `value` per group from a sample where each group is one
+    stratum: columns estimate, error (half-width of the CONFIDENCE
+    interval, NaN from a single row) and n.
+    """
+    rows = frame[frame[value].notna()]
+    grouped = rows.groupby(by)
+    out = pd.DataFrame({
+        "estimate": grouped[value].mean(),
+        "n": grouped[value].size(),
+        # N_h / n_h * n_h = N_h, the stratum size
+        "N": grouped[WEIGHT_COLUMN].sum().round(),
+    })
+    fpc = (1 - out["n"] / out["N"]).clip(lower=0)
+    from scipy import stats
+
+    t = stats.t.ppf((1 + CONFIDENCE) / 2, out["n"] - 1)
+    out["error"] = t * np.sqrt(fpc * grouped[value].var() / out["n"])
+    return out.drop(columns="N")
@@ -1,8 +1,10 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 from datetime import datetime, timedelta
+import os
 import random
 
+from firestore_client import resilient
+from instrumentation import instrumented
+
 # -------------------------------------------------------------------
 # CONFIG
 # -------------------------------------------------------------------
@@ -13,6 +15,14 @@ SERVICE_ACCOUNT_PATH = r"serviceAccountKey.json"
 # INIT FIRESTORE
 # -------------------------------------------------------------------
 def init_firestore():
+    # Local emulator (FIRESTORE_EMULATOR_HOST=localhost:8080) needs no credentials
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        return gcloud_firestore.Client(project=PROJECT_ID)
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not firebase_admin._apps:
         cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
         firebase_admin.initialize_app(cred, {"projectId": PROJECT_ID})
@@ -21,6 +31,7 @@ def init_firestore():
 # -------------------------------------------------------------------
 # SEED USERS
 # -------------------------------------------------------------------
+@instrumented("seed.users")
 def seed_users(db):
     now = datetime.utcnow()
 
@@ -67,10 +78,12 @@ def seed_users(db):
         },
     ]
 
-    for user in users:
-        db.collection("users").document(user["userId"]).set(user)
+    client = resilient(db)
+    users_ref = client.collection("users")
+    client.map(lambda user: users_ref.document(user["userId"]).set(user), users)
 
     print(f" Seeded {len(users)} users.")
+    return len(users)
 
 # -------------------------------------------------------------------
 # SEED RECIPES (YOUR RECIPE + SYNTHETIC)
@@ -201,6 +214,7 @@ def create_synthetic_recipe(recipe_id_suffix, title, cuisine, category, difficul
         "isPublic": True,
     }
 
+@instrumented("seed.recipes")
 def seed_recipes(db):
     now = datetime.utcnow()
 
@@ -241,24 +255,28 @@ def seed_recipes(db):
             )
         )
 
-    for recipe in recipes:
-        db.collection("recipes").document(recipe["recipeId"]).set(recipe)
+    client = resilient(db)
+    recipes_ref = client.collection("recipes")
+    client.map(lambda recipe: recipes_ref.document(recipe["recipeId"]).set(recipe), recipes)
 
     print(f" Seeded {len(recipes)} recipes.")
+    return len(recipes)
 
 # -------------------------------------------------------------------
 # SEED INTERACTIONS
 # -------------------------------------------------------------------
+@instrumented("seed.interactions")
 def seed_interactions(db):
     now = datetime.utcnow()
 
     user_ids = ["user_adi", "user_chef_1", "user_chef_2", "user_taster_1", "user_taster_2"]
     interaction_types = ["view", "like", "cook_attempt", "rating"]
 
-    recipes_stream = db.collection("recipes").stream()
-    recipe_ids = [r.id for r in recipes_stream]
+    client = resilient(db)
+    interactions_ref = client.collection("interactions")
+    recipe_ids = [r.id for r in client.stream(client.collection("recipes"))]
 
-    count = 0
+    docs = []
     for recipe_id in recipe_ids:
         for user_id in user_ids:
             for _ in range(random.randint(1, 4)):
@@ -285,19 +303,22 @@ def seed_interactions(db):
                         ""
                     ])
 
-                doc_ref = db.collection("interactions").document()
-                data["interactionId"] = doc_ref.id
-                doc_ref.set(data)
-                count += 1
+                # the id is fixed before the write, so a retried set is idempotent
+                data["interactionId"] = interactions_ref.document().id
+                docs.append(data)
+
+    client.map(lambda data: interactions_ref.document(data["interactionId"]).set(data), docs)
 
-    print(f" Seeded {count} interactions.")
+    print(f" Seeded {len(docs)} interactions.")
+    return len(docs)
 
 # -------------------------------------------------------------------
 # MAIN
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    db = init_firestore()
+    db = resilient(init_firestore())
     seed_users(db)
     seed_recipes(db)
     seed_interactions(db)
+    print(f" Firestore: {db.stats_line()}")
     print(" Seeding complete.")
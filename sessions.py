@@ -0,0 +1,173 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import read_table
+
+# -------------------------------------------------------------------
+# Sessions and ordered per-user funnels
+#
+# Interactions are sorted once by (user, timestamp). A new session starts
+# where the user changes or the gap to the previous event exceeds
+# SESSION_GAP (diff + cumsum, no per-user loop).
+#
+# A journey is one (user, recipe) pair, or one (session, recipe) pair
+# with scope="session". Its funnel steps must happen in order: a like
+# only counts if it is at or after the journey's first view, a
+# cook_attempt only after that like, and so on. Each step is a masked
+# scatter-min of timestamps over the journey ids, so the whole funnel is
+# len(steps) vectorized passes over the events.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+FUNNEL_STEPS = ("view", "like", "cook_attempt", "rating")
+SESSION_GAP = pd.Timedelta(minutes=30)
+NEVER = np.iinfo(np.int64).max
+
+
+def sessionize(user_codes, ts_ns, gap=SESSION_GAP):
+    """
+    (order, session) where `order` sorts the events by (user, time) and
+    session[i] is the session number of event order[i].
+    """
+    order = np.lexsort((ts_ns, user_codes))
+    users, ts = user_codes[order], ts_ns[order]
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = (users[1:] != users[:-1]) | (np.diff(ts) > gap.value)
+    return order, np.cumsum(new) - 1
+
+
+def session_summary(user_codes, ts_ns, gap=SESSION_GAP) -> dict:
+    order, session = sessionize(user_codes, ts_ns, gap)
+    if not len(order):
+        return {"sessions": 0}
+    ts = ts_ns[order]
+    starts = np.flatnonzero(np.r_[True, session[1:] != session[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    duration_min = (ts[ends] - ts[starts]) / 60e9
+    return {
+        "sessions": len(starts),
+        "users": int(len(np.unique(user_codes))),
+        "median_events_per_session": float(np.median(ends - starts + 1)),
+        "median_session_minutes": float(np.median(duration_min)),
+        "p90_session_minutes": float(np.quantile(duration_min, 0.9)),
+    }
+
+
+def build_journeys(user_ids, recipe_ids, event_types, timestamps,
+                   steps=FUNNEL_STEPS, scope="user", gap=SESSION_GAP) -> pd.DataFrame:
+    """
+    One row per journey: recipeId plus the time each step was reached in
+    order (NaT if it never was). Journeys that never reach steps[0] are
+    dropped.
+    """
+    user_codes, _ = pd.factorize(np.asarray(user_ids, dtype=object))
+    recipe_codes, recipe_uniques = pd.factorize(np.asarray(recipe_ids, dtype=object))
+    step = pd.Categorical(np.asarray(event_types, dtype=object), categories=list(steps)).codes
+    ts_ns = pd.to_datetime(pd.Series(timestamps), utc=True, format="ISO8601", errors="coerce").to_numpy(
+        dtype="datetime64[ns]").view(np.int64)
+
+    keep = (step >= 0) & (ts_ns != np.iinfo(np.int64).min)
+    user_codes, recipe_codes, step, ts_ns = user_codes[keep], recipe_codes[keep], step[keep], ts_ns[keep]
+
+    if scope == "session":
+        order, session = sessionize(user_codes, ts_ns, gap)
+        owner = np.empty(len(order), dtype=np.int64)
+        owner[order] = session
+    elif scope == "user":
+        owner = user_codes.astype(np.int64)
+    else:
+        raise ValueError(f"Unknown scope: {scope} (choose from user, session)")
+
+    journey, _ = pd.factorize(owner * max(len(recipe_uniques), 1) + recipe_codes)
+    n_journeys = journey.max(initial=-1) + 1
+    journey_recipe = np.zeros(n_journeys, dtype=np.int64)
+    journey_recipe[journey] = recipe_codes
+
+    reached = np.full((n_journeys, len(steps)), NEVER, dtype=np.int64)
+    for k in range(len(steps)):
+        sel = step == k
+        if k:
+            sel &= ts_ns >= reached[journey, k - 1]
+        np.minimum.at(reached[:, k], journey[sel], ts_ns[sel])
+
+    entered = reached[:, 0] != NEVER
+    out = pd.DataFrame({"recipeId": recipe_uniques[journey_recipe[entered]]})
+    for k, name in enumerate(steps):
+        col = reached[entered, k]
+        # int64 minimum is NaT
+        col[col == NEVER] = np.iinfo(np.int64).min
+        out[name] = pd.to_datetime(col.view("datetime64[ns]"), utc=True)
+    return out
+
+
+def recipe_funnel(journeys: pd.DataFrame, steps=FUNNEL_STEPS) -> pd.DataFrame:
+    """
+    Per recipe: journeys reaching each step, and the conversion from the
+    previous step (e.g. like_rate = liked after viewing / viewed).
+    """
+    reached = journeys[list(steps)].notna()
+    reached["recipeId"] = journeys["recipeId"].to_numpy()
+    out = reached.groupby("recipeId").sum()
+    for prev, name in zip(steps, steps[1:]):
+        out[f"{name}_rate"] = (out[name] / out[prev].where(out[prev] > 0)).fillna(0).round(3)
+    return out.sort_values(steps[0], ascending=False, kind="stable")
+
+
+def time_to_convert(journeys: pd.DataFrame, steps=FUNNEL_STEPS, quantiles=(0.5, 0.9)) -> pd.DataFrame:
+    """
+    Per recipe and transition (e.g. "view->like"): converting journeys and
+    quantiles of the minutes between the two steps.
+    """
+    frames = []
+    for prev, name in zip(steps, steps[1:]):
+        minutes = (journeys[name] - journeys[prev]).dt.total_seconds() / 60
+        frame = pd.DataFrame({"recipeId": journeys["recipeId"], "minutes": minutes}).dropna()
+        grouped = frame.groupby("recipeId")["minutes"]
+        # reindex: a transition nobody made unstacks to no columns at all
+        stats = grouped.quantile(list(quantiles)).unstack().reindex(columns=list(quantiles))
+        stats.columns = [f"p{int(q * 100)}_minutes" for q in quantiles]
+        stats.insert(0, "conversions", grouped.size())
+        stats.insert(0, "transition", f"{prev}->{name}")
+        frames.append(stats)
+    return pd.concat(frames).reset_index().set_index(["recipeId", "transition"]).sort_index()
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sessionize interactions and compute ordered per-user funnels.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--scope", default="user", choices=["user", "session"],
+                        help="funnel over a user's whole history with a recipe, or within one session")
+    parser.add_argument("--gap-minutes", type=float, default=SESSION_GAP.total_seconds() / 60)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=None, help="write the per-recipe funnel as CSV")
+    args = parser.parse_args()
+
+    gap = pd.Timedelta(minutes=args.gap_minutes)
+    interactions = read_table(args.data_dir, "interactions", usecols=["userId", "recipeId", "type", "createdAt"])
+    journeys = build_journeys(interactions["userId"], interactions["recipeId"], interactions["type"],
+                              interactions["createdAt"], scope=args.scope, gap=gap)
+    funnel = recipe_funnel(journeys)
+    if args.out:
+        funnel.to_csv(args.out)
+
+    user_codes, _ = pd.factorize(interactions["userId"])
+    ts_ns = pd.to_datetime(interactions["createdAt"], utc=True, format="ISO8601").astype("int64").to_numpy()
+    print(f"\nSessions (gap {args.gap_minutes:g} min): {session_summary(user_codes, ts_ns, gap)}")
+
+    totals = funnel[list(FUNNEL_STEPS)].sum()
+    print(f"\nOrdered funnel ({args.scope} scope), all recipes:")
+    for prev, name in zip((None,) + FUNNEL_STEPS, FUNNEL_STEPS):
+        rate = f" ({totals[name] / totals[prev]:.1%} of {prev})" if prev and totals[prev] else ""
+        print(f"  {name:<13} {totals[name]:>10,}{rate}")
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+    print(f"\nTop {args.top} recipes by {FUNNEL_STEPS[0]} journeys:")
+    print(funnel.head(args.top))
+    print("\nTime to convert (minutes), same recipes:")
+    ttc = time_to_convert(journeys)
+    print(ttc[ttc.index.get_level_values("recipeId").isin(funnel.index[:args.top])].round(1))
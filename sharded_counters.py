@@ -0,0 +1,199 @@
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from firestore_client import FaultyFirestore, ResilientClient, resilient
+
+# -------------------------------------------------------------------
+# Sharded write-time counters per recipe and event type
+#
+#   recipe_counters/{recipeId}:{eventType}/shards/{0..N-1}   {"count": n}
+#
+# Firestore sustains only about one write per second on a single
+# document, so one counter document per hot recipe would throttle. Each
+# increment instead goes to a random one of N shard documents as an
+# atomic Increment (set with merge=True, which also creates the shard on
+# first use), so a counter takes about N writes per second. A read
+# streams the counter's shards subcollection and sums them. That is one
+# query per counter no matter how many events it counts, and it picks up
+# every shard ever written, so N can change between runs.
+#
+# Increments are not idempotent. A write that fails after it was applied
+# (DEADLINE_EXCEEDED) is not retried, and the failure is reported to the
+# caller. A writer that needs retries has to make its batch fail when
+# it was already applied: ingest_service create()s the event documents
+# in the same batch as their increments, so a repeated commit fails with
+# ALREADY_EXISTS instead of counting twice. The raw events stay the
+# source of truth, and the counters are for cheap reads.
+# -------------------------------------------------------------------
+
+COLLECTION = "recipe_counters"
+DEFAULT_SHARDS = 10
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def increment(n):
+    # imported on use: the Firestore client library is slow to import
+    from google.cloud.firestore import Increment
+
+    return Increment(n)
+
+
+class ShardedCounters:
+    def __init__(self, db, num_shards=DEFAULT_SHARDS, collection=COLLECTION, seed=None):
+        self.db = resilient(db)
+        self.num_shards = num_shards
+        self.collection = collection
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @staticmethod
+    def counter_id(recipe_id, event_type):
+        return f"{recipe_id}:{event_type}"
+
+    def shards(self, recipe_id, event_type):
+        return (self.db.collection(self.collection)
+                .document(self.counter_id(recipe_id, event_type)).collection("shards"))
+
+    def _random_shard(self, recipe_id, event_type):
+        with self._rng_lock:
+            shard = self._rng.randrange(self.num_shards)
+        return self.shards(recipe_id, event_type).document(str(shard))
+
+    # ---------------------------------------------------------------
+    # writes
+    # ---------------------------------------------------------------
+    def increment(self, recipe_id, event_type, amount=1):
+        """Adds `amount` to one random shard (one RPC, not retried once applied)."""
+        ref = self._random_shard(recipe_id, event_type)
+        self.db.call(ref.set, {"count": increment(amount)}, merge=True, idempotent=False)
+
+    def add_to_batch(self, batch, counts):
+        """
+        Queues one Increment per counter in an existing write batch, so
+        the counts commit atomically with whatever else the batch holds.
+        counts: {(recipe_id, event_type): n}.
+        """
+        for (recipe_id, event_type), n in counts.items():
+            batch.set(self._random_shard(recipe_id, event_type), {"count": increment(int(n))}, merge=True)
+
+    def add(self, counts):
+        """Applies {(recipe_id, event_type): n} in batched commits."""
+        items = list(counts.items())
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            self.add_to_batch(batch, dict(items[start:start + FIRESTORE_BATCH_LIMIT]))
+            self.db.commit(batch, idempotent=False)
+
+    # ---------------------------------------------------------------
+    # reads
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _total(docs):
+        return sum(int((doc.to_dict() or {}).get("count", 0)) for doc in docs)
+
+    def get(self, recipe_id, event_type):
+        return self._total(self.db.stream(self.shards(recipe_id, event_type)))
+
+    def get_many(self, recipe_ids, event_types) -> pd.DataFrame:
+        """recipe_id x event_type totals; the counters are read in parallel."""
+        recipe_ids, event_types = list(recipe_ids), list(event_types)
+        keys = [(r, t) for r in recipe_ids for t in event_types]
+        # map() runs each read under the client's retries and limiter
+        values = self.db.map(lambda key: self._total(list(self.shards(*key).stream())), keys)
+        return pd.DataFrame(np.array(values, dtype=np.int64).reshape(len(recipe_ids), len(event_types)),
+                            index=pd.Index(recipe_ids, name="recipe_id"), columns=event_types)
+
+
+def count_events(events, recipe_field, type_field):
+    """{(recipe_id, event_type): n} for a list of event dicts."""
+    return Counter((e[recipe_field], e[type_field]) for e in events)
+
+# -------------------------------------------------------------------
+# LOAD GENERATOR
+# -------------------------------------------------------------------
+def generate_events(n_events, n_recipes, skew=1.2, seed=0):
+    """(recipe_id, event_type) pairs with Zipf-like recipe popularity (recipe_0000 is hottest)."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_recipes + 1) ** skew
+    recipes = rng.choice(n_recipes, size=n_events, p=weights / weights.sum())
+    kinds = rng.choice(["view", "like"], size=n_events, p=[0.8, 0.2])
+    return [(f"recipe_{r:04d}", k) for r, k in zip(recipes, kinds)]
+
+
+def run_load(counters, events):
+    """
+    One increment per event, as many in flight as the client's AIMD limit
+    allows. Returns (seconds, failed increments).
+    """
+    def one(event):
+        try:
+            counters.increment(*event)
+            return 0
+        except Exception:
+            return 1
+
+    started = time.monotonic()
+    # increment() waits for a slot under the AIMD limit itself
+    with ThreadPoolExecutor(max_workers=counters.db.limiter.maximum) as pool:
+        failed = sum(pool.map(one, events))
+    return time.monotonic() - started, failed
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent load test of sharded recipe counters: increment, read back, compare.")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--recipes", type=int, default=20)
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent of recipe popularity")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--collection", default=COLLECTION)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--contention", type=float, default=0.02,
+                        help="stub only: seconds each write holds its document")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub only")
+    parser.add_argument("--emulator", action="store_true",
+                        help="use the Firestore emulator (FIRESTORE_EMULATOR_HOST) instead of the stub")
+    args = parser.parse_args()
+
+    if args.emulator:
+        from etl_export_to_csv import init_firestore
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("FIRESTORE_EMULATOR_HOST is not set")
+        db = init_firestore()
+    else:
+        db = FaultyFirestore(args.error_rate, latency=0.002, capacity=64, seed=args.seed,
+                             contention=args.contention)
+
+    events = generate_events(args.events, args.recipes, args.skew, args.seed)
+    expected = Counter(events)
+    counters = ShardedCounters(ResilientClient(db, seed=args.seed), args.shards, args.collection, args.seed)
+    # start from zero (the emulator keeps documents between runs)
+    baseline = counters.get_many(sorted({r for r, _ in expected}), ["view", "like"])
+
+    seconds, failed = run_load(counters, events)
+    print(f" {len(events):,} increments over {args.shards} shard(s) in {seconds:.2f}s "
+          f"({len(events) / seconds:,.0f}/s); client: {counters.db.stats_line()}")
+
+    totals = counters.get_many(baseline.index, baseline.columns) - baseline
+    got = Counter({(r, t): int(totals.at[r, t]) for r in totals.index for t in totals.columns})
+    wrong = sum(abs(got[k] - expected[k]) for k in set(got) | set(expected))
+    hottest = max(expected, key=expected.get)
+    print(f" Hottest counter {counters.counter_id(*hottest)}: {expected[hottest]:,} events, "
+          f"read {got[hottest]:,} from its shards")
+    print(f" Read back {sum(got.values()):,} of {len(events):,}; off by {wrong} "
+          f"({failed} increments failed, each may or may not have been applied)")
+    if isinstance(db, FaultyFirestore):
+        busiest = max(db.doc_writes.values(), default=0)
+        print(f" Busiest document took {busiest:,} writes")
+    if wrong > failed:
+        raise SystemExit(1)
@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------
+# HyperLogLog sketches of distinct users per (recipe, type, day)
+#
+# A sketch is m = 2**p registers; each user hashes to one register and
+# raises it to the position of the first 1-bit in the rest of the hash.
+# Sketches merge by element-wise max, so any date range / set of types
+# is the union of its daily sketches. Relative standard error is
+# 1.04 / sqrt(m): 1.6% at the default p = 12 (4 KB dense per sketch).
+#
+# Daily sketches are mostly empty, so they are stored sparse: one
+# (group, register, rank) triple per non-zero register, and densified
+# only when a query unions them.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+SKETCH_PATH = os.path.join(DATA_DIR, ".sketches", "unique_users.npz")
+DEFAULT_P = 12
+
+
+def _bit_length(x):
+    """Exact bit length of uint64 values (0 -> 0)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp is exact for values below 2**53
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def hash_registers(values, p=DEFAULT_P):
+    """(register index, rank) for each value, fully vectorized."""
+    h = pd.util.hash_array(np.asarray(values, dtype=object))
+    idx = (h >> np.uint64(64 - p)).astype(np.int64)
+    rest = h & np.uint64((1 << (64 - p)) - 1)
+    rank = (64 - p) - _bit_length(rest) + 1
+    return idx, rank.astype(np.uint8)
+
+
+def _factorize_groups(frame):
+    """Group code per row of a (recipeId, type, day) frame, plus the groups."""
+    combined = np.zeros(len(frame), dtype=np.int64)
+    uniques = []
+    for col in ("recipeId", "type", "day"):
+        codes, values = pd.factorize(frame[col])
+        combined = combined * len(values) + codes
+        uniques.append(values)
+    group_codes, keys = pd.factorize(combined)
+
+    groups = {}
+    for col, values in zip(("day", "type", "recipeId"), reversed(uniques)):
+        groups[col] = values.to_numpy()[keys % len(values)]
+        keys = keys // len(values)
+    return group_codes, pd.DataFrame(groups)[["recipeId", "type", "day"]]
+
+
+def hll_estimate(registers):
+    """
+    Cardinality estimate for dense register rows (shape (..., m)), with the
+    standard small-range (linear counting) correction.
+    """
+    registers = np.asarray(registers, dtype=np.float64)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class UniqueUserSketches:
+    def __init__(self, groups: pd.DataFrame, group_ids, registers, ranks, p=DEFAULT_P):
+        # groups: one row per (recipeId, type, day), position = group id
+        self.groups = groups.reset_index(drop=True)
+        self.group_ids = np.asarray(group_ids, dtype=np.int64)
+        self.registers = np.asarray(registers, dtype=np.int32)
+        self.ranks = np.asarray(ranks, dtype=np.uint8)
+        self.p = p
+        self.m = 1 << p
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(self.m)
+
+    @classmethod
+    def build(cls, interactions: pd.DataFrame, p=DEFAULT_P):
+        # exports store UTC ISO-8601 strings, so the day is the first 10 chars
+        frame = pd.DataFrame({
+            "recipeId": interactions["recipeId"].to_numpy(),
+            "type": interactions["type"].to_numpy(),
+            "day": interactions["createdAt"].astype(str).str[:10].to_numpy(),
+        })
+        group_codes, groups = _factorize_groups(frame)
+        reg, rank = hash_registers(interactions["userId"].to_numpy(), p)
+        group_ids, registers, ranks = cls._reduce(group_codes, reg, rank, 1 << p)
+        return cls(groups, group_ids, registers, ranks, p)
+
+    @staticmethod
+    def _reduce(group_ids, registers, ranks, m):
+        """Keep the max rank per (group, register)."""
+        key = np.asarray(group_ids, dtype=np.int64) * m + registers
+        best = pd.Series(ranks).groupby(key, sort=True).max()
+        keys = best.index.to_numpy()
+        return keys // m, (keys % m).astype(np.int32), best.to_numpy(dtype=np.uint8)
+
+    def merge(self, other):
+        """Union with another set of sketches (e.g. last night's)."""
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches with different precision")
+        both = pd.concat([self.groups, other.groups], ignore_index=True)
+        codes, groups = _factorize_groups(both)
+        remap_self = codes[:len(self.groups)]
+        remap_other = codes[len(self.groups):]
+        group_ids, registers, ranks = self._reduce(
+            np.concatenate([remap_self[self.group_ids], remap_other[other.group_ids]]),
+            np.concatenate([self.registers, other.registers]),
+            np.concatenate([self.ranks, other.ranks]),
+            self.m,
+        )
+        return UniqueUserSketches(groups, group_ids, registers, ranks, self.p)
+
+    # ---------------------------------------------------------------
+    # queries
+    # ---------------------------------------------------------------
+    def _select(self, recipe_ids=None, start=None, end=None, types=None):
+        mask = np.ones(len(self.groups), dtype=bool)
+        if recipe_ids is not None:
+            mask &= self.groups["recipeId"].isin(recipe_ids).to_numpy()
+        if types is not None:
+            mask &= self.groups["type"].isin(types).to_numpy()
+        if start is not None:
+            mask &= (self.groups["day"] >= str(start)[:10]).to_numpy()
+        if end is not None:
+            mask &= (self.groups["day"] <= str(end)[:10]).to_numpy()
+        return mask
+
+    def unique_users(self, recipe_id=None, start=None, end=None, types=None):
+        """
+        Approximate distinct users for one recipe (or all, if None) between
+        two ISO dates inclusive, optionally limited to interaction types.
+        Returns (estimate, standard_error).
+        """
+        selected = self._select(None if recipe_id is None else [recipe_id], start, end, types)
+        keep = selected[self.group_ids]
+        dense = np.zeros(self.m, dtype=np.uint8)
+        np.maximum.at(dense, self.registers[keep], self.ranks[keep])
+        estimate = float(hll_estimate(dense))
+        return estimate, estimate * self.relative_error
+
+    def unique_users_per_recipe(self, start=None, end=None, types=None, chunk=4096):
+        """
+        Approximate distinct users for every recipe in the window. Recipes
+        are densified chunk by chunk to bound memory at chunk * m bytes.
+        """
+        selected = self._select(None, start, end, types)
+        keep = selected[self.group_ids]
+        recipe_of_group = self.groups["recipeId"].to_numpy()[self.group_ids[keep]]
+        codes, recipe_ids = pd.factorize(recipe_of_group)
+        regs, ranks = self.registers[keep], self.ranks[keep]
+
+        estimates = np.zeros(len(recipe_ids))
+        for lo in range(0, len(recipe_ids), chunk):
+            hi = min(lo + chunk, len(recipe_ids))
+            in_chunk = (codes >= lo) & (codes < hi)
+            dense = np.zeros((hi - lo, self.m), dtype=np.uint8)
+            np.maximum.at(dense, (codes[in_chunk] - lo, regs[in_chunk]), ranks[in_chunk])
+            estimates[lo:hi] = hll_estimate(dense)
+
+        out = pd.DataFrame({"recipeId": recipe_ids, "unique_users": estimates.round()})
+        out["std_error"] = (out["unique_users"] * self.relative_error).round(1)
+        return out.set_index("recipeId").sort_values("unique_users", ascending=False)
+
+    # ---------------------------------------------------------------
+    # persistence
+    # ---------------------------------------------------------------
+    def save(self, path=SKETCH_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            p=np.array(self.p),
+            recipe_ids=self.groups["recipeId"].to_numpy(dtype=str),
+            types=self.groups["type"].to_numpy(dtype=str),
+            days=self.groups["day"].to_numpy(dtype=str),
+            group_ids=self.group_ids,
+            registers=self.registers,
+            ranks=self.ranks,
+        )
+
+    @classmethod
+    def load(cls, path=SKETCH_PATH):
+        with np.load(path, allow_pickle=False) as z:
+            groups = pd.DataFrame({
+                "recipeId": z["recipe_ids"].astype(object),
+                "type": z["types"].astype(object),
+                "day": z["days"].astype(object),
+            })
+            return cls(groups, z["group_ids"], z["registers"], z["ranks"], int(z["p"]))
@@ -0,0 +1,193 @@
+import argparse
+import os
+
+import duckdb
+
+from compressed_io import find_table
+
+# -------------------------------------------------------------------
+# SQL query mode over the exported dataset (DuckDB, in-process)
+#
+# recipe / ingredients / steps / interactions are registered as views
+# over the files in data_dir, so nothing is loaded up front: DuckDB scans
+# the files per query, reads only the referenced columns, pushes WHERE
+# filters into the scan (and skips whole row groups of Parquet files),
+# and spills joins / aggregations to temp_directory when they exceed
+# memory_limit. Parquet is preferred over CSV when both exist and it is
+# at least as new (a re-export is never shadowed by a stale copy);
+# `--to-parquet` writes the Parquet copies, refreshing stale ones.
+# -------------------------------------------------------------------
+
+DATA_DIR = "data"
+TABLES = ["recipe", "ingredients", "steps", "interactions"]
+DEFAULT_MEMORY_LIMIT = "2GB"
+
+QUERIES = {
+    "most_viewed": """
+        SELECT recipeId, count(*) AS views
+        FROM interactions
+        WHERE type = 'view'
+        GROUP BY recipeId
+        ORDER BY views DESC, recipeId
+        LIMIT 5
+    """,
+    "most_liked": """
+        SELECT recipeId, count(*) AS likes
+        FROM interactions
+        WHERE type = 'like'
+        GROUP BY recipeId
+        ORDER BY likes DESC, recipeId
+        LIMIT 5
+    """,
+    "average_rating": """
+        SELECT recipeId, avg(rating) AS avg_rating, count(*) AS ratings
+        FROM interactions
+        WHERE type = 'rating' AND rating IS NOT NULL
+        GROUP BY recipeId
+        ORDER BY avg_rating DESC, ratings DESC
+    """,
+    "difficulty_distribution": """
+        SELECT difficulty, count(*) AS recipes
+        FROM recipe
+        GROUP BY difficulty
+        ORDER BY recipes DESC
+    """,
+    "common_ingredients": """
+        SELECT lower(trim(regexp_replace(name, '\\([^)]*\\)', '', 'g'))) AS ingredient,
+               count(DISTINCT recipeId) AS recipes
+        FROM ingredients
+        GROUP BY ingredient
+        ORDER BY recipes DESC, ingredient
+        LIMIT 10
+    """,
+    "longest_recipes": """
+        SELECT recipeId, title, totalTimeMinutes
+        FROM recipe
+        ORDER BY totalTimeMinutes DESC
+        LIMIT 5
+    """,
+    "view_to_like_conversion": """
+        SELECT recipeId,
+               count(*) FILTER (WHERE type = 'view') AS views,
+               count(*) FILTER (WHERE type = 'like') AS likes,
+               likes / greatest(views, 1) AS conversion_rate
+        FROM interactions
+        WHERE type IN ('view', 'like')
+        GROUP BY recipeId
+        ORDER BY conversion_rate DESC
+        LIMIT 5
+    """,
+    "likes_by_difficulty": """
+        SELECT r.difficulty, count(*) AS likes, count(DISTINCT i.userId) AS users
+        FROM interactions i
+        JOIN recipe r USING (recipeId)
+        WHERE i.type = 'like'
+        GROUP BY r.difficulty
+        ORDER BY likes DESC
+    """,
+    "interactions_by_type": """
+        SELECT type, count(*) AS interactions
+        FROM interactions
+        GROUP BY type
+        ORDER BY interactions DESC
+    """,
+}
+
+
+def table_path(data_dir, name):
+    """
+    The newest of the Parquet copy and the CSV export (plain or compressed,
+    compressed_io.find_table), Parquet on a tie; None if neither exists.
+    """
+    candidates = [os.path.join(data_dir, name + ".parquet"), find_table(data_dir, name)]
+    existing = [p for p in candidates if os.path.exists(p)]
+    return max(existing, key=os.path.getmtime) if existing else None
+
+
+def _scan(path):
+    literal = path.replace("'", "''")
+    if path.endswith(".parquet"):
+        return f"read_parquet('{literal}')"
+    # sample the whole file for types so a late non-null rating isn't misread
+    return f"read_csv('{literal}', header = true, sample_size = -1)"
+
+
+def connect(data_dir=DATA_DIR, memory_limit=DEFAULT_MEMORY_LIMIT, temp_dir=None, threads=None):
+    """In-memory DuckDB connection with a view per exported table."""
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit = '{memory_limit}'")
+    con.execute(f"SET temp_directory = '{temp_dir or os.path.join(data_dir, '.duckdb_tmp')}'")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+
+    for name in TABLES:
+        path = table_path(data_dir, name)
+        if path is None:
+            print(f" Skipping `{name}`: no {name}.parquet / {name}.csv in {data_dir}")
+            continue
+        if not path.endswith(".parquet") and os.path.exists(os.path.join(data_dir, name + ".parquet")):
+            print(f" `{name}`: {path} is newer than {name}.parquet, scanning the CSV "
+                  f"(--to-parquet refreshes the copy)")
+        con.execute(f"CREATE VIEW {name} AS SELECT * FROM {_scan(path)}")
+    return con
+
+
+def run_query(con, sql):
+    """Runs one statement and returns the result as a DataFrame."""
+    return con.execute(sql).df()
+
+
+def explain(con, sql):
+    """DuckDB's physical plan, showing the projections / filters pushed into each scan."""
+    return "\n".join(row[1] for row in con.execute(f"EXPLAIN {sql}").fetchall())
+
+
+def export_parquet(data_dir=DATA_DIR, row_group_size=122_880):
+    """
+    Writes <table>.parquet next to each CSV. Parquet keeps per-row-group
+    min/max statistics, which lets filters skip data without reading it.
+    """
+    con = duckdb.connect()
+    for name in TABLES:
+        path = table_path(data_dir, name)
+        if path is None or path.endswith(".parquet"):
+            continue
+        out = os.path.join(data_dir, f"{name}.parquet").replace("'", "''")
+        con.execute(
+            f"COPY (SELECT * FROM {_scan(path)}) TO '{out}' "
+            f"(FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {int(row_group_size)})"
+        )
+        print(f" {path} -> {out}")
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run SQL over the exported recipe tables with DuckDB.")
+    parser.add_argument("query", nargs="?", help=f"predefined query: {', '.join(QUERIES)}")
+    parser.add_argument("--sql", help="ad-hoc SQL over recipe / ingredients / steps / interactions")
+    parser.add_argument("--list", action="store_true", help="list the predefined queries")
+    parser.add_argument("--explain", action="store_true", help="print the query plan instead of running it")
+    parser.add_argument("--to-parquet", action="store_true", help="write Parquet copies of the CSV exports")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--memory-limit", default=DEFAULT_MEMORY_LIMIT)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.to_parquet:
+        export_parquet(args.data_dir)
+
+    if args.list:
+        for name, sql in QUERIES.items():
+            print(f"\n-- {name}\n{sql.strip()}")
+    elif args.sql or args.query:
+        if args.query and args.query not in QUERIES:
+            parser.error(f"unknown query {args.query!r}; use --list")
+        sql = args.sql or QUERIES[args.query]
+        con = connect(args.data_dir, args.memory_limit, threads=args.threads)
+        if args.explain:
+            print(explain(con, sql))
+        else:
+            print(run_query(con, sql).to_string(index=False))
+    elif not args.to_parquet:
+        parser.print_help()
@@ -0,0 +1,208 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cdc_listener
+from cdc_listener import (CdcListener, EventTable, compact_tiers, list_segments, read_segments, segment_seq,
+                          segment_tier, smoke_test, wait_for)
+from firestore_client import FaultyFirestore, _Change
+
+RECIPE = "recipe_cdc"
+FLUSH_S = 0.1
+
+
+@pytest.fixture
+def db():
+    db = FaultyFirestore()
+    db.collection("recipes").document(RECIPE).set({"title": "CDC test"})
+    return db
+
+
+def write(db, ids, kind="view", age=timedelta(0)):
+    batch = db.batch()
+    for doc_id in ids:
+        batch.set(db.collection("interactions").document(doc_id),
+                  {"interactionId": doc_id, "userId": f"user_{doc_id}", "recipeId": RECIPE, "type": kind,
+                   "createdAt": datetime.now(timezone.utc) - age, "source": "test"})
+    batch.commit()
+
+
+def delete(db, ids):
+    for doc_id in ids:
+        db.collection("interactions").document(doc_id).delete()
+
+
+def live(listener):
+    """(views, favorites, document count behind the event preview) for RECIPE."""
+    counts = listener.event_counts(1, [RECIPE])
+    return (int(counts.loc[RECIPE, "view"]), int(counts.loc[RECIPE, "favorite"]),
+            len(listener.document_ids(RECIPE)))
+
+
+def settle(listener, expected):
+    assert wait_for(lambda: live(listener) == expected, timeout=10), f"{live(listener)} != {expected}"
+    assert len(listener.events(1, RECIPE)) == expected[0] + expected[1]
+
+
+def test_smoke_test_on_the_stub(tmp_path):
+    smoke_test(FaultyFirestore(), str(tmp_path), n_events=50, flush_interval=FLUSH_S)
+
+
+def test_removed_and_modified_documents_update_counts_and_events(db, tmp_path):
+    listener = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    try:
+        write(db, [f"e{i}" for i in range(10)])
+        settle(listener, (10, 0, 10))
+
+        delete(db, ["e0", "e1", "e2"])
+        write(db, ["e3"], kind="like")
+        settle(listener, (6, 1, 7))
+        assert set(listener.events(1, RECIPE)["user_id"]) == {f"user_e{i}" for i in range(3, 10)}
+    finally:
+        listener.stop()
+
+
+def test_restart_captures_changes_made_while_down(db, tmp_path):
+    listener = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    write(db, [f"e{i}" for i in range(10)])
+    settle(listener, (10, 0, 10))
+    time.sleep(3 * FLUSH_S)  # checkpoint written
+    listener.stop()
+
+    # while nothing listens: deletes, a modification and events too old for any lookback
+    delete(db, ["e0", "e1"])
+    write(db, ["e2"], kind="like")
+    write(db, ["late0", "late1", "late2"], age=timedelta(hours=6))
+
+    restarted = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    try:
+        settle(restarted, (10, 1, 11))
+        assert set(restarted.document_ids()) == set(db.data["interactions"])
+    finally:
+        restarted.stop()
+
+    # a restart with nothing new applies nothing and counts nothing twice
+    segments = list_segments(str(tmp_path), "interactions")
+    again = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    try:
+        assert live(again) == (10, 1, 11)
+        time.sleep(3 * FLUSH_S)
+        assert live(again) == (10, 1, 11)
+        assert again.stats["applied"] == 0
+        assert list_segments(str(tmp_path), "interactions") == segments
+    finally:
+        again.stop()
+
+
+def test_second_listener_follows_and_takes_over(db, tmp_path):
+    owner = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    follower = CdcListener(db, str(tmp_path), flush_interval=FLUSH_S).start()
+    try:
+        assert owner.owner and not follower.owner
+        write(db, [f"e{i}" for i in range(5)])
+        delete(db, ["e0"])
+        settle(follower, (4, 0, 4))
+        # only the owner writes segments
+        assert follower.stats["batches"] == 0
+
+        owner.stop()
+        delete(db, ["e1"])
+        assert wait_for(lambda: follower.owner, timeout=10)
+        settle(follower, (3, 0, 3))
+    finally:
+        owner.stop()
+        follower.stop()
+
+
+def events_frame(seq, n=5):
+    return pd.DataFrame({"user_id": [f"u{seq}_{i}" for i in range(n)], "recipe_id": RECIPE, "event_type": "view",
+                         "timestamp": "2025-01-01T00:00:00Z", "source": "test",
+                         "_doc_id": [f"d{seq}_{i}" for i in range(n)], "_op": np.int8(1),
+                         "_ts_ns": np.int64(1), "_update_ns": np.int64(seq), "_seq": seq})
+
+
+def test_tiered_compaction_rewrites_only_recent_segments(tmp_path, monkeypatch):
+    cdc_dir = str(tmp_path)
+    rewritten = []
+    real_write = cdc_listener.write_segment
+
+    def counting_write(cdc_dir, collection, first, last, frame):
+        if first != last:
+            rewritten.append(len(frame))
+        return real_write(cdc_dir, collection, first, last, frame)
+
+    monkeypatch.setattr(cdc_listener, "write_segment", counting_write)
+    for seq in range(1, 1001):
+        real_write(cdc_dir, "recipe_events", seq, seq, events_frame(seq))
+        if seq % 10 == 0:
+            compact_tiers(cdc_dir, "recipe_events")
+
+    segments = list_segments(cdc_dir, "recipe_events")
+    assert [segment_seq(p) for p in segments] == [(1, 1000)]
+    # each change rewritten once per tier (3 for 1000 batches), not once per compaction
+    assert sum(rewritten) == 3 * 5000
+    changes = read_segments(cdc_dir, "recipe_events")
+    assert changes["_seq"].tolist() == sorted(changes["_seq"]) and len(changes) == 5000
+
+
+def test_compaction_catches_up_on_untiered_segments(tmp_path):
+    cdc_dir = str(tmp_path)
+    for seq in range(1, 151):
+        cdc_listener.write_segment(cdc_dir, "recipe_events", seq, seq, events_frame(seq, n=1))
+    compact_tiers(cdc_dir, "recipe_events")
+    tiers = [segment_tier(p) for p in list_segments(cdc_dir, "recipe_events")]
+    assert tiers == [2] + [1] * 5
+    assert len(read_segments(cdc_dir, "recipe_events")) == 150
+
+
+def test_dedup_keys_on_document_and_update_time(tmp_path):
+    db = FaultyFirestore()
+    listener = CdcListener(db, str(tmp_path), collection="recipe_events", flush_interval=FLUSH_S).start()
+    events = db.collection("recipe_events")
+    event = {"user_id": "u1", "recipe_id": RECIPE, "event_type": "view",
+             "timestamp": datetime.now(timezone.utc), "source": "test"}
+    try:
+        events.document("ev1").set(event)
+        assert wait_for(lambda: listener.document_ids(RECIPE) == ["ev1"], timeout=10)
+
+        # the same change delivered again is dropped
+        snapshot = db._documents("recipe_events")[0]
+        listener._on_events([snapshot], [_Change("ADDED", snapshot)], snapshot.update_time)
+        assert wait_for(lambda: listener.stats["duplicates"] == 1, timeout=10)
+
+        # deleted and created again: a new change, captured
+        events.document("ev1").delete()
+        events.document("ev1").set(event)
+        assert wait_for(lambda: listener.stats["applied"] == 3, timeout=10)
+        assert listener.document_ids(RECIPE) == ["ev1"]
+        assert int(listener.event_counts(1, [RECIPE]).loc[RECIPE, "view"]) == 1
+        assert listener.stats["duplicates"] == 1
+    finally:
+        listener.stop()
+
+
+def test_event_table_keeps_counts_through_many_modifications():
+    table = EventTable()
+    rng = np.random.default_rng(0)
+    expected = {}
+    for _ in range(200):
+        ids = [f"d{i}" for i in np.unique(rng.integers(0, 50, 20))]
+        kinds = rng.choice(["view", "favorite"], len(ids))
+        events = pd.DataFrame({"_doc_id": ids, "user_id": "u", "recipe_id": RECIPE, "event_type": kinds,
+                               "timestamp": np.int64(10), "source": "test"})
+        table.put(ids, [RECIPE] * len(ids), events)
+        expected.update(zip(ids, kinds))
+        gone = [f"d{i}" for i in rng.integers(0, 50, 3)]
+        table.remove(gone)
+        for doc_id in gone:
+            expected.pop(doc_id, None)
+
+    assert sorted(table.document_ids(RECIPE)) == sorted(expected)
+    counts = table.counts(0)
+    for kind in ("view", "favorite"):
+        assert counts.loc[RECIPE, kind] == sum(k == kind for k in expected.values())
+    # dead rows never outnumber the live ones for long
+    assert table.n <= 2 * len(expected) + 20
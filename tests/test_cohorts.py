@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohorts import WEEK_NS, UserBitmaps
+
+# 2025-01-06 is a Monday, so week w starts 2025-01-06 + 7w days
+USERS = pd.DataFrame({
+    "userId": ["u1", "u2", "u4", "u5"],
+    "createdAt": ["2025-01-06T08:00:00Z", "2025-01-07T08:00:00Z", None, "2025-01-15T08:00:00Z"],
+})
+INTERACTIONS = pd.DataFrame([
+    ("u1", "2025-01-07T10:00:00Z"),
+    ("u1", "2025-01-07T11:00:00Z"),
+    ("u1", "2025-01-14T10:00:00Z"),
+    ("u1", "2025-01-28T10:00:00Z"),
+    ("u2", "2025-01-08T10:00:00Z"),
+    ("u3", "2025-01-13T10:00:00Z"),
+    ("u3", "2025-01-21T10:00:00Z"),
+    ("u3", "not a date"),
+], columns=["userId", "createdAt"])
+
+
+def test_retention_on_a_hand_built_frame():
+    bitmaps = UserBitmaps.build(INTERACTIONS, USERS)
+    # u4 has neither a signup date nor any activity
+    assert set(bitmaps.user_ids) == {"u1", "u2", "u3", "u5"}
+    assert bitmaps.active_users().tolist() == [2, 2, 1, 1]
+
+    table = bitmaps.retention(max_weeks=3)
+    assert [str(d) for d in table.index] == ["2025-01-06", "2025-01-13"]
+    assert table["cohort_size"].tolist() == [2, 2]
+    np.testing.assert_array_equal(table.loc[:, [0, 1, 2, 3]].to_numpy(),
+                                  [[2, 1, 0, 1], [1, 1, 0, np.nan]])
+
+    rates = bitmaps.retention_rates(max_weeks=3)
+    assert rates.iloc[0, 1:].tolist() == [1.0, 0.5, 0.0, 0.5]
+
+
+def test_without_users_the_cohort_is_the_first_active_week():
+    table = UserBitmaps.build(INTERACTIONS).retention(max_weeks=3)
+    # u1, u2 start in week 0; u3 in week 1
+    assert table["cohort_size"].tolist() == [2, 1]
+    assert table.loc[:, 0].tolist() == [2, 1]
+
+
+@pytest.mark.parametrize("n_users", [7, 64, 300])
+def test_bitmaps_match_a_set_based_computation(n_users):
+    rng = np.random.default_rng(n_users)
+    origin = pd.Timestamp("2025-01-06", tz="UTC").value
+    ts = origin + rng.integers(0, 10 * WEEK_NS, 5 * n_users)
+    users = rng.integers(0, n_users, len(ts))
+    frame = pd.DataFrame({"userId": [f"u{u}" for u in users],
+                          "createdAt": pd.to_datetime(ts, utc=True).strftime("%Y-%m-%dT%H:%M:%S.%fZ")})
+    table = UserBitmaps.build(frame).retention(max_weeks=4)
+
+    weeks = (ts - origin) // WEEK_NS
+    active = {}
+    for u, w in zip(users, weeks):
+        active.setdefault(w, set()).add(u)
+    first = pd.Series(weeks).groupby(users).min()
+    n_weeks = weeks.max() + 1
+    for c in range(n_weeks):
+        cohort = set(first.index[first == c])
+        if not cohort:
+            continue
+        row = table.loc[(pd.Timestamp(origin, tz="UTC") + pd.Timedelta(weeks=c)).date()]
+        assert row["cohort_size"] == len(cohort)
+        for k in range(5):
+            expected = len(cohort & active.get(c + k, set())) if c + k < n_weeks else np.nan
+            np.testing.assert_equal(row[k], expected)
@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import pytest
+
+from compressed_io import COMPRESSIONS, compression_of, find_table, open_text, read_table, table_file, write_table
+
+FRAME = pd.DataFrame({"recipeId": ["r1", "r2", "r3"], "rating": [5.0, None, 3.0], "title": ["a, b", "c", "d\ne"]})
+
+
+@pytest.mark.parametrize("compression", list(COMPRESSIONS))
+def test_tables_round_trip_in_every_compression(tmp_path, compression):
+    path = write_table(FRAME, str(tmp_path), "recipe", compression)
+    assert path == table_file(str(tmp_path), "recipe", compression)
+    assert compression_of(path) == compression
+    pd.testing.assert_frame_equal(read_table(str(tmp_path), "recipe"), FRAME)
+
+
+def test_writing_removes_stale_variants(tmp_path):
+    write_table(FRAME, str(tmp_path), "recipe", "none")
+    write_table(FRAME.head(1), str(tmp_path), "recipe", "gzip")
+    assert os.listdir(tmp_path) == ["recipe.csv.gz"]
+    assert len(read_table(str(tmp_path), "recipe")) == 1
+
+
+def test_find_table_prefers_the_newest_variant(tmp_path):
+    data_dir = str(tmp_path)
+    assert find_table(data_dir, "steps") == os.path.join(data_dir, "steps.csv")
+    FRAME.to_csv(table_file(data_dir, "steps", "none"), index=False)
+    FRAME.to_csv(table_file(data_dir, "steps", "zstd"), index=False, compression="zstd")
+    os.utime(table_file(data_dir, "steps", "none"), (1, 1))
+    assert find_table(data_dir, "steps").endswith("steps.csv.zst")
+
+
+def test_unknown_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        table_file(str(tmp_path), "recipe", "bz2")
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz", ".zst"])
+def test_open_text_round_trip(tmp_path, suffix):
+    path = str(tmp_path / f"report.json{suffix}")
+    with open_text(path, "w") as f:
+        f.write('{"ok": "ünïcode"}\n')
+    with open_text(path) as f:
+        assert f.read() == '{"ok": "ünïcode"}\n'
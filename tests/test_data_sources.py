@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+from data_sources import EVENT_TYPES, DataSource, LocalFileSource, interactions_to_events
+
+INTERACTIONS = [
+    # interactionId, userId, recipeId, type, createdAt, successStatus, source
+    ("i1", "alice", "r1", "view", "2025-01-10T10:00:00+00:00", None, "web"),
+    ("i2", "bob", "r1", "like", "2025-01-10T11:00:00+00:00", None, "mobile"),
+    ("i3", "alice", "r1", "cook_attempt", "2025-01-10T12:00:00+00:00", "success", "web"),
+    ("i4", None, "r2", "view", "2025-01-09T09:00:00+00:00", None, None),
+    ("i5", "carol", "r2", "cook_attempt", "2025-01-01T09:00:00+00:00", "failed", "web"),
+    ("i6", "carol", None, "view", "2025-01-10T09:00:00+00:00", None, "web"),
+    ("i7", "bob", "r2", "rating", "2025-01-10T09:30:00+00:00", None, "web"),
+]
+
+
+def write_interactions(data_dir, rows=INTERACTIONS):
+    frame = pd.DataFrame(rows, columns=["interactionId", "userId", "recipeId", "type", "createdAt",
+                                        "successStatus", "source"])
+    frame.to_csv(os.path.join(data_dir, "interactions.csv"), index=False)
+
+
+@pytest.fixture
+def source(tmp_path):
+    write_interactions(str(tmp_path))
+    return LocalFileSource(str(tmp_path))
+
+
+def test_interactions_map_onto_recipe_events():
+    frame = pd.DataFrame(INTERACTIONS, columns=["interactionId", "userId", "recipeId", "type", "createdAt",
+                                                "successStatus", "source"])
+    events = interactions_to_events(frame)
+    assert sorted(events["event_type"]) == sorted(
+        ["view", "favorite", "start_cook", "complete_cook", "view", "start_cook", "view"])
+
+
+def test_missing_user_and_source_stay_missing(source):
+    events = source.fetch_recipe_events("r2", days=30)
+    missing = events[events["event_type"] == "view"].iloc[0]
+    # not the last user / source in the vocabulary
+    assert missing["user_id"] is None and missing["source"] is None
+    assert set(source.fetch_recipe_events("r1", days=30)["user_id"]) == {"alice", "bob"}
+
+
+def test_event_counts_match_the_generic_rollup(source):
+    counts = source.event_counts(days=5)
+    generic = DataSource.event_counts(source, days=5)
+    pd.testing.assert_frame_equal(counts, generic, check_dtype=False, check_names=False)
+    assert counts.loc["r1"].tolist() == [1, 1, 1, 1]
+    # window anchored at the newest event: carol's attempt on the 1st is out
+    assert counts.loc["r2", "start_cook"] == 0
+    assert list(counts.columns) == EVENT_TYPES
+
+
+def test_cache_is_rebuilt_in_place_when_the_csv_changes(tmp_path, source):
+    assert source.event_counts(days=30).loc["r1", "view"] == 1
+    write_interactions(str(tmp_path), INTERACTIONS + [
+        ("i8", "dave", "r1", "view", "2025-01-10T13:00:00+00:00", None, "web")])
+    later = os.path.getmtime(os.path.join(str(tmp_path), ".columnar", "vocab.json")) + 10
+    os.utime(os.path.join(str(tmp_path), "interactions.csv"), (later, later))
+
+    rebuilt = LocalFileSource(str(tmp_path))
+    assert rebuilt.event_counts(days=30).loc["r1", "view"] == 2
+    # no temporary or replaced cache directories left behind
+    assert sorted(os.listdir(tmp_path)) == [".columnar", "interactions.csv"]
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(DataSource):
+        def load_recipes(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
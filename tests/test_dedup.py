@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dedup import SeenIndex, drop_duplicates
+
+
+def ids(prefix, n, start=0):
+    return np.array([f"{prefix}{i}" for i in range(start, start + n)], dtype=object)
+
+
+def test_check_and_add_drops_repeats_within_and_across_batches():
+    index = SeenIndex()
+    assert index.check_and_add(["a", "b", "a"]).tolist() == [True, True, False]
+    assert index.check_and_add(["b", "c"]).tolist() == [False, True]
+    assert len(index) == 3
+    assert index.stats["duplicates"] == 2
+
+
+def test_many_small_batches_keep_few_sorted_runs():
+    index = SeenIndex(capacity=10_000)
+    for start in range(0, 20_000, 100):
+        assert index.check_and_add(ids("id", 100, start)).all()
+    # binary-counter merging: at most log2(batches) + 1 runs
+    assert len(index._runs) <= 8
+    assert all(np.all(hi[1:] >= hi[:-1]) for hi, _ in index._runs)
+    assert not index.check_and_add(ids("id", 20_000)).any()
+
+
+def test_in_memory_bloom_grows_and_keeps_its_false_positive_rate():
+    index = SeenIndex(capacity=1_000, fp_rate=0.01)
+    for start in range(0, 50_000, 500):
+        index.check_and_add(ids("seen", 500, start))
+    assert index.bloom.capacity >= len(index) == 50_000
+
+    hits_before = index.stats["bloom_hits"]
+    assert index.check_and_add(ids("fresh", 20_000)).all()
+    assert (index.stats["bloom_hits"] - hits_before) / 20_000 < 0.03
+
+
+def test_commit_and_reload_round_trip(tmp_path):
+    index = SeenIndex(str(tmp_path), capacity=1_000)
+    index.check_and_add(ids("a", 3_000))
+    index.commit()
+    index.check_and_add(ids("b", 2_000))
+    index.commit()
+
+    reloaded = SeenIndex(str(tmp_path))
+    assert len(reloaded) == 5_000
+    assert np.all(reloaded.hi[1:] >= reloaded.hi[:-1])
+    assert not reloaded.check_and_add(np.concatenate([ids("a", 3_000), ids("b", 2_000)])).any()
+    assert reloaded.check_and_add(ids("c", 10)).all()
+
+
+def test_drop_duplicates_keeps_first_occurrence():
+    frame = pd.DataFrame({"interactionId": ["x", "y", "x", "z"], "n": [1, 2, 3, 4]})
+    kept, dropped = drop_duplicates(frame, SeenIndex())
+    assert kept["n"].tolist() == [1, 2, 4] and dropped == 1
+
+
+def test_commit_runs_concurrently_with_check_and_add(tmp_path):
+    index = SeenIndex(str(tmp_path), capacity=1_000)
+    index.check_and_add(ids("old", 50_000))
+    index.commit()
+    done = threading.Event()
+
+    def keep_committing():
+        while not done.is_set():
+            index.commit()
+
+    committer = threading.Thread(target=keep_committing)
+    committer.start()
+    try:
+        for start in range(0, 20_000, 200):
+            batch = ids("new", 200, start)
+            assert index.check_and_add(batch).all()
+            # ids added a moment ago are found whether or not a merge is in flight
+            assert not index.check_and_add(batch).any()
+            assert not index.check_and_add(ids("old", 50, start)).any()
+    finally:
+        done.set()
+        committer.join()
+    index.commit()
+
+    reloaded = SeenIndex(str(tmp_path))
+    assert len(reloaded) == 70_000
+    assert not reloaded.check_and_add(np.concatenate([ids("old", 50_000), ids("new", 20_000)])).any()
@@ -0,0 +1,145 @@
+import pytest
+
+from firestore_client import (AimdLimiter, DeadlineExceeded, FaultyFirestore, ResilientClient,
+                              ResourceExhausted, is_valid_document_id)
+from sharded_counters import increment
+
+
+def client_for(db, **kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    kwargs.setdefault("seed", 0)
+    return ResilientClient(db, **kwargs)
+
+
+def test_idempotent_writes_retry_every_transient_error():
+    db = FaultyFirestore(error_rate=0.3, seed=1)
+    client = client_for(db, max_attempts=30)
+    ref = client.collection("docs")
+
+    client.map(lambda i: ref.document(f"doc_{i}").set({"n": i}), range(300))
+
+    stats = client.stats()
+    assert len(db.data["docs"]) == 300
+    assert stats["ops"] == 300 and stats["failed"] == 0
+    # every RPC past the first one per document was a retry
+    assert stats["retries"] == db.rpcs - 300 > 0
+
+
+def test_non_idempotent_call_is_not_retried_once_applied():
+    # every RPC fails: ResourceExhausted before applying, DeadlineExceeded after
+    db = FaultyFirestore(error_rate=1.0, seed=2)
+    client = client_for(db, max_attempts=50)
+    ref = client.collection("counters").document("c")
+
+    for _ in range(40):
+        with pytest.raises(DeadlineExceeded):
+            client.call(ref.set, {"count": increment(1)}, merge=True, idempotent=False)
+
+    # rejected attempts were retried, the applied one was not: no double counts
+    assert db.data["counters"]["c"]["count"] == 40
+    assert client.stats()["failed"] == 40
+    assert client.stats()["retries"] == db.rpcs - 40
+
+
+def test_permanent_errors_are_not_retried():
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    client = client_for(FaultyFirestore())
+    with pytest.raises(ValueError):
+        client.call(bad)
+    assert len(calls) == 1
+    assert client.stats()["retries"] == 0 and client.stats()["failed"] == 1
+
+
+def test_gives_up_after_max_attempts():
+    client = client_for(FaultyFirestore(), max_attempts=4)
+
+    def throttled():
+        raise ResourceExhausted("quota")
+
+    with pytest.raises(ResourceExhausted):
+        client.call(throttled)
+    assert client.stats()["retries"] == 3 and client.stats()["throttled"] == 4
+
+
+def test_backoff_is_full_jitter_capped_at_max_delay():
+    client = client_for(FaultyFirestore(), base_delay=0.1, max_delay=1.0)
+    for attempt in range(10):
+        cap = min(1.0, 0.1 * 2 ** attempt)
+        assert all(0 <= client.backoff(attempt) <= cap for _ in range(50))
+
+
+def test_aimd_grows_additively_and_halves_once_per_round():
+    limiter = AimdLimiter(initial=4, maximum=64)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    # +1/limit per success: about one slot per round of `limit` calls
+    assert 4.9 < limiter.limit < 5.0
+
+    limiter = AimdLimiter(initial=8, maximum=64)
+    for _ in range(8):
+        limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    # the rest of that round saw the same overload: no further cut yet
+    for _ in range(3):
+        limiter.release(throttled=True)
+    assert limiter.limit == 4
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+    assert limiter.in_flight == 3
+
+
+def test_aimd_settles_near_the_backend_quota():
+    db = FaultyFirestore(latency=0.002, capacity=8, seed=3)
+    client = client_for(db, limiter=AimdLimiter(initial=4, maximum=64))
+    ref = client.collection("docs")
+
+    client.map(lambda i: ref.document(f"doc_{i}").set({"n": i}), range(1000))
+
+    stats = client.stats()
+    assert len(db.data["docs"]) == 1000 and stats["failed"] == 0
+    assert stats["throttled"] > 0
+    assert stats["retries"] == db.rpcs - 1000
+    # the limit backed off from the 64 the pool would allow to about the quota
+    assert client.limiter.limit <= 10
+
+
+def test_stream_reads_pages_lazily_and_retries_each_page_alone():
+    db = FaultyFirestore(seed=4)
+    ref = db.collection("docs")
+    for i in range(2500):
+        ref.document(f"doc_{i:05d}").set({"n": i})
+    writes = db.rpcs
+
+    client = client_for(db, max_attempts=50)
+    docs = client.stream(client.collection("docs"), page_size=100)
+    assert next(docs).id == "doc_00000"
+    assert db.rpcs - writes == 1  # only the first page was read
+
+    db.error_rate = 0.3
+    ids = ["doc_00000"] + [doc.id for doc in docs]
+    assert ids == sorted(f"doc_{i:05d}" for i in range(2500))
+    stats = client.stats()
+    # 25 full pages and the empty one after them, each a separate call
+    assert stats["ops"] == 26 and stats["failed"] == 0
+    assert stats["retries"] == db.rpcs - writes - 26 > 0
+
+
+@pytest.mark.parametrize("doc_id, valid", [
+    ("evt_123", True),
+    ("a" * 1500, True),
+    ("a" * 1501, False),
+    ("", False),
+    ("a/b", False),
+    (".", False),
+    ("..", False),
+    ("__id__", False),
+])
+def test_document_id_rules(doc_id, valid):
+    assert is_valid_document_id(doc_id) is valid
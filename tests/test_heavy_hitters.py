@@ -0,0 +1,65 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from heavy_hitters import HeavyHitterTracker, SpaceSaving
+
+
+def zipf_stream(n, n_keys, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"r{k}" for k in np.minimum(rng.zipf(1.3, n), n_keys)]
+
+
+def test_space_saving_guarantees_hold_on_a_skewed_stream():
+    stream = zipf_stream(50_000, 5_000)
+    exact = Counter(stream)
+    summary = SpaceSaving(capacity=100)
+    for key in stream:
+        summary.update(key)
+
+    assert summary.total == len(stream)
+    for key, count, error in summary.top(100):
+        # every reported count brackets the true one
+        assert count - error <= exact[key] <= count
+    # anything more frequent than N / capacity is tracked
+    for key, n in exact.items():
+        if n > len(stream) / 100:
+            assert key in summary.counts
+
+
+def test_guaranteed_top_k_is_the_true_top_k():
+    stream = zipf_stream(50_000, 5_000, seed=1)
+    summary = SpaceSaving(capacity=200)
+    for key in stream:
+        summary.update(key)
+    assert summary.guaranteed(5)
+    assert [key for key, _, _ in summary.top(5)] == [key for key, _ in Counter(stream).most_common(5)]
+
+
+def test_exact_while_under_capacity():
+    summary = SpaceSaving(capacity=10)
+    summary.update_counts(pd.Series({"a": 5, "b": 3, "c": 7}))
+    summary.update("a", 3)
+    assert summary.top(3) == [("a", 8, 0), ("c", 7, 0), ("b", 3, 0)]
+
+
+def test_tracker_chunks_and_round_trip(tmp_path):
+    kinds = np.random.default_rng(2).choice(["view", "like"], 30_000)
+    frame = pd.DataFrame({"recipeId": zipf_stream(30_000, 2_000, seed=2), "type": kinds})
+    tracker = HeavyHitterTracker.from_frame(frame, capacity=300, chunksize=7_000)
+
+    exact = frame[frame["type"] == "view"]["recipeId"].value_counts()
+    top = tracker.top("view", k=3)
+    assert list(top.index) == list(exact.index[:3])
+    assert ((top["count"] - top["error"] <= exact[top.index]) & (exact[top.index] <= top["count"])).all()
+    assert tracker.top("rating").empty
+
+    path = str(tmp_path / "top.json")
+    tracker.save(path)
+    loaded = HeavyHitterTracker.load(path)
+    pd.testing.assert_frame_equal(loaded.top("like", 10), tracker.top("like", 10))
+    # the restored summary keeps counting
+    before = loaded.top("like", 1)
+    loaded.update_event(before.index[0], "like")
+    assert loaded.top("like", 1)["count"].iloc[0] == before["count"].iloc[0] + 1
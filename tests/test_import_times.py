@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from check_import_times import BUDGETS, check
+
+# IMPORT_TIME_SCALE loosens every budget on a slow CI machine, like --scale
+SCALE = float(os.environ.get("IMPORT_TIME_SCALE", "1.0"))
+
+# wall-clock budgets depend on the machine and its load; run with -m slow
+pytestmark = pytest.mark.slow
+
+
+def test_entry_points_import_within_budget():
+    assert check(list(BUDGETS), scale=SCALE) == 0
+
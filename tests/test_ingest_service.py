@@ -0,0 +1,120 @@
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from firestore_client import FaultyFirestore
+from ingest_service import Backpressure, EventIngestor, make_handler
+
+
+class RejectingFirestore(FaultyFirestore):
+    """Fails every commit that writes a document id starting with "bad", as a permanent error."""
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def checked():
+            if any(ref.id.startswith("bad") for ref, _, _ in batch._writes):
+                raise ValueError("rejected by the backend")
+            commit()
+
+        batch.commit = checked
+        return batch
+
+
+def events(ids):
+    return [{"event_id": event_id, "user_id": "u1", "recipe_id": "r1", "event_type": "view",
+             "timestamp": "2025-11-24T10:30:00Z", "source": "test"} for event_id in ids]
+
+
+def ingestor(db, tmp_path, **kwargs):
+    return EventIngestor(db, spool_dir=str(tmp_path / "spool"), dedup_dir=str(tmp_path / "dedup"), **kwargs)
+
+
+@pytest.fixture
+def server(tmp_path):
+    """(ingestor, port) with the HTTP handler served on a free port; nothing is flushed."""
+    ing = ingestor(FaultyFirestore(), tmp_path, max_buffered=5)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(ing))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield ing, httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(port, body, length=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.putrequest("POST", "/events")
+    conn.putheader("Content-Length", str(len(body)) if length is None else length)
+    conn.endheaders()
+    conn.send(body)
+    response = conn.getresponse()
+    result = response.status, dict(response.getheaders()), json.loads(response.read())
+    conn.close()
+    return result
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1e3"])
+def test_malformed_content_length_is_a_bad_request(server, length):
+    _, port = server
+    status, _, body = post(port, b"{}", length)
+    assert status == 400 and body == {"error": "invalid Content-Length"}
+
+
+def test_full_buffer_answers_503_with_retry_after(server):
+    ing, port = server
+    status, _, body = post(port, json.dumps(events([f"e{i}" for i in range(4)])).encode())
+    assert status == 202 and body["accepted"] == 4
+
+    status, headers, _ = post(port, json.dumps(events(["e4", "e5"])).encode())
+    assert status == 503 and headers["Retry-After"] == "1"
+    assert ing.stats["throttled"] == 1 and len(ing.buffer) == 4
+
+    # a client retry of an accepted event is a duplicate, not a new one
+    status, _, body = post(port, json.dumps(events(["e0"])).encode())
+    assert status == 202 and body == {"accepted": 0, "duplicates": 1, "rejected": []}
+
+
+def test_backpressure_counts_events_being_written(tmp_path):
+    ing = ingestor(FaultyFirestore(), tmp_path, max_buffered=5)
+    ing.submit(events(["a", "b", "c"]))
+    ing.in_flight, ing.buffer = 3, []
+    with pytest.raises(Backpressure):
+        ing.submit(events(["d", "e", "f"]))
+
+
+def test_spooled_events_are_replayed_after_a_crash(tmp_path):
+    db = FaultyFirestore()
+    crashed = ingestor(db, tmp_path)
+    crashed.submit(events(["e1", "e2"]))
+    crashed.submit(events(["e3"]))
+    # the process dies mid-append: the last line is torn
+    crashed._spool.write('{"event_id": "e4", "user_')
+    crashed._spool.close()
+    assert "recipe_events" not in db.data or not db.data["recipe_events"]
+
+    restarted = ingestor(db, tmp_path)
+    assert restarted.replay_spool() == 3
+    assert sorted(db.data["recipe_events"]) == ["e1", "e2", "e3"]
+    assert os.listdir(restarted.spool_dir) == []
+
+
+def test_permanent_failures_are_dead_lettered_one_event_at_a_time(tmp_path):
+    db = RejectingFirestore()
+    ing = ingestor(db, tmp_path)
+    ing.submit(events(["e1", "bad1", "e2", "e3", "bad2"]))
+    ing.flush()
+
+    assert sorted(db.data["recipe_events"]) == ["e1", "e2", "e3"]
+    assert ing.stats["written"] == 3 and ing.stats["dead_letters"] == 2
+    with open(ing.dead_letter_path) as f:
+        letters = [json.loads(line) for line in f]
+    assert [letter["event"]["event_id"] for letter in letters] == ["bad1", "bad2"]
+    assert all(letter["error"] == "ValueError: rejected by the backend" for letter in letters)
+    # the pending spool file is gone: nothing is replayed on the next start
+    assert os.listdir(ing.spool_dir) == ["dead-letter.jsonl"]
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from ingredient_index import IngredientIndex, build_ingredient_index, normalize_names
+
+INGREDIENTS = pd.DataFrame([
+    # recipeId, name
+    ("r1", "All-purpose flour (maida)"),
+    ("r1", "Sugar"),
+    ("r1", "sugar (optional)"),
+    ("r2", "all-purpose  flour"),
+    ("r2", "Butter"),
+    ("r3", "Sugar"),
+    ("r3", "butter"),
+    ("r3", "All-purpose flour"),
+    ("r3", None),
+], columns=["recipeId", "name"])
+
+
+def test_names_are_normalized():
+    names = pd.Series(["All-purpose flour (maida)", "  Sugar, ", None, "Cheese (optional)"])
+    assert normalize_names(names).tolist() == ["all-purpose flour", "sugar", "", "cheese"]
+
+
+def test_frequency_cooccurrence_and_engagement():
+    index = build_ingredient_index(INGREDIENTS)
+    assert list(index.recipe_ids) == ["r1", "r2", "r3"]
+    # sugar is listed twice in r1 but counts once; display is the most common spelling
+    assert index.frequency().to_dict() == {"All-purpose flour": 3, "Butter": 2, "Sugar": 2}
+
+    pairs = index.top_pairs(k=3)
+    assert pairs.to_dict() == {"All-purpose flour + Butter": 2, "All-purpose flour + Sugar": 2, "Butter + Sugar": 1}
+
+    likes = pd.Series({"r1": 10, "r3": 4, "other": 100})
+    assert index.engagement(likes).tolist() == [14 / 3, 2.0, 7.0]
+
+
+def test_fixed_recipe_order_keeps_empty_recipes():
+    index = build_ingredient_index(INGREDIENTS, recipe_ids=["r3", "r4", "r1"])
+    assert index.matrix.shape == (3, 3)
+    assert index.matrix.sum(axis=1).ravel().tolist() == [[3, 0, 2]]
+
+
+def test_save_load_round_trip(tmp_path):
+    index = build_ingredient_index(INGREDIENTS)
+    index.save(str(tmp_path))
+    loaded = IngredientIndex.load(str(tmp_path))
+    assert list(loaded.recipe_ids) == list(index.recipe_ids)
+    assert list(loaded.display_names) == list(index.display_names)
+    np.testing.assert_array_equal(loaded.matrix.toarray(), index.matrix.toarray())
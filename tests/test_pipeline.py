@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import pipeline
+from pipeline import Stage, build_stages, run_pipeline
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A two-stage DAG over files in tmp_path; returns (paths, threads each stage ran on)."""
+    paths = {name: tmp_path / name for name in ("input.csv", "code.py", "report.json", "chart.png")}
+    paths["input.csv"].write_text("a\n1\n")
+    paths["code.py"].write_text("# v1\n")
+    threads = {}
+
+    def runner(name, output):
+        def run(ctx):
+            threads.setdefault(name, []).append(threading.current_thread())
+            output.write_text("done")
+        return run
+
+    def stages(data_dir, images_dir, report_path, compression=None):
+        inputs, code = [str(paths["input.csv"])], [str(paths["code.py"])]
+        return {
+            "validate": Stage("validate", runner("validate", paths["report.json"]), inputs=inputs,
+                              outputs=[str(paths["report.json"])], code=code),
+            "analyze": Stage("analyze", runner("analyze", paths["chart.png"]), inputs=inputs,
+                             outputs=[str(paths["chart.png"])], code=code, main_thread=True),
+        }
+
+    monkeypatch.setattr(pipeline, "build_stages", stages)
+    monkeypatch.setattr(pipeline, "compression_of", lambda path: "none")
+    monkeypatch.setattr(pipeline, "find_table", lambda data_dir, name: str(paths["input.csv"]))
+    return paths, threads
+
+
+def run(paths):
+    return run_pipeline({"validate", "analyze"}, data_dir=str(paths["input.csv"].parent),
+                        state_path=str(paths["input.csv"].parent / "state.json"))
+
+
+def test_main_thread_stages_run_on_the_main_thread(workspace):
+    paths, threads = workspace
+    assert run(paths) == {"validate": "ran", "analyze": "ran"}
+    assert threads["analyze"] == [threading.main_thread()]
+    assert threads["validate"][0] is not threading.main_thread()
+
+
+def test_stages_rerun_only_when_inputs_code_or_outputs_change(workspace):
+    paths, threads = workspace
+    run(paths)
+    assert run(paths) == {"validate": "skipped", "analyze": "skipped"}
+
+    paths["code.py"].write_text("# v2\n")
+    assert run(paths) == {"validate": "ran", "analyze": "ran"}
+
+    paths["input.csv"].write_text("a\n2\n")
+    assert run(paths) == {"validate": "ran", "analyze": "ran"}
+
+    paths["chart.png"].unlink()
+    assert run(paths) == {"validate": "skipped", "analyze": "ran"}
+
+
+def test_stage_code_covers_shared_modules(tmp_path):
+    stages = build_stages("data", str(tmp_path), str(tmp_path / "report.json"), compression="none")
+    for name in ("export", "validate", "analyze"):
+        assert {"compressed_io.py", "instrumentation.py"} <= set(stages[name].code)
+    assert stages["analyze"].main_thread and not stages["validate"].main_thread
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import recipe_stats
+from recipe_stats import FEATURES, bootstrap, correlation_report, correlations, weighted_corr
+
+
+@pytest.fixture
+def X():
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(500, len(FEATURES)))
+    X[:, 1] += 0.8 * X[:, 0]
+    X[:, 8] = X[:, 7] * 2 + rng.normal(scale=0.5, size=500)  # cookAttempts ~ likes
+    return X
+
+
+def test_uniform_weights_match_numpy(X):
+    np.testing.assert_allclose(weighted_corr(X, np.ones(len(X))), np.corrcoef(X, rowvar=False), atol=1e-12)
+    # every row weighted 3 is the same as every row once
+    np.testing.assert_allclose(weighted_corr(X, np.full(len(X), 3.0), chunk=64), np.corrcoef(X, rowvar=False),
+                               atol=1e-12)
+
+
+def test_integer_weights_match_repeated_rows(X):
+    w = np.random.default_rng(1).integers(0, 4, len(X))
+    repeated = np.repeat(X, w, axis=0)
+    pearson, spearman = correlations(X, w.astype(float))
+    np.testing.assert_allclose(pearson, np.corrcoef(repeated, rowvar=False), atol=1e-10)
+    ranks = pd.DataFrame(repeated).rank().to_numpy()
+    np.testing.assert_allclose(spearman, np.corrcoef(ranks, rowvar=False), atol=1e-10)
+
+
+def test_missing_values_use_pairwise_complete_rows(X):
+    X[::5, 5] = np.nan
+    pearson, _ = correlations(X)
+    present = ~np.isnan(X[:, 5])
+    expected = np.corrcoef(X[present][:, [0, 5]], rowvar=False)[0, 1]
+    assert pearson[0, 5] == pytest.approx(expected)
+
+
+def test_bootstrap_is_independent_of_worker_count(X):
+    inline = bootstrap(X, n_boot=40, batch_size=10, workers=1, seed=3)
+    pooled = bootstrap(X, n_boot=40, batch_size=10, workers=2, seed=3)
+    np.testing.assert_array_equal(inline, pooled)
+
+
+def test_small_inputs_skip_the_process_pool(X, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started for a small input")
+
+    monkeypatch.setattr(recipe_stats, "ProcessPoolExecutor", no_pool)
+    assert bootstrap(X[:16], n_boot=200).shape == (200, 2, len(FEATURES), len(FEATURES))
+
+
+def test_report_lists_every_pair_with_its_interval(X):
+    report = correlation_report(X, n_boot=50, workers=1)
+    assert len(report) == 2 * len(FEATURES) * (len(FEATURES) - 1) // 2
+    pair = report[(report["feature_a"] == "likes") & (report["feature_b"] == "cookAttempts")]
+    assert set(pair["method"]) == {"pearson", "spearman"}
+    assert ((pair["ci_low"] <= pair["r"]) & (pair["r"] <= pair["ci_high"])).all()
+    assert (pair["r"] > 0.9).all()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommendations import RecommendationIndex, build_index, build_user_recipe_matrix, item_similarity_topk
+
+
+@pytest.fixture
+def interactions():
+    rng = np.random.default_rng(5)
+    n = 3000
+    types = rng.choice(["view", "like", "cook_attempt", "rating", "share"], n)
+    return pd.DataFrame({
+        "userId": [f"u{u}" for u in rng.integers(0, 80, n)],
+        "recipeId": [f"r{r:02d}" for r in rng.zipf(1.3, n) % 60],
+        "type": types,
+        "rating": np.where(types == "rating", rng.integers(1, 6, n), np.nan),
+    })
+
+
+def test_matrix_sums_log_damped_weights():
+    frame = pd.DataFrame({
+        "userId": ["a", "a", "a", "b", None],
+        "recipeId": ["r1", "r1", "r2", "r2", "r1"],
+        "type": ["view", "like", "rating", "share", "view"],
+        "rating": [np.nan, np.nan, 5, np.nan, np.nan],
+    })
+    R, users, recipes = build_user_recipe_matrix(frame)
+    # unknown types and missing users are dropped
+    assert list(users) == ["a"] and list(recipes) == ["r1", "r2"]
+    np.testing.assert_allclose(R.toarray(), [[np.log1p(1 + 3), np.log1p(5)]], rtol=1e-6)
+
+
+def test_topk_matches_dense_cosine(interactions):
+    R, _, _ = build_user_recipe_matrix(interactions)
+    dense = R.toarray().astype(np.float64)
+    norms = np.linalg.norm(dense, axis=0)
+    norms[norms == 0] = 1
+    cosine = (dense / norms).T @ (dense / norms)
+    np.fill_diagonal(cosine, 0)
+
+    k = 5
+    neighbors, scores = item_similarity_topk(R, k=k, block_size=7, workers=2)
+    expected = -np.sort(-cosine, axis=1)[:, :k]
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+    picked = np.take_along_axis(cosine, np.maximum(neighbors, 0), axis=1)
+    np.testing.assert_allclose(np.where(neighbors >= 0, picked, 0), expected, atol=1e-5)
+    assert not (neighbors == np.arange(len(neighbors))[:, None]).any()
+
+    # the block size only bounds memory
+    same_nb, same_sc = item_similarity_topk(R, k=k, block_size=1024, workers=1)
+    np.testing.assert_allclose(same_sc, scores, atol=1e-6)
+
+
+def test_recommendations_skip_seen_recipes(interactions):
+    index = build_index(interactions, k=10)
+    user = "u3"
+    seen = set(interactions.loc[interactions["userId"] == user, "recipeId"])
+    recs = index.recommend(user, n=5)
+    assert recs and not {rid for rid, _ in recs} & seen
+    assert [s for _, s in recs] == sorted((s for _, s in recs), reverse=True)
+    assert index.recommend("nobody") == [] and index.similar("r-missing") == []
+
+
+def test_index_round_trip(tmp_path, interactions):
+    index = build_index(interactions, k=10)
+    path = str(tmp_path / "neighbors.npz")
+    index.save(path)
+    loaded = RecommendationIndex.load(path)
+    assert loaded.similar("r01", n=5) == index.similar("r01", n=5)
+    assert loaded.recommend("u7", n=5) == index.recommend("u7", n=5)
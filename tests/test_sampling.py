@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sampling import WEIGHT_COLUMN, read_sample, sample_frame, stratified_positions, stratum_mean, weighted_counts
+
+
+@pytest.fixture
+def interactions():
+    rng = np.random.default_rng(11)
+    n = 20_000
+    recipes = rng.zipf(1.5, n) % 40
+    types = rng.choice(["view", "like", "cook_attempt", "rating"], n, p=[0.6, 0.2, 0.1, 0.1])
+    # every recipe has its own true mean rating
+    ratings = np.clip(np.rint(1 + recipes % 5 + rng.normal(scale=1.0, size=n)), 1, 5)
+    return pd.DataFrame({
+        "interactionId": [f"i{i}" for i in range(n)],
+        "recipeId": [f"r{r}" for r in recipes],
+        "type": types,
+        "rating": np.where(types == "rating", ratings, np.nan),
+    })
+
+
+def test_weighted_counts_equal_the_exact_counts(interactions):
+    sample = sample_frame(interactions, 0.05, seed=1)
+    assert len(sample) < len(interactions) // 10
+    exact = interactions.groupby(["recipeId", "type"]).size()
+    estimated = weighted_counts(sample, ["recipeId", "type"])
+    pd.testing.assert_series_equal(estimated.round(6), exact.astype(float), check_names=False)
+
+
+def test_every_stratum_keeps_its_quota(interactions):
+    positions, weights = stratified_positions(interactions[["recipeId", "type"]], 0.1, seed=2)
+    assert (np.diff(positions) > 0).all()
+    sizes = interactions.groupby(["recipeId", "type"]).size()
+    kept = interactions.iloc[positions].groupby(["recipeId", "type"]).size()
+    np.testing.assert_array_equal(kept, np.maximum(1, np.rint(0.1 * sizes)))
+    assert weights.min() >= 1
+
+
+def test_stratum_mean_intervals_cover_the_exact_means(interactions):
+    exact = interactions.groupby("recipeId")["rating"].mean().dropna()
+    covered = total = 0
+    for seed in range(20):
+        est = stratum_mean(sample_frame(interactions, 0.2, seed=seed), "rating")
+        # with two or three clipped 1-5 ratings the sample variance is often 0
+        est = est[est["n"] >= 5]
+        truth = exact[est.index]
+        covered += ((est["estimate"] - truth).abs() <= est["error"]).sum()
+        total += len(est)
+    # nominal 95%, with slack for the few hundred intervals checked
+    assert covered / total > 0.9
+
+    full = stratum_mean(sample_frame(interactions, 1.0), "rating")
+    np.testing.assert_allclose(full["estimate"], exact[full.index])
+    assert (full.loc[full["n"] > 1, "error"] == 0).all()
+
+
+@pytest.mark.parametrize("fraction", [0, -0.5, 1.5])
+def test_fraction_must_be_in_range(interactions, fraction):
+    with pytest.raises(ValueError):
+        sample_frame(interactions, fraction)
+
+
+def test_read_sample_matches_the_in_memory_sample(tmp_path, interactions):
+    interactions.to_csv(tmp_path / "interactions.csv", index=False)
+    on_disk = read_sample(str(tmp_path), "interactions", 0.05, seed=4)
+    in_memory = sample_frame(interactions, 0.05, seed=4)
+    assert on_disk["interactionId"].tolist() == in_memory["interactionId"].tolist()
+    np.testing.assert_array_equal(on_disk[WEIGHT_COLUMN], in_memory[WEIGHT_COLUMN])
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sessions import build_journeys, recipe_funnel, session_summary, sessionize, time_to_convert
+
+EVENTS = pd.DataFrame([
+    # userId, recipeId, type, createdAt
+    ("u1", "r1", "view", "2025-01-10T10:00:00Z"),
+    ("u1", "r1", "like", "2025-01-10T10:05:00Z"),
+    ("u1", "r1", "cook_attempt", "2025-01-10T10:10:00Z"),
+    ("u1", "r2", "view", "2025-01-10T11:00:00Z"),
+    ("u1", "r1", "rating", "2025-01-10T12:00:00Z"),
+    # liked before viewing: the like is out of order and does not count
+    ("u2", "r1", "like", "2025-01-10T09:00:00Z"),
+    ("u2", "r1", "view", "2025-01-10T09:10:00Z"),
+    ("u2", "r1", "cook_attempt", "2025-01-10T09:20:00Z"),
+    # never viewed: no journey
+    ("u3", "r2", "like", "2025-01-10T09:00:00Z"),
+], columns=["userId", "recipeId", "type", "createdAt"])
+
+
+def journeys(scope):
+    return build_journeys(EVENTS["userId"], EVENTS["recipeId"], EVENTS["type"], EVENTS["createdAt"],
+                          scope=scope)
+
+
+def test_user_scope_funnel_counts_steps_in_order():
+    funnel = recipe_funnel(journeys("user"))
+    assert funnel.index.tolist() == ["r1", "r2"]
+    assert funnel.loc["r1", ["view", "like", "cook_attempt", "rating"]].tolist() == [2, 1, 1, 1]
+    assert funnel.loc["r1", ["like_rate", "cook_attempt_rate", "rating_rate"]].tolist() == [0.5, 1.0, 1.0]
+    assert funnel.loc["r2", ["view", "like", "like_rate"]].tolist() == [1, 0, 0.0]
+
+
+def test_session_scope_splits_on_the_gap():
+    funnel = recipe_funnel(journeys("session"))
+    # u1 rated r1 two hours later, in a session without a view of r1
+    assert funnel.loc["r1", ["view", "like", "cook_attempt", "rating"]].tolist() == [2, 1, 1, 0]
+
+
+def test_unknown_scope_is_rejected():
+    with pytest.raises(ValueError):
+        journeys("day")
+
+
+def test_sessions_and_summary():
+    user_codes, _ = pd.factorize(EVENTS["userId"])
+    ts_ns = pd.to_datetime(EVENTS["createdAt"], utc=True).astype("int64").to_numpy()
+    order, session = sessionize(user_codes, ts_ns)
+    # u1: 10:00-10:10, 11:00, 12:00; u2: 09:00-09:20; u3: 09:00
+    assert np.bincount(session).tolist() == [3, 1, 1, 3, 1]
+    assert EVENTS["userId"].to_numpy()[order].tolist() == ["u1"] * 5 + ["u2"] * 3 + ["u3"]
+
+    summary = session_summary(user_codes, ts_ns)
+    assert summary["sessions"] == 5 and summary["users"] == 3
+    assert summary["median_events_per_session"] == 1.0
+    assert session_summary(user_codes, ts_ns, gap=pd.Timedelta(hours=2))["sessions"] == 3
+
+
+def test_time_to_convert():
+    ttc = time_to_convert(journeys("user"))
+    view_like = ttc.loc[("r1", "view->like")]
+    assert view_like["conversions"] == 1 and view_like["p50_minutes"] == 5.0
+    assert ttc.loc[("r1", "cook_attempt->rating"), "p50_minutes"] == 110.0
+    # nobody on r2 got past the view
+    assert "r2" not in ttc.index.get_level_values("recipeId")
@@ -0,0 +1,112 @@
+import os
+from collections import Counter
+
+from firestore_client import DeadlineExceeded, FaultyFirestore, ResilientClient
+from ingest_service import EventIngestor
+from sharded_counters import ShardedCounters, generate_events, run_load
+
+KINDS = ["view", "like"]
+
+
+class AmbiguousCommits(FaultyFirestore):
+    """Applies the next `n` RPCs, then fails each with DEADLINE_EXCEEDED anyway."""
+
+    def __init__(self, n, **kwargs):
+        super().__init__(**kwargs)
+        self.n = n
+
+    def _rpc(self, fn):
+        result = super()._rpc(fn)
+        if self.n:
+            self.n -= 1
+            raise DeadlineExceeded("injected: deadline exceeded after apply")
+        return result
+
+
+def totals(counters, expected):
+    frame = counters.get_many(sorted({r for r, _ in expected}), KINDS)
+    return Counter({(r, t): int(frame.at[r, t]) for r in frame.index for t in frame.columns if frame.at[r, t]})
+
+
+def interactions(pairs):
+    return [{"interactionId": f"evt_{i:05d}", "userId": f"user_{i % 13}", "recipeId": recipe_id,
+             "type": kind, "createdAt": "2025-11-24T10:30:00Z", "source": "test"}
+            for i, (recipe_id, kind) in enumerate(pairs)]
+
+
+def test_load_generator_totals_match_without_faults():
+    db = FaultyFirestore(seed=0)
+    counters = ShardedCounters(ResilientClient(db, seed=0), num_shards=10, seed=0)
+    events = generate_events(3000, 20, seed=1)
+
+    _, failed = run_load(counters, events)
+
+    assert failed == 0
+    assert totals(counters, Counter(events)) == Counter(events)
+
+
+def test_load_generator_under_faults_is_off_by_at_most_the_failures():
+    db = FaultyFirestore(error_rate=0.1, seed=2)
+    counters = ShardedCounters(ResilientClient(db, base_delay=0.001, seed=2), num_shards=10, seed=2)
+    events = generate_events(2000, 20, seed=2)
+    expected = Counter(events)
+
+    _, failed = run_load(counters, events)
+
+    got = totals(counters, expected)
+    assert failed > 0
+    # a failed increment was applied once or not at all, never twice
+    assert all(got[k] <= expected[k] for k in got)
+    assert sum(expected.values()) - sum(got.values()) <= failed
+
+
+def test_shards_spread_the_hot_counter():
+    events = generate_events(1000, 5, skew=2.0, seed=3)
+    busiest = {}
+    for shards in (1, 10):
+        db = FaultyFirestore(seed=3)
+        run_load(ShardedCounters(ResilientClient(db, seed=3), num_shards=shards, seed=3), events)
+        busiest[shards] = max(db.doc_writes.values())
+    assert busiest[10] < busiest[1] / 3
+
+
+def ingestor(db, tmp_path, name="spool"):
+    return EventIngestor(db, "interactions", spool_dir=str(tmp_path / name), dedup_dir=str(tmp_path / "dedup"),
+                         counters=ShardedCounters(db, num_shards=4, seed=0))
+
+
+def test_ingest_retry_of_an_applied_commit_does_not_double_count(tmp_path):
+    # the first commit lands but reports DEADLINE_EXCEEDED, so ingest retries it
+    db = AmbiguousCommits(1, seed=4)
+    pairs = generate_events(300, 10, seed=4)
+    ing = ingestor(db, tmp_path)
+
+    accepted, rejected, _ = ing.submit(interactions(pairs))
+    ing.flush()
+
+    assert accepted == 300 and not rejected
+    assert totals(ShardedCounters(db), Counter(pairs)) == Counter(pairs)
+    assert len(db.data["interactions"]) == 300
+    # the 250 events of the applied batch already existed; the other 50 were written
+    assert ing.stats["written"] == 50
+    assert ing.stats["dead_letters"] == 0
+
+
+def test_ingest_spool_replay_after_a_crash_does_not_double_count(tmp_path):
+    db = FaultyFirestore(seed=5)
+    pairs = generate_events(400, 10, seed=5)
+    ing = ingestor(db, tmp_path)
+    ing.submit(interactions(pairs))
+
+    # crash after the commits landed but before the pending file was removed
+    with ing._lock:
+        events, ing.buffer = ing.buffer, []
+        ing._rotate_spool()
+    ing._write(events)
+    assert os.listdir(ing.spool_dir)
+
+    restarted = ingestor(db, tmp_path)
+    assert restarted.replay_spool() == 400
+
+    assert totals(ShardedCounters(db), Counter(pairs)) == Counter(pairs)
+    assert restarted.stats["duplicates"] == 400 and restarted.stats["written"] == 0
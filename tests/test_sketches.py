@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import UniqueUserSketches, hll_estimate
+
+
+def interactions(n_users, recipes=("r1", "r2"), days=("2025-01-01", "2025-01-02"), seed=0, per_user=3):
+    rng = np.random.default_rng(seed)
+    n = n_users * per_user
+    return pd.DataFrame({
+        "userId": [f"user_{i}" for i in np.tile(np.arange(n_users), per_user)],
+        "recipeId": rng.choice(list(recipes), n),
+        "type": rng.choice(["view", "like"], n),
+        "createdAt": [f"{d}T12:00:00+00:00" for d in rng.choice(list(days), n)],
+    })
+
+
+@pytest.mark.parametrize("n_users", [50, 2_000, 50_000])
+def test_estimate_is_within_the_error_bound(n_users):
+    sketches = UniqueUserSketches.build(interactions(n_users, seed=n_users))
+    estimate, std_error = sketches.unique_users()
+    # 1.6% standard error at p=12; 4 sigma keeps this from ever flaking
+    assert abs(estimate - n_users) <= max(4 * std_error, 2)
+
+
+def test_empty_registers_estimate_zero():
+    assert hll_estimate(np.zeros(4096)) == 0
+
+
+def test_filters_match_exact_counts_within_error():
+    frame = interactions(20_000, recipes=("r1", "r2", "r3"), days=("2025-01-01", "2025-01-02", "2025-01-03"))
+    sketches = UniqueUserSketches.build(frame)
+
+    window = frame[(frame["recipeId"] == "r2") & (frame["type"] == "like")
+                   & (frame["createdAt"] >= "2025-01-02")]
+    estimate, std_error = sketches.unique_users("r2", start="2025-01-02", types=["like"])
+    assert abs(estimate - window["userId"].nunique()) <= 4 * std_error
+
+    per_recipe = sketches.unique_users_per_recipe()
+    exact = frame.groupby("recipeId")["userId"].nunique()
+    for recipe_id, row in per_recipe.iterrows():
+        assert abs(row.unique_users - exact[recipe_id]) <= 4 * row.std_error + 1
+        assert row.unique_users == round(sketches.unique_users(recipe_id)[0])
+
+
+def test_merge_equals_building_from_the_union(tmp_path):
+    first, second = interactions(3_000, seed=1), interactions(3_000, seed=2)
+    second["userId"] = second["userId"] + "_b"
+    merged = UniqueUserSketches.build(first).merge(UniqueUserSketches.build(second))
+    union = UniqueUserSketches.build(pd.concat([first, second], ignore_index=True))
+    assert merged.unique_users() == union.unique_users()
+    assert merged.unique_users("r1", end="2025-01-01") == union.unique_users("r1", end="2025-01-01")
+
+    path = str(tmp_path / "sketches.npz")
+    merged.save(path)
+    assert UniqueUserSketches.load(path).unique_users("r2") == merged.unique_users("r2")
+
+
+def test_merge_rejects_a_different_precision():
+    frame = interactions(10)
+    with pytest.raises(ValueError):
+        UniqueUserSketches.build(frame, p=10).merge(UniqueUserSketches.build(frame, p=12))
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sql_query import QUERIES, TABLES, connect, explain, export_parquet, run_query, table_path
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    rng = np.random.default_rng(3)
+    recipes = pd.DataFrame({
+        "recipeId": [f"r{i}" for i in range(20)],
+        "title": [f"Recipe {i}" for i in range(20)],
+        "difficulty": rng.choice(["Easy", "Medium", "Hard"], 20),
+        "totalTimeMinutes": rng.integers(10, 120, 20),
+    })
+    ingredients = pd.DataFrame({
+        "recipeId": rng.choice(recipes["recipeId"], 60),
+        "name": rng.choice(["Sugar", "sugar (fine)", "Flour", "Butter"], 60),
+    })
+    steps = pd.DataFrame({"recipeId": recipes["recipeId"], "stepNumber": 1, "instruction": "Mix."})
+    types = rng.choice(["view", "like", "rating"], 500)
+    interactions = pd.DataFrame({
+        "userId": [f"u{u}" for u in rng.integers(0, 30, 500)],
+        "recipeId": rng.choice(recipes["recipeId"], 500),
+        "type": types,
+        # the first 400 rows carry no rating, so type sniffing must read the whole file
+        "rating": np.where((types == "rating") & (np.arange(500) >= 400), rng.integers(1, 6, 500), np.nan),
+    })
+    for name, frame in zip(TABLES, (recipes, ingredients, steps, interactions)):
+        frame.to_csv(tmp_path / f"{name}.csv", index=False)
+    return str(tmp_path)
+
+
+def test_predefined_queries_run(data_dir):
+    con = connect(data_dir, memory_limit="256MB", threads=1)
+    for name, sql in QUERIES.items():
+        assert not run_query(con, sql).empty, name
+
+
+def test_queries_match_pandas(data_dir):
+    con = connect(data_dir, memory_limit="256MB")
+    interactions = pd.read_csv(os.path.join(data_dir, "interactions.csv"))
+
+    views = run_query(con, QUERIES["most_viewed"])
+    expected = (interactions[interactions["type"] == "view"].groupby("recipeId").size()
+                .rename("views").reset_index().sort_values(["views", "recipeId"], ascending=[False, True]).head(5))
+    assert views.values.tolist() == expected.values.tolist()
+
+    ratings = run_query(con, QUERIES["average_rating"]).set_index("recipeId")
+    exact = interactions.dropna(subset=["rating"]).groupby("recipeId")["rating"].mean()
+    pd.testing.assert_series_equal(ratings["avg_rating"].sort_index(), exact.sort_index(), check_names=False)
+
+    ingredients = run_query(con, QUERIES["common_ingredients"])
+    assert set(ingredients["ingredient"]) == {"sugar", "flour", "butter"}
+
+
+def test_parquet_copies_are_preferred_until_stale(data_dir):
+    export_parquet(data_dir)
+    for name in TABLES:
+        assert table_path(data_dir, name).endswith(f"{name}.parquet")
+    con = connect(data_dir)
+    assert "READ_PARQUET" in explain(con, QUERIES["most_viewed"]).upper()
+    assert len(run_query(con, "SELECT * FROM interactions")) == 500
+
+    # a re-export is newer than the copy, so the CSV wins again
+    csv = os.path.join(data_dir, "interactions.csv")
+    pd.read_csv(csv).head(10).to_csv(csv, index=False)
+    later = os.path.getmtime(os.path.join(data_dir, "interactions.parquet")) + 10
+    os.utime(csv, (later, later))
+    assert table_path(data_dir, "interactions") == csv
+    assert len(run_query(connect(data_dir), "SELECT * FROM interactions")) == 10
+
+
+def test_missing_tables_are_skipped(tmp_path):
+    pd.DataFrame({"recipeId": ["r1"], "type": ["view"]}).to_csv(tmp_path / "interactions.csv", index=False)
+    con = connect(str(tmp_path))
+    assert table_path(str(tmp_path), "recipe") is None
+    assert run_query(con, "SELECT count(*) AS n FROM interactions")["n"].tolist() == [1]
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from validate_csv_data import (BLOCK_LAYOUT, block_starts, run_validation, validate_blocks,
+                               validate_interactions)
+
+LAYOUT = BLOCK_LAYOUT["interactions"]
+BLOCK_ROWS = 100
+
+
+def interactions(n, seed, start="2025-01-01", days=60):
+    rng = np.random.default_rng(seed)
+    created = pd.Timestamp(start, tz="UTC") + pd.to_timedelta(rng.uniform(0, days * 86400, n), unit="s")
+    kinds = rng.choice(["view", "like", "rating"], n)
+    return pd.DataFrame({
+        "interactionId": [f"{x:016x}" for x in rng.integers(0, 2 ** 63, n)],
+        "userId": [f"user_{u}" for u in rng.integers(0, 50, n)],
+        "recipeId": [f"recipe_{r}" for r in rng.integers(0, 20, n)],
+        "type": kinds,
+        "createdAt": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "rating": np.where(kinds == "rating", rng.integers(1, 6, n), np.nan),
+        "difficultyRating": np.nan,
+        "successStatus": None,
+        "comment": None,
+        "source": "web",
+    })
+
+
+def export_order(df):
+    # etl_export_to_csv writes rows in document-id order
+    return df.sort_values("interactionId").reset_index(drop=True)
+
+
+def validate(df, cached):
+    return validate_blocks(df, validate_interactions, cached, BLOCK_ROWS, LAYOUT)
+
+
+def touched_rows(df, inserted_ids):
+    """Rows of the blocks (in validation order) that hold an inserted row, plus the block before
+    any inserted row that starts a block (it was split)."""
+    ordered = df.sort_values(LAYOUT[0] + LAYOUT[1], kind="stable").reset_index(drop=True)
+    starts = list(block_starts(ordered, LAYOUT[1], BLOCK_ROWS)) + [len(ordered)]
+    touched = set()
+    for pos in np.flatnonzero(ordered["interactionId"].isin(inserted_ids)):
+        i = np.searchsorted(starts, pos, side="right") - 1
+        touched.add(i)
+        if starts[i] == pos and i > 0:
+            touched.add(i - 1)
+    return sum(starts[i + 1] - starts[i] for i in touched)
+
+
+def test_unchanged_table_is_not_rechecked():
+    df = export_order(interactions(3000, seed=0))
+    first, blocks, rechecked = validate(df, {})
+    assert rechecked == 3000 and len(blocks) > 10
+
+    again, _, rechecked = validate(df, blocks)
+    assert rechecked == 0
+    assert again == first
+
+
+def test_rows_inserted_mid_file_recheck_only_their_blocks():
+    df = interactions(3000, seed=1)
+    late = interactions(15, seed=2, start="2025-01-20", days=10)  # createdAt in the middle of the table
+    _, blocks, _ = validate(export_order(df), {})
+
+    merged = export_order(pd.concat([df, late]))
+    summary, _, rechecked = validate(merged, blocks)
+
+    assert 0 < rechecked == touched_rows(merged, set(late["interactionId"]))
+    assert rechecked < len(merged) / 3
+    full, _, _ = validate(merged, {})
+    assert (summary["valid"], summary["invalid"]) == (full["valid"], full["invalid"]) == (3015, 0)
+
+
+def test_appended_nightly_batch_rechecks_only_the_tail():
+    df = interactions(3000, seed=3, days=60)
+    nightly = interactions(200, seed=4, start="2025-03-02", days=1)
+    _, blocks, _ = validate(export_order(df), {})
+
+    # in document-id order the new rows are spread over the whole file
+    merged = export_order(pd.concat([df, nightly]))
+    _, _, rechecked = validate(merged, blocks)
+    assert rechecked == touched_rows(merged, set(nightly["interactionId"]))
+    assert rechecked < 200 + 5 * BLOCK_ROWS
+
+
+def test_invalid_rows_are_reported_from_cached_blocks(tmp_path):
+    df = export_order(interactions(500, seed=5))
+    df.loc[7, "type"] = "bogus"
+    frames = (pd.DataFrame({"recipeId": []}), pd.DataFrame({"recipeId": [], "ingredientId": []}),
+              pd.DataFrame({"recipeId": [], "stepNumber": []}), df)
+
+    first = run_validation(str(tmp_path), str(tmp_path / "report.json"), frames=frames, block_rows=BLOCK_ROWS)
+    cached = run_validation(str(tmp_path), str(tmp_path / "report.json"), frames=frames, block_rows=BLOCK_ROWS)
+
+    assert cached == first
+    assert cached["interactions"]["invalid"] == 1
+    assert cached["interactions"]["invalid_records"][0]["reason"] == "Invalid interaction type"
@@ -1,15 +1,32 @@
-import pandas as pd
+import argparse
+import hashlib
 import json
-from datetime import datetime
+import os
+from datetime import datetime, timezone
+
+from compressed_io import COMPRESSIONS, open_text, read_table
+from instrumentation import stage
 
 # -------------------------------------------------------------------
 # HELPERS
 # -------------------------------------------------------------------
+def isna(value):
+    # imported on use, so the CLI and ingest_service import quickly; any
+    # frame being validated has loaded pandas already
+    import pandas as pd
+
+    return pd.isna(value)
+
+def parse_timestamp(value):
+    """ISO string -> datetime (UTC when it carries no offset); raises on anything invalid."""
+    parsed = datetime.fromisoformat(value.replace("Z", ""))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 def is_valid_timestamp(value):
-    if pd.isna(value):
+    if isna(value):
         return False
     try:
-        datetime.fromisoformat(value.replace("Z", ""))
+        parse_timestamp(value)
         return True
     except:
         return False
@@ -33,7 +50,7 @@ def validate_recipes(df):
                     "totalTimeMinutes", "servings"]
 
         for col in required:
-            if pd.isna(row[col]):
+            if isna(row[col]):
                 results.append(fail(f"Missing required field: {col}"))
                 break
         else:
@@ -73,13 +90,13 @@ def validate_recipes(df):
 def validate_ingredients(df):
     results = []
     for _, row in df.iterrows():
-        if pd.isna(row["recipeId"]):
+        if isna(row["recipeId"]):
             results.append(fail("Missing recipeId"))
             continue
-        if pd.isna(row["ingredientId"]):
+        if isna(row["ingredientId"]):
             results.append(fail("Missing ingredientId"))
             continue
-        if pd.isna(row["name"]) or row["name"].strip() == "":
+        if isna(row["name"]) or row["name"].strip() == "":
             results.append(fail("Invalid ingredient name"))
             continue
         if row["quantity"] < 0:
@@ -95,10 +112,10 @@ def validate_steps(df):
         if row["stepNumber"] < 1:
             results.append(fail("stepNumber must be >= 1"))
             continue
-        if pd.isna(row["instruction"]) or row["instruction"].strip() == "":
+        if isna(row["instruction"]) or row["instruction"].strip() == "":
             results.append(fail("Invalid instruction"))
             continue
-        if not pd.isna(row["approxMinutes"]) and row["approxMinutes"] < 0:
+        if not isna(row["approxMinutes"]) and row["approxMinutes"] < 0:
             results.append(fail("approxMinutes must be >= 0"))
             continue
 
@@ -120,21 +137,21 @@ def validate_interactions(df):
 
         # rating rules
         if row["type"] == "rating":
-            if pd.isna(row["rating"]) or not (1 <= row["rating"] <= 5):
+            if isna(row["rating"]) or not (1 <= row["rating"] <= 5):
                 results.append(fail("rating must be 1–5 for type=rating"))
                 continue
         else:
-            if not pd.isna(row["rating"]):
+            if not isna(row["rating"]):
                 results.append(fail("rating present but type != rating"))
                 continue
 
         # difficultyRating rules
         if row["type"] == "cook_attempt":
-            if pd.isna(row["difficultyRating"]) or not (1 <= row["difficultyRating"] <= 5):
+            if isna(row["difficultyRating"]) or not (1 <= row["difficultyRating"] <= 5):
                 results.append(fail("difficultyRating must be 1–5 for cook_attempt"))
                 continue
         else:
-            if not pd.isna(row["difficultyRating"]):
+            if not isna(row["difficultyRating"]):
                 results.append(fail("difficultyRating present but type != cook_attempt"))
                 continue
 
@@ -142,49 +159,210 @@ def validate_interactions(df):
 
     return results
 
+def validate_recipe_events(df):
+    results = []
+    valid_types = ["view", "favorite", "start_cook", "complete_cook"]
+
+    for _, row in df.iterrows():
+        if isna(row["recipe_id"]) or isna(row["user_id"]):
+            results.append(fail("Missing recipe_id or user_id"))
+            continue
+
+        if row["event_type"] not in valid_types:
+            results.append(fail("Invalid event_type"))
+            continue
+
+        if not is_valid_timestamp(row["timestamp"]):
+            results.append(fail("Invalid timestamp"))
+            continue
+
+        results.append(ok())
+
+    return results
+
 # -------------------------------------------------------------------
-# MAIN
+# INCREMENTAL VALIDATION (content-addressed row blocks)
+#
+# Every rule above looks at one row at a time, so a table's result is the
+# sum of the results of its row blocks. Each block's result (valid /
+# invalid counts and its invalid records) is cached under
+# data/.validation_cache/<table>.json, keyed by a hash of the block's
+# contents, and on the next run only blocks with a new hash are validated.
+#
+# Rows are first put in a stable order: the time column, then the row id
+# (BLOCK_LAYOUT). The export writes rows in document-id order and auto-ids
+# are random, so in file order a nightly batch of new interactions lands
+# all over the table; in time order it lands at the end. Block boundaries
+# are then content-defined: a block starts at every row whose id hashes
+# to 0 mod BLOCK_ROWS, so blocks average BLOCK_ROWS rows and do not shift
+# when rows come before them. A row inserted, edited or deleted anywhere
+# (a late event, a fixed record) changes only the block it falls in, or
+# splits or merges that block with its neighbour when the row is a
+# boundary. Every other block keeps its hash. The cache is dropped when
+# this file or the export code that shapes the rows changes.
 # -------------------------------------------------------------------
-if __name__ == "__main__":
-    report = {}
-
-    recipes = pd.read_csv("data/recipe.csv")
-    ingredients = pd.read_csv("data/ingredients.csv")
-    steps = pd.read_csv("data/steps.csv")
-    interactions = pd.read_csv("data/interactions.csv")
-
-    r1 = validate_recipes(recipes)
-    r2 = validate_ingredients(ingredients)
-    r3 = validate_steps(steps)
-    r4 = validate_interactions(interactions)
-
-    def summarize(results):
-        valid = sum(1 for r in results if r["valid"])
-        invalid = len(results) - valid
-        return valid, invalid, results
-
-    report["recipes"] = summarize(r1)
-    report["ingredients"] = summarize(r2)
-    report["steps"] = summarize(r3)
-    report["interactions"] = summarize(r4)
-
-    # Create JSON-friendly structure
-    final = {
-        "recipes": {"valid": report["recipes"][0], "invalid": report["recipes"][1]},
-        "ingredients": {"valid": report["ingredients"][0], "invalid": report["ingredients"][1]},
-        "steps": {"valid": report["steps"][0], "invalid": report["steps"][1]},
-        "interactions": {
-            "valid": report["interactions"][0],
-            "invalid": report["interactions"][1],
-            "invalid_records": [
-                r
-                for r in report["interactions"][2]
-                if not r["valid"]
-            ]
-        }
+BLOCK_ROWS = 10_000
+CACHE_DIR = ".validation_cache"
+# table -> (columns rows are ordered by first, columns identifying a row)
+BLOCK_LAYOUT = {
+    "recipes": (["createdAt"], ["recipeId"]),
+    "ingredients": ([], ["recipeId", "ingredientId"]),
+    "steps": ([], ["recipeId", "stepNumber"]),
+    "interactions": (["createdAt"], ["interactionId"]),
+}
+# the rules, and the export code that flattens documents into the rows they check
+CODE_FILES = [__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "etl_export_to_csv.py")]
+
+
+def code_digest():
+    h = hashlib.sha256()
+    for path in CODE_FILES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def row_hashes(df):
+    import pandas as pd
+
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def block_starts(df, keys, block_rows):
+    """Row positions where blocks start: 0, then every row whose key hashes to 0 mod block_rows."""
+    import numpy as np
+
+    if len(df) == 0:
+        return np.zeros(0, dtype=np.int64)
+    boundary = row_hashes(df[keys]) % np.uint64(block_rows) == 0
+    boundary[0] = True
+    return np.flatnonzero(boundary)
+
+
+def block_digest(columns, hashes):
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\x1f".join(map(str, columns)).encode())
+    h.update(hashes.tobytes())
+    return h.hexdigest()
+
+
+def load_block_cache(path, code, block_rows):
+    """{block hash: result} from a previous run with the same rules and block size."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        cached = json.load(f)
+    if cached.get("code") != code or cached.get("block_rows") != block_rows:
+        return {}
+    return cached["blocks"]
+
+
+def save_block_cache(path, code, block_rows, blocks):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"code": code, "block_rows": block_rows, "blocks": blocks}, f)
+    os.replace(tmp, path)
+
+
+def validate_blocks(df, validator, cached, block_rows=BLOCK_ROWS, layout=([], [])):
+    """
+    (summary, blocks, rechecked_rows): summary has valid, invalid and
+    invalid_records for the whole table (in block order); blocks maps each
+    block hash seen to its result (the cache entries to keep). layout is
+    the table's BLOCK_LAYOUT entry; without key columns the boundaries
+    are cut on whole rows.
+    """
+    summary = {"valid": 0, "invalid": 0, "invalid_records": []}
+    blocks, rechecked = {}, 0
+    order, keys = ([c for c in columns if c in df.columns] for columns in layout)
+    if order or keys:
+        df = df.sort_values(order + keys, kind="stable")
+    hashes = row_hashes(df) if len(df) else None
+    starts = block_starts(df, keys or list(df.columns), block_rows)
+    for start, stop in zip(starts, list(starts[1:]) + [len(df)]):
+        key = block_digest(df.columns, hashes[start:stop])
+        result = blocks.get(key) or cached.get(key)
+        if result is None:
+            block = df.iloc[start:stop]
+            results = validator(block)
+            invalid = [r for r in results if not r["valid"]]
+            result = {"valid": len(results) - len(invalid), "invalid": len(invalid), "invalid_records": invalid}
+            rechecked += len(block)
+        blocks[key] = result
+        summary["valid"] += result["valid"]
+        summary["invalid"] += result["invalid"]
+        summary["invalid_records"].extend(result["invalid_records"])
+    return summary, blocks, rechecked
+
+# -------------------------------------------------------------------
+# RUN
+# -------------------------------------------------------------------
+def run_validation(data_dir="data", report_path="validation_report.json", frames=None,
+                   incremental=True, block_rows=BLOCK_ROWS):
+    """
+    Validates the four exported tables and writes the JSON report.
+    `frames` is an optional pre-loaded (recipes, ingredients, steps,
+    interactions) tuple; otherwise the CSVs in data_dir are read
+    (plain, .gz or .zst). A report_path ending in .gz or .zst is written
+    compressed. With `incremental`, only row blocks that changed since
+    the last run are validated (see above); incremental=False re-checks
+    everything and leaves the cache alone.
+    """
+
+    def read(name):
+        with stage(f"validate.read_csv.{name}") as s:
+            df = read_table(data_dir, name)
+            s.rows = len(df)
+        return df
+
+    code = code_digest()
+
+    def check(name, validator, df):
+        path = os.path.join(data_dir, CACHE_DIR, f"{name}.json")
+        cached = load_block_cache(path, code, block_rows) if incremental else {}
+        with stage(f"validate.{name}") as s:
+            summary, blocks, rechecked = validate_blocks(df, validator, cached, block_rows, BLOCK_LAYOUT[name])
+            s.rows = rechecked
+        if incremental:
+            save_block_cache(path, code, block_rows, blocks)
+            print(f" validate {name}: re-checked {rechecked:,} of {len(df):,} rows")
+        return summary
+
+    if frames is None:
+        frames = (read("recipe"), read("ingredients"), read("steps"), read("interactions"))
+    recipes, ingredients, steps, interactions = frames
+
+    report = {
+        "recipes": check("recipes", validate_recipes, recipes),
+        "ingredients": check("ingredients", validate_ingredients, ingredients),
+        "steps": check("steps", validate_steps, steps),
+        "interactions": check("interactions", validate_interactions, interactions),
     }
 
-    with open("validation_report.json", "w") as f:
-        json.dump(final, f, indent=4)
+    # Create JSON-friendly structure (invalid records are only listed for interactions)
+    final = {name: {"valid": r["valid"], "invalid": r["invalid"]} for name, r in report.items()}
+    final["interactions"]["invalid_records"] = report["interactions"]["invalid_records"]
+
+    with stage("validate.write_report"):
+        with open_text(report_path, "w") as f:
+            json.dump(final, f, indent=4)
+
+    return final
+
+# -------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the exported CSVs.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--report", default="validation_report.json")
+    parser.add_argument("--compression", default="none", choices=list(COMPRESSIONS),
+                        help="compress the report (adds .gz / .zst)")
+    parser.add_argument("--full", action="store_true", help="re-validate every row, ignoring the block cache")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="average rows per cached block")
+    args = parser.parse_args()
 
-    print("Validation complete! See validation_report.json.")
+    report_path = args.report + COMPRESSIONS[args.compression]
+    run_validation(args.data_dir, report_path, incremental=not args.full, block_rows=args.block_rows)
+    print(f"Validation complete! See {report_path}.")